@@ -0,0 +1,111 @@
+"""
+Run the delicatessen benchmarks.
+
+Usage (from the root of the repository)::
+
+    python -m benchmarks [--max-rows 1e7] [--only app|latte|store|imports]
+                         [--json out.json]
+
+Everything runs offline on synthetic data, which is written once to
+``--data-dir`` and reused by later runs.
+
+"""
+
+# Standard library
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+
+# Benchmarks
+from . import bench_app, bench_imports, bench_latte, bench_store
+
+
+def format_bytes(size):
+    if size is None:
+        return "-"
+    for unit in ["B", "kB", "MB"]:
+        if size < 1024:
+            return "{0:.1f} {1}".format(size, unit)
+        size /= 1024
+    return "{0:.1f} GB".format(size)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--max-rows",
+        type=float,
+        default=1e6,
+        help="largest synthetic catalog (rows); sizes go from 1e3 by factors "
+        "of 10",
+    )
+    parser.add_argument(
+        "--only",
+        choices=["app", "latte", "store", "imports"],
+        default=None,
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--data-dir",
+        type=pathlib.Path,
+        default=pathlib.Path(tempfile.gettempdir()) / "deli-benchmarks",
+    )
+    parser.add_argument(
+        "--json", type=pathlib.Path, help="also save the results here"
+    )
+    args = parser.parse_args(args)
+
+    sizes = []
+    nrows = 1000
+    while nrows <= args.max_rows:
+        sizes.append(nrows)
+        nrows *= 10
+
+    suites = []
+    if args.only in [None, "app"]:
+        suites.append(bench_app.run(args.data_dir, sizes, repeat=args.repeat))
+    if args.only in [None, "latte"]:
+        suites.append(bench_latte.run(args.data_dir, repeat=args.repeat))
+    if args.only in [None, "store"]:
+        suites.append(bench_store.run(args.data_dir, repeat=args.repeat))
+    if args.only in [None, "imports"]:
+        suites.append(bench_imports.run(repeat=args.repeat))
+
+    row = "{0:<38} {1:>12} {2:>12} {3:>12} {4:>12}"
+    print(row.format("benchmark", "size", "time", "peak memory", "message"))
+    results = []
+    for suite in suites:
+        for result in suite:
+            results.append(result)
+            print(
+                row.format(
+                    result["name"],
+                    result["size"],
+                    "{0:.1f} ms".format(1e3 * result["time"]),
+                    format_bytes(result["peak_memory"]),
+                    format_bytes(result["message_size"]),
+                )
+            )
+            if "file_size" in result:
+                print(
+                    "    file size {0:>27}".format(
+                        format_bytes(result["file_size"])
+                    )
+                )
+            for package, seconds in result.get("imports", {}).items():
+                print(
+                    "    import {0:<20} {1:>7.1f} ms".format(
+                        package, 1e3 * seconds
+                    )
+                )
+            sys.stdout.flush()
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
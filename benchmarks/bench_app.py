@@ -0,0 +1,154 @@
+"""
+Benchmarks of the main ``Delicatessen`` app: dataset load (from the FITS
+catalog, or from its serving format written by ``deli ingest``) and
+callbacks, with the appearance of the plot set by the server or by the
+browser (the client-side mode, where the callbacks send nothing), and the
+refresh of a live dataset (see `delicatessen.sources`) served by a local
+stand-in for a remote catalog feed.
+
+"""
+
+# Standard library
+from functools import partial
+
+# Third-party
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+
+# delicatessen
+from delicatessen import catalog, sources
+from delicatessen.main import Delicatessen, _read_dataset
+
+# Benchmarks
+from .fake_feed import SINCE, FakeFeed
+from .measure import measure, document_size
+from .synthetic import make_catalog
+
+# The name of the live dataset, and the rows added and changed between two
+# refreshes
+FEED = "Benchmark feed"
+NEW_ROWS = 100
+CHANGED_ROWS = 100
+
+
+def bench_init(path, repeat, client_side=False):
+    """Dataset load and layout construction in ``Delicatessen.__init__``."""
+    make = partial(Delicatessen, data_file=path, client_side=client_side)
+    # Clear the dataset cache to time the load of the data file
+    result = measure(
+        lambda _: make(Document()),
+        setup=_read_dataset.cache_clear,
+        repeat=repeat,
+    )
+    deli = make(Document())
+    result["message_size"] = document_size(deli.doc)
+    return result
+
+
+def bench_init_ingested(path, repeat):
+    """``Delicatessen.__init__`` with the catalog in its serving format."""
+    ingested = path.with_suffix(catalog.SUFFIX)
+    if not ingested.exists():
+        catalog.ingest(catalog.read_table(path), ingested)
+    return bench_init(ingested, repeat)
+
+
+def bench_param_callback(path, repeat, client_side=False):
+    """``Plot.param_callback``: the user picks a marker color column."""
+    return measure(
+        lambda deli: deli.primary.color.widget.update(value=["tmag"]),
+        setup=lambda: Delicatessen(
+            Document(), data_file=path, client_side=client_side
+        ),
+        doc=lambda deli: deli.doc,
+        repeat=repeat,
+    )
+
+
+def bench_checkbox_callback(path, repeat, client_side=False):
+    """``Plot.checkbox_callback``: the user flips and log-scales the x axis."""
+    return measure(
+        lambda deli: deli.primary.checkbox_group.update(active=[0, 2]),
+        setup=lambda: Delicatessen(
+            Document(), data_file=path, client_side=client_side
+        ),
+        doc=lambda deli: deli.doc,
+        repeat=repeat,
+    )
+
+
+def _feed_updates(table, rng):
+    # New rows (with new TIC IDs) and changed rows (moved by a little)
+    new = table.sample(NEW_ROWS, random_state=rng)
+    new = new.assign(ticid=table["ticid"].max() + 1 + np.arange(NEW_ROWS))
+    changed = table.sample(CHANGED_ROWS, random_state=rng)
+    changed = changed.assign(
+        ra=changed["ra"] + rng.uniform(-1, 1, CHANGED_ROWS)
+    )
+    return pd.concat([new, changed])
+
+
+def bench_feed(path, repeat, incremental=True):
+    """
+    The update of a session after a live dataset changed: a refresh of the
+    feed and the new and changed rows streamed and patched into the plot,
+    or (not ``incremental``) the whole dataset reloaded and sent again.
+    """
+    table = catalog.read_table(path)
+    rng = np.random.default_rng(42)
+    with FakeFeed(table) as fake:
+        source = sources.RemoteTable(fake.url + "/table.csv", since=SINCE)
+        sources.register_source(FEED, source)
+        deli = Delicatessen(Document())
+        deli.primary.data.widget.update(value=[FEED])
+        feed = sources.feed(FEED)
+
+        def setup():
+            fake.update(_feed_updates(fake.table, rng))
+            return deli
+
+        def update(deli):
+            if incremental:
+                feed.refresh()
+                deli.primary.apply_changes()
+            else:
+                feed.load()
+                deli.primary.set_dataset(feed.changes(None)[1])
+
+        result = measure(
+            update, setup=setup, doc=lambda deli: deli.doc, repeat=repeat
+        )
+    deli.primary.release()
+    return result
+
+
+BENCHMARKS = [
+    ("Delicatessen.__init__", bench_init),
+    ("Delicatessen.__init__ (ingested)", bench_init_ingested),
+    ("Plot.param_callback", bench_param_callback),
+    ("Plot.checkbox_callback", bench_checkbox_callback),
+    (
+        "Delicatessen.__init__ (client-side)",
+        partial(bench_init, client_side=True),
+    ),
+    (
+        "Plot.param_callback (client-side)",
+        partial(bench_param_callback, client_side=True),
+    ),
+    (
+        "Plot.checkbox_callback (client-side)",
+        partial(bench_checkbox_callback, client_side=True),
+    ),
+    ("Feed refresh (stream and patch)", bench_feed),
+    ("Feed reload", partial(bench_feed, incremental=False)),
+]
+
+
+def run(data_dir, sizes, repeat=3):
+    for nrows in sizes:
+        path = make_catalog(nrows, data_dir / "catalog-{0}.fits".format(nrows))
+        for name, bench in BENCHMARKS:
+            result = bench(path, repeat)
+            result.update(name=name, size="{0:.0e} rows".format(nrows))
+            yield result
@@ -0,0 +1,88 @@
+"""
+Import-time profile: how long it takes a fresh process to start the server,
+to open a session and to select a tool, and which imports dominate.
+
+"""
+
+# Standard library
+import pathlib
+import subprocess
+import sys
+
+# Third-party
+import numpy as np
+
+ROOT = pathlib.Path(__file__).parent.parent.absolute()
+
+SNIPPETS = [
+    ("server startup", "import delicatessen.server"),
+    (
+        "session startup",
+        "from bokeh.document import Document\n"
+        "from delicatessen.main import Delicatessen\n"
+        "deli = Delicatessen(Document())",
+    ),
+    (
+        "Deli-LATTE selected",
+        "from bokeh.document import Document\n"
+        "from delicatessen import tools\n"
+        "from delicatessen.main import Delicatessen\n"
+        "deli = Delicatessen(Document())\n"
+        "deli.change_tool(tools.DeliLATTE)",
+    ),
+]
+
+TIMER = """
+import time
+start = time.perf_counter()
+{0}
+print(time.perf_counter() - start)
+"""
+
+
+def profile(snippet):
+    """
+    Run ``snippet`` in a fresh interpreter.
+
+    Returns the run time (s) and the import time (s) of every package it
+    imported (including their own imports), as reported by
+    ``python -X importtime``.
+
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", TIMER.format(snippet)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip() == "cumulative":
+            continue
+        # The first import of a package includes those of its modules
+        package = name.strip().split(".")[0]
+        packages[package] = max(
+            packages.get(package, 0), int(cumulative) * 1e-6
+        )
+    packages.pop("delicatessen", None)
+    return float(proc.stdout.split()[-1]), packages
+
+
+def run(repeat=3, top=5):
+    for name, snippet in SNIPPETS:
+        runs = [profile(snippet) for _ in range(repeat)]
+        times = [t for t, _ in runs]
+        packages = runs[-1][1]
+        heaviest = sorted(packages, key=packages.get, reverse=True)[:top]
+        yield dict(
+            name=name,
+            size="fresh process",
+            time=float(np.median(times)),
+            peak_memory=None,
+            message_size=None,
+            imports={package: packages[package] for package in heaviest},
+        )
@@ -0,0 +1,260 @@
+"""Benchmarks of the DeliLATTE light curve tool, run on local files."""
+
+# Standard library
+import contextlib
+import io
+from functools import partial
+from unittest import mock
+
+# Third-party
+import numpy as np
+from bokeh.document import Document
+
+# delicatessen
+from delicatessen import mast
+from delicatessen.cache import RESULTS
+from delicatessen.fits import read_columns
+from delicatessen.main import Delicatessen
+from delicatessen.tools import delilatte
+
+# Benchmarks
+from .fake_mast import CVZ_POSITION, FakeMast
+from .measure import measure
+from .synthetic import make_lightcurve_files
+
+TIC = 123456789
+
+# One sector, a few sectors and a year in the continuous viewing zone
+SECTOR_COUNTS = [1, 4, 13]
+
+
+def bench_read_lightcurves(paths, repeat):
+    """Parsing, normalization and binning in ``download_data``."""
+    return measure(
+        lambda _: delilatte.read_lightcurves(paths, test="yes"),
+        repeat=repeat,
+    )
+
+
+def bench_read_flux_astropy(paths, repeat):
+    """The flux of the light curve files, read with astropy."""
+    import astropy.io.fits as pf
+
+    def read(_):
+        for path in paths:
+            with pf.open(path) as hdus:
+                hdus[1].data["PDCSAP_FLUX"].astype(np.float32)
+
+    return measure(read, repeat=repeat)
+
+
+def bench_read_flux(paths, repeat):
+    """The flux of the light curve files, read with `delicatessen.fits`."""
+
+    def read(_):
+        for path in paths:
+            read_columns(path, ["PDCSAP_FLUX"])
+
+    return measure(read, repeat=repeat)
+
+
+def bench_preprocess(paths, repeat):
+    """The outlier removal and detrending of the light curves."""
+    data = dict(
+        zip(delilatte.DATA_KEYS, delilatte.read_lightcurves(paths, test="yes"))
+    )
+    return measure(lambda _: delilatte.preprocessed_of(data), repeat=repeat)
+
+
+def bench_periodogram(paths, repeat):
+    """The periodogram shown in the DeliLATTE tab, from scratch."""
+    data = dict(
+        zip(delilatte.DATA_KEYS, delilatte.read_lightcurves(paths, test="yes"))
+    )
+    return measure(lambda _: delilatte.periodogram_of(data), repeat=repeat)
+
+
+def bench_periodogram_new_sector(paths, repeat):
+    """
+    The periodogram once the last sector is released, with the contributions
+    of the previous sectors cached.
+
+    """
+    data = dict(
+        zip(delilatte.DATA_KEYS, delilatte.read_lightcurves(paths, test="yes"))
+    )
+    rows = data["sec_rows"][:-1]
+    previous = dict(
+        alltime=data["alltime"][: rows[:, 0].sum()],
+        allflux=data["allflux"][: rows[:, 0].sum()],
+        sec_rows=rows,
+        in_sec=data["in_sec"][:-1],
+    )
+
+    def setup():
+        RESULTS.clear()
+        delilatte.periodogram_of(previous, TIC, "2min")
+
+    return measure(
+        lambda _: delilatte.periodogram_of(data, TIC, "2min"),
+        setup=setup,
+        repeat=repeat,
+    )
+
+
+def bench_transit_search(paths, repeat):
+    """The transit search shown in the DeliLATTE tab."""
+    data = dict(
+        zip(delilatte.DATA_KEYS, delilatte.read_lightcurves(paths, test="yes"))
+    )
+    return measure(lambda _: delilatte.transits_of(data), repeat=repeat)
+
+
+def bench_callback(paths, repeat):
+    """
+    ``DeliLATTE.select`` with the download replaced by a read of the local
+    files: this records the size of the light curve update sent to the browser.
+    The results shared between sessions are cleared before every run.
+
+    """
+
+    def offline_download(tic, binfac=None, test="no", product="auto"):
+        return delilatte.read_lightcurves(paths, binfac=binfac, test="yes")
+
+    def setup():
+        RESULTS.clear()
+        deli = Delicatessen(Document())
+        deli.change_tool(delilatte.DeliLATTE)
+        return deli
+
+    def select(deli):
+        with contextlib.redirect_stdout(io.StringIO()):
+            deli.primary.source.selected.indices = [0]
+
+    with mock.patch.object(delilatte, "download_data", offline_download):
+        return measure(
+            select, setup=setup, doc=lambda deli: deli.doc, repeat=repeat
+        )
+
+
+def bench_centroid_tab(paths, repeat, resolution="10min"):
+    """
+    Switching to the centroid tab of DeliLATTE, once a star is selected (with
+    the light curves read from the local files), with the centroid tracks at
+    the given ``resolution`` (see ``CENTROID_RESOLUTIONS``): this records the
+    size of the centroid update sent to the browser.
+
+    """
+
+    def offline_download(tic, binfac=None, test="no", product="auto"):
+        return delilatte.read_lightcurves(paths, binfac=binfac, test="yes")
+
+    def setup():
+        RESULTS.clear()
+        deli = Delicatessen(Document())
+        deli.change_tool(delilatte.DeliLATTE)
+        deli.secondary.centroid_resolution.value = resolution
+        with contextlib.redirect_stdout(io.StringIO()):
+            deli.primary.source.selected.indices = [0]
+        return deli
+
+    def switch(deli):
+        deli.secondary.tabs.active = 1
+
+    with mock.patch.object(delilatte, "download_data", offline_download):
+        return measure(
+            switch, setup=setup, doc=lambda deli: deli.doc, repeat=repeat
+        )
+
+
+def bench_zoom(paths, repeat, days=1.0):
+    """
+    Zooming into ``days`` of the light curve shown by DeliLATTE (with the
+    light curves read from the local files), from the whole light curve:
+    this records the size of the tiles sent to the browser (see
+    ``delilatte.tiles_of``).
+
+    """
+
+    def offline_download(tic, binfac=None, test="no", product="auto"):
+        return delilatte.read_lightcurves(paths, binfac=binfac, test="yes")
+
+    def setup():
+        RESULTS.clear()
+        deli = Delicatessen(Document())
+        deli.change_tool(delilatte.DeliLATTE)
+        with contextlib.redirect_stdout(io.StringIO()):
+            deli.primary.source.selected.indices = [0]
+        return deli
+
+    def zoom(deli):
+        time = deli.secondary.tiles["time_full"]
+        start = time[len(time) // 2]
+        deli.secondary.plot.x_range.update(start=start, end=start + days)
+
+    with mock.patch.object(delilatte, "download_data", offline_download):
+        return measure(
+            zoom, setup=setup, doc=lambda deli: deli.doc, repeat=repeat
+        )
+
+
+def bench_callback_fake_mast(paths, repeat):
+    """
+    ``DeliLATTE.select`` with the light curves downloaded from a local
+    stand-in for MAST (with 20 ms of latency per request): the whole path,
+    from the TIC query to the plots. The results shared between sessions are
+    cleared before every run.
+
+    """
+
+    def setup():
+        RESULTS.clear()
+        deli = Delicatessen(Document())
+        deli.change_tool(delilatte.DeliLATTE)
+        return deli
+
+    def select(deli):
+        with contextlib.redirect_stdout(io.StringIO()):
+            deli.primary.source.selected.indices = [0]
+
+    # The files are served as the first sectors of the selected star
+    ticid = int(setup().primary.source.data["ticid"][0])
+    files = {(ticid, sector + 1): path for sector, path in enumerate(paths)}
+    with FakeMast({ticid: CVZ_POSITION}, files, latency=0.02) as fake:
+        mast.configure(url=fake.url)
+        try:
+            return measure(
+                select, setup=setup, doc=lambda deli: deli.doc, repeat=repeat
+            )
+        finally:
+            mast.configure()
+
+
+BENCHMARKS = [
+    ("read flux (astropy)", bench_read_flux_astropy),
+    ("read flux (fits)", bench_read_flux),
+    ("read_lightcurves", bench_read_lightcurves),
+    ("preprocess", bench_preprocess),
+    ("periodogram", bench_periodogram),
+    ("periodogram (new sector)", bench_periodogram_new_sector),
+    ("transit search", bench_transit_search),
+    ("DeliLATTE.select", bench_callback),
+    ("DeliLATTE.select (fake MAST)", bench_callback_fake_mast),
+    ("DeliLATTE zoom (1 day)", bench_zoom),
+    (
+        "centroid tab (every cadence)",
+        partial(bench_centroid_tab, resolution="full"),
+    ),
+    ("centroid tab (10 min)", bench_centroid_tab),
+]
+
+
+def run(data_dir, sector_counts=SECTOR_COUNTS, repeat=3):
+    for nsectors in sector_counts:
+        paths = make_lightcurve_files(
+            TIC, range(1, nsectors + 1), data_dir / "lightcurves"
+        )
+        for name, bench in BENCHMARKS:
+            result = bench(paths, repeat)
+            result.update(name=name, size="{0} sectors".format(nsectors))
+            yield result
@@ -0,0 +1,105 @@
+"""
+Benchmarks of the light curve cache format (`delicatessen.store`) against
+FITS: writing and reading the processed light curves of a star.
+
+"""
+
+# Standard library
+import contextlib
+import io
+
+# Third-party
+import numpy as np
+
+# delicatessen
+from delicatessen.tools import delilatte
+
+# Benchmarks
+from .bench_latte import SECTOR_COUNTS, TIC
+from .measure import measure
+from .synthetic import make_lightcurve_files
+
+
+def write_fits(path, data):
+    """Save ``data`` as a FITS file, with one table per group of columns."""
+    import astropy.io.fits as pf
+
+    hdus = [pf.PrimaryHDU()]
+    for group in delilatte.DATA_GROUPS:
+        hdus.append(
+            pf.BinTableHDU.from_columns(
+                [
+                    pf.Column(
+                        name=name,
+                        format="D" if name == group[0] else "E",
+                        array=np.asarray(data[name]),
+                    )
+                    for name in group
+                ]
+            )
+        )
+    pf.HDUList(hdus).writeto(path, overwrite=True)
+
+
+def read_fits(path):
+    """Read ``path`` back as native arrays, ready for a ColumnDataSource."""
+    import astropy.io.fits as pf
+
+    with pf.open(path) as hdus:
+        return {
+            name: np.array(hdu.data[name])
+            for hdu in hdus[1:]
+            for name in hdu.columns.names
+        }
+
+
+def touch(data):
+    """Read every column (memory-mapped columns are only read when used)."""
+    for value in data.values():
+        if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+            np.nansum(value)
+
+
+def run(data_dir, sector_counts=SECTOR_COUNTS, repeat=3):
+    directory = data_dir / "store"
+    directory.mkdir(parents=True, exist_ok=True)
+    for nsectors in sector_counts:
+        paths = make_lightcurve_files(
+            TIC, range(1, nsectors + 1), data_dir / "lightcurves"
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = dict(
+                zip(
+                    delilatte.DATA_KEYS,
+                    delilatte.read_lightcurves(paths, test="yes"),
+                )
+            )
+
+        formats = [
+            ("fits", ".fits", lambda p: write_fits(p, data), read_fits),
+            (
+                "lc",
+                ".lc",
+                lambda p: delilatte.save_data(p, data),
+                delilatte.load_data,
+            ),
+            (
+                "lc (zlib)",
+                ".lcz",
+                lambda p: delilatte.save_data(p, data, compress=True),
+                delilatte.load_data,
+            ),
+        ]
+        for name, suffix, write, read in formats:
+            path = directory / "{0}-{1}{2}".format(TIC, nsectors, suffix)
+            for action, bench in [
+                ("write", lambda _: write(path)),
+                ("read", lambda _: touch(read(path))),
+            ]:
+                result = measure(bench, repeat=repeat)
+                result.update(
+                    name="{0} {1}".format(action, name),
+                    size="{0} sectors".format(nsectors),
+                    file_size=path.stat().st_size,
+                )
+                yield result
@@ -0,0 +1,98 @@
+"""
+A local stand-in for a remote catalog feed (e.g., the TOI catalog of
+ExoFOP), to run the incremental refresh of `delicatessen.sources` offline.
+
+It serves a table as CSV (``/table.csv``) and JSON (``/table.json``), with
+an ``ETag`` that changes with the table, so that conditional requests of an
+unchanged table get a ``304 Not Modified``. Every row has an ``updated``
+column (the version of the table in which it last changed), and the
+``since`` parameter of a request keeps only the rows updated after it::
+
+    with FakeFeed(table, key="ticid") as fake:
+        source = RemoteTable(fake.url + "/table.csv", since=SINCE)
+        ...
+        fake.update(rows)
+
+"""
+
+# Standard library
+import threading
+
+# Third-party
+import pandas as pd
+from tornado.web import Application, RequestHandler
+
+# Benchmarks
+from .fake_mast import BackgroundServer
+
+# The parameter and column of the rows updated since a version, as given to
+# `delicatessen.sources.RemoteTable`
+SINCE = ("since", "updated")
+
+
+class TableHandler(RequestHandler):
+    def initialize(self, fake):
+        self.fake = fake
+
+    def get(self, format):
+        version, table = self.fake.version, self.fake.table
+        etag = '"{0}"'.format(version)
+        self.fake.requests += 1
+        if self.request.headers.get("If-None-Match") == etag:
+            self.set_status(304)
+            return
+        since = self.get_query_argument(SINCE[0], None)
+        if since is not None:
+            table = table[table[SINCE[1]] > float(since)]
+        self.set_header("ETag", etag)
+        if format == "json":
+            self.set_header("Content-Type", "application/json")
+            self.write(table.to_json(orient="records"))
+        else:
+            self.set_header("Content-Type", "text/csv")
+            self.write(table.to_csv(index=False))
+
+
+class FakeFeed(BackgroundServer):
+    """
+    A stand-in for a remote catalog feed, served from a background thread.
+
+    Parameters
+    ----------
+    table  :  DataFrame
+        the table served (with an ``updated`` column of zeros added)
+    key  :  str
+        the column of unique row ids, to update rows (see `update`)
+
+    """
+
+    def __init__(self, table, key="ticid"):
+        self.table = table.assign(**{SINCE[1]: 0})
+        self.key = key
+        self.version = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def update(self, rows):
+        """
+        Add the ``rows`` (a DataFrame) to the table, replacing the rows with
+        the same keys.
+        """
+        with self._lock:
+            version = self.version + 1
+            rows = rows.assign(**{SINCE[1]: version})
+            table = self.table.set_index(self.key)
+            rows = rows.set_index(self.key)
+            known = rows.index.isin(table.index)
+            table.update(rows[known])
+            table.loc[rows.index[known], SINCE[1]] = version
+            table = pd.concat([table, rows[~known]]).reset_index()
+            self.table = table.astype({SINCE[1]: int})
+            self.version = version
+
+    def application(self):
+        """The Tornado application of the server."""
+        return Application(
+            [(r"/table\.(csv|json)", TableHandler, dict(fake=self))],
+            log_function=lambda handler: None,
+        )
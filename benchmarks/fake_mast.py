@@ -0,0 +1,185 @@
+"""
+A local stand-in for MAST, to run the whole DeliLATTE path (TIC query,
+sectors, downloads, parsing and plots) offline.
+
+It answers the TIC queries of `delicatessen.mast` with the positions of a
+few stars, and serves light curve files (e.g., from
+`synthetic.make_lightcurve_files`) at the paths of the SPOC and TESS-SPOC
+download links of `delicatessen.products`, with an optional latency. The
+client is pointed at it with ``delicatessen.mast.configure(url=...)``::
+
+    with FakeMast(stars, files) as fake:
+        mast.configure(url=fake.url)
+        ...
+
+"""
+
+# Standard library
+import asyncio
+import json
+import re
+import socket
+import threading
+from urllib.parse import unquote
+
+# Third-party
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.web import Application, HTTPError, RequestHandler
+
+# delicatessen
+from delicatessen import mast
+
+# A position in the southern continuous viewing zone: tess-point puts it on
+# a camera in every sector of the first year (and later ones)
+CVZ_POSITION = (100.0, -68.0)
+
+# The TIC ID and sector in the file names of the download links, and their
+# product
+SPOC_FILE = re.compile(r"-s(\d{4})-(\d{16})-\d{4}-(a_fast|s)_lc\.fits$")
+TESS_SPOC_FILE = re.compile(r"_(\d{16})-s(\d{4})_tess_v1_lc\.fits$")
+SPOC_PRODUCTS = {"a_fast": "20s", "s": "2min"}
+
+
+class InvokeHandler(RequestHandler):
+    # The MAST API: only the TIC queries by ID
+    def initialize(self, fake):
+        self.fake = fake
+
+    async def post(self):
+        await self.fake.wait()
+        request = json.loads(unquote(self.get_body_argument("request")))
+        if request.get("service") != "Mast.Catalogs.Filtered.Tic":
+            raise HTTPError(400)
+        ids = request["params"]["filters"][0]["values"]
+        data = [
+            dict(ID=int(tic), ra=ra, dec=dec)
+            for tic, (ra, dec) in self.fake.stars.items()
+            if str(tic) in ids
+        ]
+        self.write(json.dumps(dict(status="COMPLETE", data=data)))
+
+
+class FileHandler(RequestHandler):
+    # The light curve files, from the name in the download link
+    def initialize(self, fake):
+        self.fake = fake
+
+    async def get(self, path=""):
+        await self.fake.wait()
+        name = self.get_query_argument("uri", path)
+        match = SPOC_FILE.search(name)
+        if match is not None:
+            sector, tic, kind = match.groups()
+            product = SPOC_PRODUCTS[kind]
+        else:
+            match = TESS_SPOC_FILE.search(name)
+            if match is None:
+                raise HTTPError(404)
+            tic, sector = match.groups()
+            product = "ffi"
+        path = self.fake.files.get((int(tic), int(sector)))
+        if path is None or product not in self.fake.products:
+            raise HTTPError(404)
+        self.fake.downloads += 1
+        with open(path, "rb") as f:
+            self.set_header("Content-Type", "application/fits")
+            self.write(f.read())
+
+
+class BackgroundServer:
+    """
+    A Tornado application (see `application`), served on a free port of
+    localhost from a background thread, with its own event loop.
+    """
+
+    url = None
+    _loop = None
+    _thread = None
+
+    def application(self):
+        raise NotImplementedError
+
+    def start(self):
+        """Start serving on a free port of localhost; returns the URL."""
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(128)
+        sock.setblocking(False)
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            self._loop = IOLoop.current()
+            server = HTTPServer(self.application())
+            server.add_sockets([sock])
+            self._loop.add_callback(started.set)
+            self._loop.start()
+            server.stop()
+            self._loop.close(all_fds=True)
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        self.url = "http://127.0.0.1:{0}".format(sock.getsockname()[1])
+        return self.url
+
+    def stop(self):
+        """Stop the server."""
+        if self._loop is not None:
+            self._loop.add_callback(self._loop.stop)
+            self._thread.join()
+            self._loop = self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeMast(BackgroundServer):
+    """
+    A stand-in for MAST, served from a background thread.
+
+    Parameters
+    ----------
+    stars  :  dict
+        TIC ID -> (ra, dec) of the stars in the TIC
+    files  :  dict
+        (TIC ID, sector) -> path of the light curve file served
+    products  :  list of str
+        the products the files are served as (by default, all): the links
+        of the other products are not found, like those of the stars outside
+        of the 20-second or 2-minute programs
+    latency  :  float
+        the time taken by every answer (s)
+
+    """
+
+    def __init__(
+        self, stars, files, products=("20s", "2min", "ffi"), latency=0.0
+    ):
+        self.stars = dict(stars)
+        self.files = dict(files)
+        self.products = list(products)
+        self.latency = latency
+        self.downloads = 0
+
+    async def wait(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def application(self):
+        """The Tornado application of the server."""
+        kwargs = dict(fake=self)
+        return Application(
+            [
+                (mast.INVOKE_PATH, InvokeHandler, kwargs),
+                (r"/api/v0.1/Download/file/?", FileHandler, kwargs),
+                (r"/hlsps/(.*)", FileHandler, kwargs),
+            ],
+            # Quiet: most links are not found
+            log_function=lambda handler: None,
+        )
@@ -0,0 +1,278 @@
+"""
+Headless load test of a delicatessen Bokeh server.
+
+Opens many simulated browser sessions against a local server, drives selector
+changes and point taps in each of them, and reports the latency percentiles
+of every kind of interaction, the server memory per session and the lag of
+the server event loop. Light curves are computed in the background, so the
+latency of a tap only covers its round trip; the time until its light curve
+is plotted is measured by the server. By default the server is started offline with a
+stubbed MAST backend (see ``benchmarks/loadtest_server.py``).
+
+Usage (from the root of the repository)::
+
+    python -m benchmarks.loadtest --sessions 20 --actions 10
+
+"""
+
+# Standard library
+import argparse
+import asyncio
+import collections
+import json
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.request import urlopen
+
+# Third-party
+import numpy as np
+from bokeh.client import pull_session
+from bokeh.models import ColumnDataSource, MultiSelect
+
+# Benchmarks
+from .loadtest_server import APP_PATH, METRICS_PATH
+
+ROOT = pathlib.Path(__file__).parent.parent.absolute()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def get_metrics(url, reset=False):
+    url = url + METRICS_PATH + ("?reset=1" if reset else "")
+    with urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def start_server(port, args):
+    """Start the instrumented server and wait until it answers."""
+    cmd = [
+        sys.executable,
+        "-m",
+        "benchmarks.loadtest_server",
+        "--port",
+        str(port),
+        "--sectors",
+        str(args.sectors),
+        "--mast-latency",
+        str(args.mast_latency),
+    ]
+    if args.data_file is not None:
+        cmd += ["--data-file", args.data_file]
+    proc = subprocess.Popen(
+        cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = "http://localhost:{0}".format(port)
+    for _ in range(300):
+        try:
+            get_metrics(url)
+            return proc, url
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("The load test server failed to start.")
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("Timed out waiting for the load test server.")
+
+
+class SimulatedUser:
+    """
+    A headless browser session that interacts with the app like a user:
+    it selects the Deli-LATTE tool, then changes the plotted parameters and
+    taps on stars, waiting for the server to catch up after every action.
+
+    """
+
+    def __init__(self, url, latencies, seed=None):
+        self.url = url
+        self.latencies = latencies
+        self.random = random.Random(seed)
+
+    def timed(self, kind, action):
+        start = time.perf_counter()
+        action()
+        self.session.force_roundtrip()
+        self.latencies[kind].append(time.perf_counter() - start)
+
+    def open(self):
+        # Each simulated user runs its own event loop in its own thread
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        start = time.perf_counter()
+        self.session = pull_session(url=self.url + APP_PATH)
+        self.latencies["open"].append(time.perf_counter() - start)
+
+        doc = self.session.document
+        selectors = list(doc.select({"type": MultiSelect}))
+        self.tools = [s for s in selectors if "Deli-LATTE" in s.options][0]
+        self.params = [s for s in selectors if s.title == "X Axis"][0]
+        self.source = [
+            s
+            for s in doc.select({"type": ColumnDataSource})
+            if "ticid" in s.data
+        ][0]
+
+    def select_tool(self):
+        self.timed(
+            "tool", lambda: setattr(self.tools, "value", ["Deli-LATTE"])
+        )
+
+    def change_param(self):
+        value = [self.random.choice(self.params.options)]
+        self.timed("select", lambda: setattr(self.params, "value", value))
+
+    def tap(self):
+        index = self.random.randrange(len(self.source.data["ticid"]))
+        self.timed(
+            "tap", lambda: setattr(self.source.selected, "indices", [index])
+        )
+
+    def act(self, think_time=0.0):
+        self.random.choice([self.change_param, self.tap])()
+        time.sleep(self.random.uniform(0, 2 * think_time))
+
+    def close(self):
+        self.session.close()
+
+
+def run(url, nsessions, nactions, think_time=0.0):
+    """
+    Run the load test against the server at ``url``.
+
+    Returns the latencies of every kind of interaction, the server metrics
+    before the sessions are opened, once they are all open, and at the end.
+
+    """
+    latencies = collections.defaultdict(list)
+    users = [SimulatedUser(url, latencies, seed=i) for i in range(nsessions)]
+    opened = threading.Barrier(nsessions + 1)
+    measured = threading.Barrier(nsessions + 1)
+    errors = []
+
+    def simulate(user):
+        try:
+            user.open()
+            user.select_tool()
+        except Exception as e:
+            errors.append(e)
+        opened.wait()
+        measured.wait()
+        try:
+            for _ in range(nactions):
+                user.act(think_time=think_time)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            user.close()
+
+    metrics = dict(idle=get_metrics(url, reset=True))
+    threads = [threading.Thread(target=simulate, args=(u,)) for u in users]
+    for thread in threads:
+        thread.start()
+    opened.wait()
+    metrics["open"] = get_metrics(url, reset=True)
+    measured.wait()
+    for thread in threads:
+        thread.join()
+    metrics["end"] = get_metrics(url)
+    if errors:
+        raise errors[0]
+    return latencies, metrics
+
+
+def report(latencies, metrics, nsessions):
+    row = "{0:<10} {1:>8} {2:>10} {3:>10} {4:>10} {5:>10}"
+    print(row.format("action", "count", "p50", "p90", "p99", "max"))
+    for kind in ["open", "tool", "select", "tap"]:
+        values = 1e3 * np.array(latencies.get(kind, [np.nan]))
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        print(
+            row.format(
+                kind,
+                len(latencies.get(kind, [])),
+                *["{0:.1f} ms".format(v) for v in (p50, p90, p99, max(values))]
+            )
+        )
+    print()
+    per_session = (metrics["open"]["rss"] - metrics["idle"]["rss"]) / nsessions
+    print(
+        "server memory: {0:.1f} MB idle, {1:.1f} MB per session".format(
+            metrics["idle"]["rss"] / 1024**2, per_session / 1024**2
+        )
+    )
+    print(
+        "session data: {0:.1f} MB in plots and cached results".format(
+            metrics["open"]["session_memory"] / 1024**2
+        )
+    )
+    plot = metrics["end"]["plot_latency"]
+    print(
+        "tap to plot: p50 {0:.1f} ms, p90 {1:.1f} ms, max {2:.1f} ms "
+        "({3} plots)".format(
+            1e3 * plot["p50"],
+            1e3 * plot["p90"],
+            1e3 * plot["max"],
+            plot["count"],
+        )
+    )
+    lag = metrics["end"]["loop_lag"]
+    print(
+        "event-loop lag: p50 {0:.1f} ms, p99 {1:.1f} ms, max {2:.1f} ms".format(
+            1e3 * lag["p50"], 1e3 * lag["p99"], 1e3 * lag["max"]
+        )
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument(
+        "--actions", type=int, default=10, help="interactions per session"
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="mean pause between two interactions of a user (s)",
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="use a running load test server instead of starting one",
+    )
+    parser.add_argument("--data-file", default=None)
+    parser.add_argument("--sectors", type=int, default=4)
+    parser.add_argument("--mast-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--json", type=pathlib.Path, help="also save the results here"
+    )
+    args = parser.parse_args(args)
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_server(free_port(), args)
+    try:
+        latencies, metrics = run(
+            url, args.sessions, args.actions, think_time=args.think_time
+        )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    report(latencies, metrics, args.sessions)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(dict(latencies=latencies, metrics=metrics), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+A delicatessen Bokeh server instrumented for load tests.
+
+The app is the regular ``Delicatessen`` app, but the MAST download in
+DeliLATTE is replaced by a read of synthetic light curve files (with an
+optional artificial latency), so that everything runs offline. The server
+also serves its own metrics as JSON at ``/deli-metrics``.
+
+Usage::
+
+    python -m benchmarks.loadtest_server --port 5006 [--sectors 4]
+
+This is normally started by ``python -m benchmarks.loadtest``.
+
+"""
+
+# Standard library
+import argparse
+import collections
+import json
+import pathlib
+import resource
+import tempfile
+import time
+
+# Third-party
+import numpy as np
+from bokeh.application import Application
+from bokeh.application.handlers import FunctionHandler
+from bokeh.server.server import Server
+from tornado.ioloop import IOLoop
+from tornado.web import RequestHandler
+
+# delicatessen
+from delicatessen.main import Delicatessen
+from delicatessen import tools
+from delicatessen.memory import memory_report
+from delicatessen.tools import delilatte
+
+# Benchmarks
+from .synthetic import make_lightcurve_files
+
+APP_PATH = "/delicatessen"
+METRICS_PATH = "/deli-metrics"
+
+
+def rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Not on Linux: fall back to the peak RSS (kB on Linux, B on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(values):
+    if not len(values):
+        return dict(count=0, p50=0.0, p90=0.0, p99=0.0, max=0.0)
+    values = np.array(values)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return dict(count=len(values), p50=p50, p90=p90, p99=p99, max=values.max())
+
+
+class LoopLagMonitor:
+    """
+    Measure the event-loop lag: how late a timer scheduled every
+    ``interval`` seconds actually fires. Any callback that blocks the loop
+    (e.g., a light curve download) shows up as lag for every session.
+
+    """
+
+    def __init__(self, interval=0.02, maxlen=10000):
+        self.interval = interval
+        self.lags = collections.deque(maxlen=maxlen)
+
+    def start(self):
+        self._loop = IOLoop.current()
+        self._schedule()
+
+    def _schedule(self):
+        self._expected = self._loop.time() + self.interval
+        self._loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        self.lags.append(max(0.0, self._loop.time() - self._expected))
+        self._schedule()
+
+    def reset(self):
+        self.lags.clear()
+
+    def summary(self):
+        return percentiles(self.lags)
+
+
+class PlotLatencyMonitor:
+    """
+    Measure the time from a tap on a star to its light curve being plotted.
+
+    DeliLATTE computes the light curves in worker threads, so this is only
+    known on the server, once the tool shows them. Taps followed by another
+    tap before their light curve is shown are not counted.
+
+    """
+
+    def __init__(self, maxlen=10000):
+        self.latencies = collections.deque(maxlen=maxlen)
+
+    def start(self):
+        tool = tools.load_tool("Deli-LATTE")
+        callback, show = tool.callback, tool.show
+        latencies = self.latencies
+
+        def timed_callback(self, attr, old, new):
+            self._tapped = time.perf_counter()
+            callback(self, attr, old, new)
+
+        def timed_show(self, ticid, product, data):
+            show(self, ticid, product, data)
+            tapped = getattr(self, "_tapped", None)
+            if (
+                data is not None
+                and tapped is not None
+                and self.selected(ticid, product)
+            ):
+                latencies.append(time.perf_counter() - tapped)
+                self._tapped = None
+
+        tool.callback, tool.show = timed_callback, timed_show
+
+    def reset(self):
+        self.latencies.clear()
+
+    def summary(self):
+        return percentiles(self.latencies)
+
+
+class MetricsHandler(RequestHandler):
+    """
+    Report the server memory, number of sessions, event-loop lag and
+    tap-to-plot latency.
+
+    """
+
+    def initialize(self, monitor, plot_monitor):
+        self.monitor = monitor
+        self.plot_monitor = plot_monitor
+
+    def get(self):
+        sessions = self.application.get_sessions(APP_PATH)
+        metrics = dict(
+            rss=rss(),
+            sessions=len(sessions),
+            session_memory=memory_report()["total"],
+            loop_lag=self.monitor.summary(),
+            plot_latency=self.plot_monitor.summary(),
+        )
+        if self.get_argument("reset", None) is not None:
+            self.monitor.reset()
+            self.plot_monitor.reset()
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(metrics))
+
+
+def stub_mast(paths, latency=0.0):
+    """
+    Replace the MAST download in DeliLATTE with a read of local files.
+
+    The call blocks for ``latency`` seconds, like the real download does.
+
+    """
+
+    def offline_download(tic, binfac=None, test="no", product="auto"):
+        time.sleep(latency)
+        return delilatte.read_lightcurves(paths, binfac=binfac, test="yes")
+
+    delilatte.download_data = offline_download
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=5006)
+    parser.add_argument("--data-file", default=None)
+    parser.add_argument("--sectors", type=int, default=4)
+    parser.add_argument(
+        "--mast-latency",
+        type=float,
+        default=0.0,
+        help="artificial latency of the stubbed MAST download (s)",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=pathlib.Path,
+        default=pathlib.Path(tempfile.gettempdir()) / "deli-benchmarks",
+    )
+    args = parser.parse_args(args)
+
+    paths = make_lightcurve_files(
+        123456789, range(1, args.sectors + 1), args.data_dir / "lightcurves"
+    )
+    stub_mast(paths, latency=args.mast_latency)
+
+    def modify_doc(doc):
+        Delicatessen(doc, data_file=args.data_file)
+
+    monitor = LoopLagMonitor()
+    plot_monitor = PlotLatencyMonitor()
+    plot_monitor.start()
+    server = Server(
+        {APP_PATH: Application(FunctionHandler(modify_doc))},
+        port=args.port,
+        allow_websocket_origin=["*"],
+        extra_patterns=[
+            (
+                METRICS_PATH,
+                MetricsHandler,
+                dict(monitor=monitor, plot_monitor=plot_monitor),
+            )
+        ],
+    )
+    server.start()
+    monitor.start()
+    server.io_loop.start()
+
+
+if __name__ == "__main__":
+    main()
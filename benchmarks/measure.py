@@ -0,0 +1,101 @@
+"""Helpers to time a call and record its memory and Bokeh message size."""
+
+# Standard library
+import gc
+import json
+import time
+import tracemalloc
+
+# Third-party
+import numpy as np
+from bokeh.document.events import DocumentPatchedEvent
+from bokeh.protocol import Protocol
+
+
+def message_size(msg):
+    """Size in bytes of a Bokeh protocol message as sent over the websocket."""
+    size = len(msg.header_json) + len(msg.metadata_json)
+    size += len(msg.content_json)
+    for header, payload in msg.buffers:
+        if not isinstance(header, str):
+            header = json.dumps(header)
+        size += len(header) + len(payload)
+    return size
+
+
+def document_size(doc):
+    """Size in bytes of the message that ships ``doc`` to a new session."""
+    return message_size(Protocol().create("PULL-DOC-REPLY", "bench", doc))
+
+
+class PatchRecorder:
+    """
+    Record the document changes triggered by a callback, as they would be
+    sent to the browser in a ``PATCH-DOC`` message.
+
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.events = []
+
+    def _record(self, event):
+        if isinstance(event, DocumentPatchedEvent):
+            self.events.append(event)
+
+    def __enter__(self):
+        self.events = []
+        self.doc.on_change(self._record)
+        return self
+
+    def __exit__(self, *exc):
+        self.doc.remove_on_change(self._record)
+
+    @property
+    def size(self):
+        if not self.events:
+            return 0
+        return message_size(Protocol().create("PATCH-DOC", self.events))
+
+
+def measure(func, setup=None, doc=None, repeat=3):
+    """
+    Benchmark ``func``.
+
+    ``setup`` (if given) is called before every run and its return value is
+    passed to ``func``. The run time is the median over ``repeat`` runs; the
+    peak memory and the message size are recorded in an extra traced run, so
+    that tracing does not inflate the timings. If ``doc`` is a callable, it
+    is called with the setup value to get the Bokeh document to watch.
+
+    Returns
+    -------
+    dict with ``time`` (s), ``peak_memory`` (bytes) and ``message_size``
+    (bytes, or None if there is no document to watch)
+
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = setup() if setup is not None else None
+    watched = doc(arg) if callable(doc) else doc
+    gc.collect()
+    tracemalloc.start()
+    if watched is not None:
+        with PatchRecorder(watched) as recorder:
+            func(arg)
+        size = recorder.size
+    else:
+        func(arg)
+        size = None
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(
+        time=float(np.median(times)), peak_memory=peak, message_size=size
+    )
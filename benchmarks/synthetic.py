@@ -0,0 +1,122 @@
+"""Synthetic catalogs and TESS light curve files for the benchmarks."""
+
+# Standard library
+import pathlib
+
+# Third-party
+import numpy as np
+import astropy.table as at
+import astropy.io.fits as pf
+
+# Number of 2-minute cadences in a ~27 day TESS sector
+CADENCES_PER_SECTOR = 19737
+
+# Length of a TESS sector (days) and start of sector 1 (BJD - 2457000)
+SECTOR_LENGTH = 27.4
+FIRST_SECTOR_START = 1325.3
+
+
+def make_catalog(nrows, path, seed=42):
+    """
+    Write a synthetic TIC x Gaia-like catalog with ``nrows`` rows to ``path``.
+
+    The columns mirror ``data/TESS-Gaia-mini.csv``. Files are only written
+    once: if ``path`` already exists it is returned as is.
+
+    """
+    path = pathlib.Path(path)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    parallax = rng.lognormal(0.5, 1.0, nrows)
+    tbl = at.Table()
+    tbl["ra"] = rng.uniform(0, 360, nrows)
+    tbl["dec"] = np.degrees(np.arcsin(rng.uniform(-1, 1, nrows)))
+    tbl["parallax"] = parallax
+    tbl["source_id"] = rng.integers(1, 2**62, nrows, dtype=np.int64)
+    tbl["phot_g_mean_mag"] = rng.uniform(5, 17, nrows).astype(np.float32)
+    tbl["bp_rp"] = rng.normal(1.0, 0.4, nrows).astype(np.float32)
+    tbl["ticid"] = np.arange(1, nrows + 1, dtype=np.int64) * 7 + 100000000
+    tbl["tmag"] = tbl["phot_g_mean_mag"] - 0.5
+    tbl["dist"] = 1.0 / parallax
+    tbl.write(path)
+    return path
+
+
+def make_lightcurve(tic, sector, seed=None):
+    """
+    Return an HDU list mimicking a SPOC 2-minute light curve file.
+
+    The flux has a sinusoidal signal, a few box-shaped transits and white
+    noise; the quality flags contain momentum dumps and scattered bad cadences.
+
+    """
+    rng = np.random.default_rng(seed if seed is not None else sector)
+    n = CADENCES_PER_SECTOR
+    t0 = FIRST_SECTOR_START + (sector - 1) * SECTOR_LENGTH
+    time = t0 + np.arange(n) * (2.0 / 60 / 24)
+
+    flux = 1.0 + 1e-3 * np.sin(2 * np.pi * time / 3.7)
+    flux[((time - t0) % 4.3) < 0.1] -= 5e-3
+    flux = 1e4 * (flux + 5e-4 * rng.standard_normal(n))
+
+    quality = np.zeros(n, dtype=np.int32)
+    quality[rng.integers(0, n, n // 50)] = 1
+    quality[:: n // 8] |= 2**5
+    flux[rng.integers(0, n, n // 200)] = np.nan
+
+    columns = [
+        pf.Column(name="TIME", format="D", array=time),
+        pf.Column(name="PDCSAP_FLUX", format="E", array=flux),
+        pf.Column(name="PDCSAP_FLUX_ERR", format="E", array=np.full(n, 5.0)),
+        pf.Column(name="SAP_FLUX", format="E", array=1.02 * flux),
+        pf.Column(
+            name="SAP_BKG",
+            format="E",
+            array=100 + 10 * rng.standard_normal(n),
+        ),
+        pf.Column(name="QUALITY", format="J", array=quality),
+    ]
+    for name, offset in [
+        ("MOM_CENTR1", 1000.0),
+        ("MOM_CENTR2", 500.0),
+        ("POS_CORR1", 0.0),
+        ("POS_CORR2", 0.0),
+    ]:
+        columns.append(
+            pf.Column(
+                name=name,
+                format="D",
+                array=offset + 0.01 * rng.standard_normal(n),
+            )
+        )
+
+    primary = pf.PrimaryHDU()
+    primary.header["SECTOR"] = sector
+    primary.header["TICID"] = int(tic)
+    primary.header["TESSMAG"] = 10.0
+    primary.header["TEFF"] = 5777.0
+    primary.header["RADIUS"] = 1.0
+    return pf.HDUList(
+        [primary, pf.BinTableHDU.from_columns(columns, name="LIGHTCURVE")]
+    )
+
+
+def make_lightcurve_files(tic, sectors, directory):
+    """
+    Write one synthetic light curve file per sector and return their paths.
+
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for sector in sectors:
+        path = directory / "tess-s{0:04d}-{1:016d}-s_lc.fits".format(
+            sector, int(tic)
+        )
+        if not path.exists():
+            make_lightcurve(tic, sector).writeto(path)
+        paths.append(path)
+    return paths
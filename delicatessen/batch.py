@@ -0,0 +1,250 @@
+"""
+Light curves and periodograms of many stars at once (e.g., the stars
+selected in the main plot).
+
+The light curves and periodograms of the stars are fetched in the worker
+threads of the shared result cache (see `delicatessen.cache`), so they are
+downloaded concurrently, and shared with the DeliLATTE tool. They are then
+stacked, either as ragged arrays (the values of all the stars concatenated,
+and the offset of each star) or as padded 2d arrays (one row per star,
+padded with NaNs), and summarized for all the stars at once.
+
+"""
+
+# delicatessen
+from . import periodogram, products
+from .cache import RESULTS
+from .tools import delilatte
+
+# Standard library
+import concurrent.futures
+from functools import partial
+
+# Third-party
+import numpy as np
+
+# The longest period reported by `analyze` (days): longer periods are not
+# constrained by a single sector
+MAX_PERIOD = products.SECTOR_DAYS / 2
+
+# The number of periodograms stacked at once to find their peaks
+CHUNK = 64
+
+
+def ragged(arrays, dtype=np.float32):
+    """
+    Stack ``arrays`` as ragged arrays.
+
+    Returns
+    -------
+    values  :  array
+        the values of all the arrays, concatenated
+    offsets  :  array
+        the values of array ``i`` are ``values[offsets[i]:offsets[i + 1]]``
+
+    """
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    if not len(arrays):
+        return np.zeros(0, dtype=dtype), offsets
+    return (
+        np.concatenate([np.asarray(a, dtype=dtype) for a in arrays]),
+        offsets,
+    )
+
+
+def padded(values, offsets, fill=np.nan):
+    """
+    Ragged arrays (see `ragged`) as a 2d array, with one row per array,
+    padded with ``fill``.
+    """
+    lengths = np.diff(offsets)
+    out = np.full(
+        (len(lengths), lengths.max(initial=0)), fill, dtype=values.dtype
+    )
+    out[np.arange(out.shape[1]) < lengths[:, None]] = values
+    return out
+
+
+def segment_sum(values, offsets):
+    """The sum of each array of ragged arrays (0 for empty arrays)."""
+    # reduceat cannot reduce empty segments, nor start at the end of values
+    sums = np.add.reduceat(np.append(values, 0), offsets[:-1])
+    return np.where(np.diff(offsets) > 0, sums, 0)
+
+
+def segment_rms(values, offsets):
+    """
+    The RMS scatter about the mean of the finite values of each array of
+    ragged arrays (NaN for arrays with none).
+    """
+    finite = np.isfinite(values)
+    x = np.where(finite, values, 0).astype(np.float64)
+    n = segment_sum(finite, offsets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = segment_sum(x, offsets) / n
+        variance = segment_sum(x * x, offsets) / n - mean**2
+    return np.sqrt(np.maximum(variance, 0))
+
+
+def find_peaks(power, frequency, npeaks=3, min_period=None, max_period=None):
+    """
+    The ``npeaks`` highest local maxima of each row of ``power`` (one
+    periodogram per row, on the grid ``frequency``, in micro Hz), between
+    ``min_period`` and ``max_period`` (days).
+
+    Returns
+    -------
+    periods, powers  :  arrays
+        the period (days) and power of the peaks of each row, from the
+        highest (NaN if a row has fewer peaks)
+
+    """
+    power = np.where(np.isfinite(power), power, -np.inf)
+    peak = np.zeros(power.shape, dtype=bool)
+    peak[:, 1:-1] = (power[:, 1:-1] > power[:, :-2]) & (
+        power[:, 1:-1] >= power[:, 2:]
+    )
+    period = 1 / (frequency * periodogram.MICROHZ)
+    if min_period is not None:
+        peak &= period >= min_period
+    if max_period is not None:
+        peak &= period <= max_period
+    power = np.where(peak, power, -np.inf)
+
+    # The grid may have fewer points than peaks asked for: the missing ones
+    # are NaN too
+    n = min(npeaks, power.shape[1])
+    top = np.argpartition(-power, n - 1, axis=1)[:, :n]
+    top = np.take_along_axis(
+        top, np.argsort(-np.take_along_axis(power, top, 1), axis=1), 1
+    )
+    powers = np.take_along_axis(power, top, 1)
+    found = np.isfinite(powers)
+    periods = np.full((len(power), npeaks), np.nan)
+    peaks = np.full((len(power), npeaks), np.nan)
+    periods[:, :n] = np.where(found, period[top], np.nan)
+    peaks[:, :n] = np.where(found, powers, np.nan)
+    return periods, peaks
+
+
+def _periodogram(ticid, product, future):
+    data = future.result()
+    sectors = "_".join(str(int(s)) for s in data["in_sec"])
+    return RESULTS.submit(
+        ("periodogram", ticid, product, sectors),
+        partial(delilatte.periodogram_of, data, ticid, product),
+    )
+
+
+def analyze(
+    ticids,
+    product="auto",
+    layout="ragged",
+    npeaks=3,
+    min_period=None,
+    max_period=MAX_PERIOD,
+    timeout=None,
+):
+    """
+    Fetch and summarize the light curves of the stars ``ticids``.
+
+    Parameters
+    ----------
+    ticids  :  list of int
+        the TIC IDs of the stars
+    product  :  str
+        the light curve product (see `delicatessen.products`)
+    layout  :  str
+        "ragged" or "padded": how to stack the light curves (see `ragged`
+        and `padded`)
+    npeaks  :  int
+        the number of periodogram peaks to report
+    min_period, max_period  :  float or None
+        the range of periods (days) of the peaks
+    timeout  :  float or None
+        how long to wait for the light curves and periodograms (seconds)
+
+    Returns
+    -------
+    dict with, for each star (in the order of ``ticids``):
+
+    - ``ticid``, and ``failed``: True for the stars with no light curves
+      (their arrays are empty, and their statistics NaN)
+    - ``time``, ``flux``, ``time_binned`` and ``flux_binned``: the
+      normalized light curves, stacked with ``offsets`` and
+      ``offsets_binned`` for the ragged layout, or as 2d arrays for the
+      padded layout, with ``npoints`` and ``nbinned`` points
+    - ``nsectors``, ``rms`` and ``rms_binned``: the number of sectors and
+      the RMS scatter of the light curves
+    - ``dominant_period`` and ``dominant_power``: the highest peak of the
+      periodogram, and ``peak_periods`` and ``peak_powers``: the ``npeaks``
+      highest peaks (one column per peak)
+
+    """
+    if layout not in ["ragged", "padded"]:
+        raise ValueError("Unknown layout {0!r}".format(layout))
+
+    ticids = [int(ticid) for ticid in ticids]
+    lightcurves = [
+        RESULTS.submit(
+            ("lightcurves", ticid, product),
+            partial(delilatte.fetch_lightcurves, ticid, product),
+        )
+        for ticid in ticids
+    ]
+    concurrent.futures.wait(lightcurves, timeout=timeout)
+
+    blank = dict.fromkeys(delilatte.DATA_KEYS, np.zeros(0))
+    datasets, failed, periodograms = [], [], []
+    for ticid, future in zip(ticids, lightcurves):
+        ok = future.done() and future.exception() is None
+        datasets.append(future.result() if ok else blank)
+        failed.append(not ok)
+        periodograms.append(
+            _periodogram(ticid, product, future) if ok else None
+        )
+    concurrent.futures.wait(
+        [future for future in periodograms if future is not None],
+        timeout=timeout,
+    )
+
+    result = dict(ticid=np.array(ticids, dtype=np.int64))
+    result["failed"] = np.array(failed, dtype=bool)
+    result["nsectors"] = np.array([len(d["in_sec"]) for d in datasets])
+    for suffix, time, flux in [
+        ("", "alltime", "allflux"),
+        ("_binned", "alltimebinned", "allfluxbinned"),
+    ]:
+        t, offsets = ragged([d[time] for d in datasets], dtype=np.float64)
+        f, _ = ragged([d[flux] for d in datasets])
+        result["rms" + suffix] = segment_rms(f, offsets)
+        if layout == "ragged":
+            result["offsets" + suffix] = offsets
+        else:
+            t, f = padded(t, offsets), padded(f, offsets)
+            npoints = np.diff(offsets)
+            result["npoints" if suffix == "" else "nbinned"] = npoints
+        result["time" + suffix], result["flux" + suffix] = t, f
+
+    # The periodograms share the same frequency grid: their peaks are found
+    # a few rows at a time, to bound the size of the stacked periodograms
+    powers = []
+    for future in periodograms:
+        ok = future is not None and future.done() and not future.exception()
+        powers.append(future.result()["power"] if ok else np.zeros(0))
+    periods = np.full((len(ticids), npeaks), np.nan)
+    peaks = np.full((len(ticids), npeaks), np.nan)
+    for start in range(0, len(ticids), CHUNK):
+        stop = start + CHUNK
+        chunk = padded(*ragged(powers[start:stop]))
+        if chunk.shape[1] < 3:
+            continue
+        frequency = periodogram.DF * (1 + np.arange(chunk.shape[1]))
+        periods[start:stop], peaks[start:stop] = find_peaks(
+            chunk, frequency, npeaks, min_period, max_period
+        )
+    result["peak_periods"], result["peak_powers"] = periods, peaks
+    result["dominant_period"] = periods[:, 0]
+    result["dominant_power"] = peaks[:, 0]
+    return result
@@ -0,0 +1,174 @@
+"""
+Results shared by all the sessions of a process (e.g., the light curves of a
+star), computed in worker threads.
+
+Concurrent requests for the same result share a single computation: the
+first one starts it and all of them wait on the same future. Results can also
+be stored in a directory, to share them between the worker processes of the
+server (and across restarts).
+
+"""
+
+# delicatessen
+from .memory import LRUCache
+
+# Standard library
+import os
+import pathlib
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Third-party
+import numpy as np
+
+
+def _write_npz(path, result):
+    np.savez(path, **{k: np.asarray(v) for k, v in result.items()})
+
+
+def _read_npz(path):
+    with np.load(path, allow_pickle=False) as npz:
+        return {
+            name: value[()] if value.ndim == 0 else value
+            for name, value in npz.items()
+        }
+
+
+# How the results of each kind are stored in the directory of the cache:
+# kind -> (file suffix, write(path, result), read(path)). Results of the
+# other kinds are stored as ``.npz`` files.
+FORMATS = {}
+
+
+def register_format(kind, suffix, write, read):
+    """Store (and read) the results of ``kind`` with these functions."""
+    FORMATS[kind] = (suffix, write, read)
+
+
+class ResultCache:
+    """
+    A cache of results (dicts of arrays), keyed by tuples like
+    ``("lightcurves", ticid)``.
+
+    Parameters
+    ----------
+    budget  :  int
+        memory budget of the in-process cache (bytes)
+    directory  :  str or None
+        if given, results are also stored there (one file each, see
+        `register_format`)
+    max_workers  :  int or None
+        number of threads computing results
+
+    """
+
+    def __init__(self, budget=1024**3, directory=None, max_workers=None):
+        self.budget = budget
+        self.directory = directory
+        self.max_workers = max_workers
+        self._results = LRUCache(budget)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Created on first use, so that no thread is started before the
+        # server forks its worker processes
+        self._executor = None
+
+    def configure(self, budget=None, directory=None, max_workers=None):
+        with self._lock:
+            if budget is not None:
+                self.budget = self._results.budget = budget
+            if directory is not None:
+                pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+                self.directory = directory
+            if max_workers is not None:
+                self.max_workers = max_workers
+
+    def submit(self, key, compute):
+        """
+        Return a future of the result ``key``, computing it in a worker thread
+        with ``compute()`` unless it is cached or already being computed.
+
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                future = Future()
+                future.set_result(result)
+                return future
+            if key in self._in_flight:
+                return self._in_flight[key]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+            future = self._executor.submit(self._load_or_compute, key, compute)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda future: self._done(key, future))
+        return future
+
+    def get(self, key, compute):
+        """
+        Return the result ``key``, computing it with ``compute()`` in the
+        calling thread unless it is cached or already being computed (e.g.,
+        the parts of a result computed in a worker thread).
+
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                return result
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            try:
+                future.set_result(self._load_or_compute(key, compute))
+            except BaseException as e:
+                future.set_exception(e)
+            self._done(key, future)
+        return future.result()
+
+    def _done(self, key, future):
+        with self._lock:
+            del self._in_flight[key]
+            if future.exception() is None:
+                self._results.put(key, future.result())
+
+    def _format(self, key):
+        return FORMATS.get(key[0], (".npz", _write_npz, _read_npz))
+
+    def _path(self, key):
+        name = "-".join(str(part) for part in key) + self._format(key)[0]
+        return pathlib.Path(self.directory) / name
+
+    def _load_or_compute(self, key, compute):
+        suffix, write, read = self._format(key)
+        if self.directory is not None and self._path(key).exists():
+            return read(self._path(key))
+        result = compute()
+        if self.directory is not None:
+            # Write to a temporary file first, so that other processes never
+            # see a partial file
+            fd, tmp = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+            os.close(fd)
+            try:
+                write(tmp, result)
+                os.replace(tmp, self._path(key))
+            except BaseException:
+                os.remove(tmp)
+                raise
+        return result
+
+    @property
+    def nbytes(self):
+        return self._results.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+# The cache shared by the sessions of this process
+RESULTS = ResultCache()
@@ -0,0 +1,402 @@
+"""
+The serving format of the catalogs (``deli ingest``).
+
+Parsing a catalog (CSV, FITS, HDF5...) with `astropy.table` takes a while for
+large ones. ``deli ingest`` converts any table that astropy (or, for Excel
+files, pandas) can read, once, into a file that the server opens in constant
+time: it is a file of `delicatessen.store` (the columns stored contiguously
+and aligned), so opening it memory-maps it, and the worker processes of the
+server share its pages. The file holds:
+
+- the columns of the table, downcast to smaller types where it is lossless
+  (e.g., integers to the smallest type that holds their range, doubles to
+  single precision if they are all exactly representable);
+- a hash index of the TIC IDs (an open-addressing table of the rows), to
+  find the rows of given stars;
+- statistics of the numeric columns (range, mean, standard deviation and
+  number of finite values), e.g., for the scales of the sizes and colors of
+  the main plot;
+- for the filterable (numeric) columns, the rows sorted by value, to find
+  the rows within a range of values.
+
+"""
+
+# delicatessen
+from . import store
+
+# Standard library
+import argparse
+import pathlib
+import time
+
+# Third-party
+import numpy as np
+import pandas as pd
+
+# The format of the metadata of a catalog file, and its usual suffix
+FORMAT = "delicatessen-catalog-1"
+SUFFIX = ".deli"
+
+# The column of the TIC IDs (hashed)
+TICID = "ticid"
+
+# The names of the index columns in the file (they cannot clash with the
+# names of the columns of the catalog, which are stored as they are)
+HASH_COLUMN = "index:" + TICID
+SORTED_PREFIX = "sorted:"
+
+# The multiplier of Fibonacci hashing (2**64 / golden ratio), and the
+# largest fraction of the slots of the hash table that are used
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+HASH_LOAD = 0.5
+
+# The types the integer columns are downcast to, in order of preference
+INTEGER_TYPES = [
+    np.int8,
+    np.uint8,
+    np.int16,
+    np.uint16,
+    np.int32,
+    np.uint32,
+    np.int64,
+]
+
+
+def downcast(values):
+    """
+    ``values`` (an array) in the smallest type that holds them exactly:
+    integers in the smallest integer type of their range, floats in single
+    precision if no value changes, and strings (objects) as fixed-width
+    unicode (the missing ones as empty strings). Other types are returned
+    as they are.
+    """
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind in "iu" and len(values):
+        low, high = values.min(), values.max()
+        for dtype in INTEGER_TYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    elif kind == "f" and values.dtype.itemsize > 4:
+        single = values.astype(np.float32)
+        with np.errstate(over="ignore", invalid="ignore"):
+            if np.array_equal(single, values, equal_nan=True):
+                return single
+    elif kind == "O":
+        return np.array(
+            [
+                value.decode() if isinstance(value, bytes) else str(value)
+                for value in np.where(pd.isnull(values), "", values)
+            ],
+            dtype=str,
+        )
+    elif kind == "S":
+        return np.char.decode(values)
+    return values
+
+
+def column_stats(values):
+    """
+    The statistics of a numeric column: its ``min``, ``max``, ``mean``,
+    ``std`` and ``count`` of finite values (None if there is none).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return dict(min=None, max=None, mean=None, std=None, count=0)
+    return dict(
+        min=float(finite.min()),
+        max=float(finite.max()),
+        mean=float(finite.mean()),
+        std=float(finite.std()),
+        count=len(finite),
+    )
+
+
+def merge_stats(stats, values):
+    """
+    The statistics of a numeric column (see `column_stats`) once ``values``
+    are appended to it, without the values already in it.
+    """
+    new = column_stats(values)
+    if not stats["count"]:
+        return new
+    if not new["count"]:
+        return dict(stats)
+    n1, n2 = stats["count"], new["count"]
+    n = n1 + n2
+    delta = new["mean"] - stats["mean"]
+    squares = (
+        n1 * stats["std"] ** 2 + n2 * new["std"] ** 2 + delta**2 * n1 * n2 / n
+    )
+    return dict(
+        min=min(stats["min"], new["min"]),
+        max=max(stats["max"], new["max"]),
+        mean=stats["mean"] + delta * n2 / n,
+        std=float(np.sqrt(squares / n)),
+        count=n,
+    )
+
+
+def _rows_dtype(nrows):
+    # The type of the row numbers of a table of ``nrows``
+    return np.int32 if nrows < 2**31 else np.int64
+
+
+def _hash(ticids, bits):
+    # The slot of ``ticids`` in a hash table of 2**bits slots
+    keys = np.asarray(ticids).astype(np.int64).view(np.uint64)
+    return (keys * HASH_MULTIPLIER) >> np.uint64(64 - bits)
+
+
+def hash_index(ticids):
+    """
+    The hash index of the TIC IDs ``ticids`` (the column of a catalog): an
+    open-addressing (linear probing) table of their rows, -1 for the empty
+    slots, with a power-of-two number of slots.
+    """
+    n = len(ticids)
+    bits = max(1, int(np.ceil(np.log2(max(n, 1) / HASH_LOAD))))
+    slots = np.full(2**bits, -1, dtype=_rows_dtype(n))
+    mask = np.uint64(len(slots) - 1)
+    home = _hash(ticids, bits)
+
+    # The rows are inserted all at once, one probe at a time: at each probe,
+    # the first of the rows still waiting for each free slot takes it
+    pending = np.arange(n)
+    probe = np.uint64(0)
+    while len(pending):
+        slot = ((home[pending] + probe) & mask).astype(np.int64)
+        free = slots[slot] == -1
+        slot, first = np.unique(slot[free], return_index=True)
+        placed = pending[free][first]
+        slots[slot] = placed
+        pending = np.setdiff1d(pending, placed, assume_unique=True)
+        probe += np.uint64(1)
+    return slots
+
+
+def sorted_index(values):
+    """The rows of a numeric column sorted by value (the NaNs last)."""
+    return np.argsort(values, kind="stable").astype(_rows_dtype(len(values)))
+
+
+def read_table(path, format=None):
+    """
+    The table in ``path`` (any format astropy.table can read, or an Excel
+    file), as a DataFrame.
+    """
+    if format is None and pathlib.Path(path).suffix in [".xlsx", ".xls"]:
+        return pd.read_excel(path)
+
+    # Imported here: astropy.table is slow to import
+    import astropy.table as at
+
+    return at.Table.read(path, format=format).to_pandas()
+
+
+def open_table(path, format=None):
+    """
+    The table in ``path`` as a DataFrame: a catalog file, memory-mapped (see
+    `Catalog.to_pandas`), or any table `read_table` can read.
+    """
+    if format is None and is_catalog(path):
+        return Catalog(path).to_pandas()
+    return read_table(path, format=format)
+
+
+def ingest(table, path, filterable=None):
+    """
+    Write the catalog ``table`` (a DataFrame, with a `TICID` column for the
+    app) to ``path`` in the serving format.
+
+    Parameters
+    ----------
+    table  :  DataFrame
+        the catalog
+    path  :  str or path
+        the catalog file to write
+    filterable  :  list of str or None
+        the columns to sort the rows by (by default, all the numeric ones)
+
+    Returns
+    -------
+    dict
+        the metadata of the file (see `Catalog`)
+
+    """
+    columns = {
+        str(name): downcast(table[name].to_numpy()) for name in table.columns
+    }
+    numeric = [
+        name for name, values in columns.items() if values.dtype.kind in "iuf"
+    ]
+    if filterable is None:
+        filterable = numeric
+    for name in filterable:
+        if name not in numeric:
+            raise ValueError("{0!r} is not a numeric column".format(name))
+
+    meta = dict(
+        format=FORMAT,
+        columns=list(columns),
+        rows=len(table),
+        stats={name: column_stats(columns[name]) for name in numeric},
+        filterable=list(filterable),
+    )
+    indexes = {}
+    if TICID in columns:
+        indexes[HASH_COLUMN] = hash_index(columns[TICID])
+    for name in filterable:
+        indexes[SORTED_PREFIX + name] = sorted_index(columns[name])
+    store.write(path, dict(columns, **indexes), meta=meta)
+    return meta
+
+
+def is_catalog(path):
+    """Whether ``path`` is a file of the `delicatessen.store` format."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(store.MAGIC)) == store.MAGIC
+    except OSError:
+        return False
+
+
+class Catalog:
+    """
+    A catalog file written by `ingest`, memory-mapped.
+
+    Attributes
+    ----------
+    columns  :  dict
+        the columns of the catalog (read-only arrays, in the order of the
+        table)
+    stats  :  dict
+        the statistics of the numeric columns (see `column_stats`)
+    filterable  :  list of str
+        the columns with a sorted index (see `range`)
+
+    """
+
+    def __init__(self, path):
+        arrays, _, meta = store.read(path)
+        if meta.get("format") != FORMAT:
+            raise ValueError("{0} is not a catalog file".format(path))
+        self.path = path
+        self.columns = {name: arrays[name] for name in meta["columns"]}
+        self.stats = meta["stats"]
+        self.filterable = meta["filterable"]
+        self._slots = arrays.get(HASH_COLUMN)
+        self._sorted = {
+            name: arrays[SORTED_PREFIX + name] for name in self.filterable
+        }
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def to_pandas(self):
+        """
+        The catalog as a DataFrame, made of the memory-mapped columns
+        (without copying them, but the strings), with the statistics of the
+        columns in its ``attrs["stats"]``.
+        """
+        dataset = pd.DataFrame(self.columns, copy=False)
+        dataset.attrs["stats"] = self.stats
+        return dataset
+
+    def rows(self, ticids):
+        """The rows of the stars ``ticids`` (-1 for those not found)."""
+        if self._slots is None:
+            raise KeyError("The catalog has no {0!r} column".format(TICID))
+        ticids = np.atleast_1d(np.asarray(ticids, dtype=np.int64))
+        column = self.columns[TICID]
+        bits = len(self._slots).bit_length() - 1
+        mask = np.uint64(len(self._slots) - 1)
+        home = _hash(ticids, bits)
+        rows = np.full(len(ticids), -1, dtype=np.int64)
+        pending = np.arange(len(ticids))
+        probe = np.uint64(0)
+        while len(pending):
+            slot = ((home[pending] + probe) & mask).astype(np.int64)
+            row = self._slots[slot]
+            empty = row == -1
+            found = ~empty & (column[np.maximum(row, 0)] == ticids[pending])
+            rows[pending[found]] = row[found]
+            pending = pending[~empty & ~found]
+            probe += np.uint64(1)
+        return rows
+
+    def _bisect(self, name, value, right):
+        # The number of finite values of column ``name`` below ``value``
+        # (or equal to it too, if ``right``), from its sorted index
+        values, order = self.columns[name], self._sorted[name]
+        low, high = 0, self.stats[name]["count"]
+        while low < high:
+            middle = (low + high) // 2
+            v = values[order[middle]]
+            if v < value or (right and v == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, name, low=None, high=None):
+        """
+        The rows where the filterable column ``name`` is between ``low`` and
+        ``high`` (included; None for no bound), sorted by value.
+        """
+        if name not in self._sorted:
+            raise KeyError("{0!r} is not a filterable column".format(name))
+        start = 0 if low is None else self._bisect(name, low, False)
+        stop = (
+            self.stats[name]["count"]
+            if high is None
+            else self._bisect(name, high, True)
+        )
+        return self._sorted[name][start : max(start, stop)]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="deli ingest",
+        description="Convert a catalog (any table astropy can read, or an "
+        "Excel file) into the serving format of delicatessen (to serve with "
+        "deli --args FILE).",
+    )
+    parser.add_argument("catalog", help="the table to convert")
+    parser.add_argument(
+        "output",
+        nargs="?",
+        default=None,
+        help="the catalog file to write (default: the table with the "
+        "{0} suffix)".format(SUFFIX),
+    )
+    parser.add_argument(
+        "--format",
+        default=None,
+        help="the format of the table, if astropy cannot guess it",
+    )
+    parser.add_argument(
+        "--filterable",
+        default=None,
+        help="the columns to index for filtering, separated by commas "
+        "(default: all the numeric ones)",
+    )
+    args = parser.parse_args(args)
+
+    output = args.output
+    if output is None:
+        output = str(pathlib.Path(args.catalog).with_suffix(SUFFIX))
+    filterable = None
+    if args.filterable is not None:
+        filterable = [name for name in args.filterable.split(",") if name]
+
+    start = time.time()
+    table = read_table(args.catalog, format=args.format)
+    ingest(table, output, filterable=filterable)
+    print(
+        "{0}: {1} rows, {2} columns ({3:.1f} s)".format(
+            output, len(table), len(table.columns), time.time() - start
+        )
+    )
@@ -0,0 +1,176 @@
+"""
+Outlier removal and detrending of the light curve of a sector.
+
+The trend is a robust location (the median or Tukey's biweight) of the flux
+in a window sliding along the light curve. It is computed in two vectorized
+steps: the flux is first reduced to its median in short bins of consecutive
+cadences (`BIN`), and the location is then computed in windows of these bins
+at once (a strided view of them, one row per window); the trend at every
+cadence is interpolated between the bins. The flux is divided by the trend,
+and the points too far above it (in units of the robust scatter of the
+residuals) are set to NaN. Transits and eclipses, below the trend, are kept.
+
+"""
+
+# Standard library
+import warnings
+
+# Third-party
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# The width of the window of the trend (days): three times the longest
+# transit searched (see `delicatessen.transits`)
+WINDOW = 1.0
+
+# The width of the bins the flux is reduced to before the trend (days)
+BIN = 30 / 1440
+
+# The clipping threshold of the outliers above the trend (robust standard
+# deviations of the residuals)
+SIGMA = 5.0
+
+# The tuning constant and number of iterations of the biweight location
+BIWEIGHT_C = 5.0
+BIWEIGHT_ITERATIONS = 5
+
+METHODS = ["median", "biweight"]
+
+
+def _nanmedian(values, axis=None):
+    # The median of the finite values, NaN (without a warning) if none
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(values, axis=axis)
+
+
+def biweight_location(values, c=BIWEIGHT_C, iterations=BIWEIGHT_ITERATIONS):
+    """
+    Tukey's biweight location of every row of ``values`` (ignoring NaNs),
+    iterated from the median.
+    """
+    location = _nanmedian(values, axis=1)
+    for _ in range(iterations):
+        deviation = values - location[:, None]
+        mad = _nanmedian(np.abs(deviation), axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            u = deviation / (c * mad[:, None])
+        weight = np.where(np.abs(u) < 1, (1 - u * u) ** 2, 0)
+        deviation = np.where(weight > 0, deviation, 0)
+        total = weight.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step = (weight * deviation).sum(axis=1) / total
+        location = np.where(total > 0, location + step, location)
+    return location
+
+
+def rolling_location(values, window, method="median"):
+    """
+    The location (see `METHODS`) of ``values`` in a window of ``window``
+    values centered on each of them, ignoring NaNs.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown method {0!r}".format(method))
+    n = len(values)
+    window = max(1, min(int(window), n)) | 1
+    padded = np.full(n + window - 1, np.nan, dtype=values.dtype)
+    padded[window // 2 : window // 2 + n] = values
+    windows = sliding_window_view(padded, window)
+    if method == "median":
+        return _nanmedian(windows, axis=1)
+    return biweight_location(windows)
+
+
+def trend(time, flux, window=WINDOW, method="biweight"):
+    """
+    The trend of the light curve of one sector (consecutive cadences), at
+    every cadence: the rolling location of the flux, in a ``window`` (days).
+    NaN where the window has no finite flux.
+    """
+    n = len(flux)
+    finite = np.isfinite(time) & np.isfinite(flux)
+    if finite.sum() < 2:
+        return np.full(n, np.nan, dtype=np.float32)
+
+    # The median of the flux in bins of `k` cadences
+    cadence = np.median(np.diff(time[finite]))
+    k = max(1, int(round(BIN / cadence)))
+    nbins = -(-n // k)
+    bins = np.full(nbins * k, np.nan, dtype=np.float32)
+    bins[:n] = np.where(finite, flux, np.nan)
+    bins = _nanmedian(bins.reshape(nbins, k), axis=1)
+
+    # Their rolling location, interpolated at every cadence
+    location = rolling_location(
+        bins, round(window / (k * cadence)), method=method
+    )
+    good = np.isfinite(location)
+    if not good.any():
+        return np.full(n, np.nan, dtype=np.float32)
+    centers = k * np.arange(nbins) + 0.5 * (k - 1)
+    return np.interp(np.arange(n), centers[good], location[good]).astype(
+        np.float32
+    )
+
+
+def preprocess(
+    time,
+    flux,
+    window=WINDOW,
+    method="biweight",
+    sigma=SIGMA,
+    out=None,
+):
+    """
+    Detrend the light curve of one sector and remove its outliers.
+
+    Parameters
+    ----------
+    time, flux  :  arrays
+        the light curve (consecutive cadences; NaNs allowed)
+    window, method  :
+        the width (days) and method of the trend (see `trend`)
+    sigma  :  float
+        the points more than ``sigma`` robust standard deviations of the
+        residuals above the trend are outliers
+    out  :  float32 array or None
+        where to write the detrended flux (it can be ``flux`` itself); by
+        default, a new array
+
+    Returns
+    -------
+    flux, trend  :  float32 arrays
+        the detrended flux (the flux divided by the trend, NaN for the
+        outliers), and the trend
+
+    """
+    if out is None:
+        out = np.array(flux, dtype=np.float32)
+    elif out is not flux:
+        out[:] = flux
+    fit = trend(time, out, window=window, method=method)
+    out /= fit
+
+    # The robust scatter of the residuals (from the median absolute
+    # deviation), and the outliers above the trend
+    residual = out - 1
+    scatter = 1.4826 * _nanmedian(np.abs(residual - _nanmedian(residual)))
+    with np.errstate(invalid="ignore"):
+        out[residual > sigma * scatter] = np.nan
+    return out, fit
+
+
+def bin_flux(flux, nbins):
+    """
+    The mean of the finite values of ``flux`` in ``nbins`` bins of
+    consecutive cadences, as in the binned light curves of DeliLATTE (of
+    ``len(flux) // nbins`` cadences each; the last cadences are left out).
+    """
+    if not nbins:
+        return np.zeros(0, dtype=np.float32)
+    factor = len(flux) // nbins
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(
+            flux[: nbins * factor].reshape(nbins, factor), axis=1
+        )
@@ -0,0 +1,261 @@
+"""
+Per-star features of the TESS light curves (e.g., the rotation period), for
+all the stars of a catalog, so that they can be plotted like its columns.
+
+The features are extracted offline, in bulk, by ``deli-features``: the
+light curves of the stars are downloaded and summarized in a pool of
+processes, and the features are appended to a CSV file as they are computed,
+so that an interrupted run resumes where it stopped. The server joins the
+features to the catalog (``deli --features FILE``): they are then available
+in the axis, size and color menus of the main plot.
+
+"""
+
+# delicatessen
+from . import batch
+from .cache import RESULTS
+from .tools import delilatte
+
+# Standard library
+import argparse
+import concurrent.futures
+import csv
+import os
+import pathlib
+import time
+
+# Third-party
+import numpy as np
+
+# The features (the names of their columns, once joined to the catalog)
+FEATURES = [
+    "lc_nsectors",
+    "lc_period",
+    "lc_period_power",
+    "lc_amplitude",
+    "lc_rms",
+    "lc_centroid_x_rms",
+    "lc_centroid_y_rms",
+]
+
+
+def _nanstd(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    return float(np.std(values)) if len(values) else np.nan
+
+
+def _amplitude(flux):
+    # The range between the 5th and 95th percentiles of the flux
+    flux = np.asarray(flux, dtype=np.float64)
+    flux = flux[np.isfinite(flux)]
+    if not len(flux):
+        return np.nan
+    low, high = np.percentile(flux, [5, 95])
+    return float(high - low)
+
+
+def compute_features(data):
+    """
+    The features of the light curves ``data`` of a star (a dict with the
+    DeliLATTE ``DATA_KEYS``).
+
+    Returns
+    -------
+    dict with the `FEATURES`: the number of sectors, the period (days) and
+    power of the highest peak of the periodogram (see
+    `delicatessen.batch.analyze`), the amplitude (between the 5th and 95th
+    percentiles of the binned flux, in ppt) and RMS scatter (ppt) of the
+    light curve, and the RMS of the motion of the flux-weighted centroid
+    (pixels)
+
+    """
+    periods = powers = np.full((1, 1), np.nan)
+    pgram = delilatte.periodogram_of(data)
+    if len(pgram["power"]) >= 3:
+        periods, powers = batch.find_peaks(
+            pgram["power"][None, :],
+            pgram["freq"].astype(np.float64),
+            npeaks=1,
+            max_period=batch.MAX_PERIOD,
+        )
+    return dict(
+        lc_nsectors=len(data["in_sec"]),
+        lc_period=float(periods[0, 0]),
+        lc_period_power=float(powers[0, 0]),
+        lc_amplitude=1e3 * _amplitude(data["allfluxbinned"]),
+        lc_rms=1e3 * _nanstd(data["allflux"]),
+        lc_centroid_x_rms=_nanstd(data["allx1"]),
+        lc_centroid_y_rms=_nanstd(data["ally1"]),
+    )
+
+
+def star_features(ticid, product="auto"):
+    """
+    Download the light curves of the star ``ticid`` and compute their
+    features (see `compute_features`).
+    """
+    data = RESULTS.get(
+        ("lightcurves", ticid, product),
+        lambda: delilatte.fetch_lightcurves(ticid, product),
+    )
+    return compute_features(data)
+
+
+def read_features(path):
+    """The features saved in ``path`` (by `extract`): TIC ID -> row."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as f:
+        return {int(row["ticid"]): row for row in csv.DictReader(f)}
+
+
+def _init_worker(cache_dir):
+    # Store the light curves downloaded by the workers where the server finds
+    # them, without keeping them in memory
+    RESULTS.configure(budget=0, directory=cache_dir)
+
+
+def extract(
+    ticids,
+    path,
+    product="auto",
+    processes=None,
+    checkpoint=100,
+    cache_dir=None,
+):
+    """
+    Compute the features of the stars ``ticids`` in a pool of ``processes``
+    and append them to the CSV file ``path``, skipping the stars that are
+    already in it.
+
+    The file is flushed every ``checkpoint`` stars. Stars whose light curves
+    cannot be downloaded are reported and left out, so that they are tried
+    again by the next run. If ``cache_dir`` is given, the light curves are
+    also stored there (see ``deli --cache-dir``).
+
+    Returns
+    -------
+    computed, failed  :  int
+        the number of stars whose features were computed, or failed
+
+    """
+    done = read_features(path)
+    todo = list(dict.fromkeys(int(t) for t in ticids if int(t) not in done))
+    print(
+        "{0} stars to do ({1} already done)".format(
+            len(todo), len(ticids) - len(todo)
+        )
+    )
+    if not todo:
+        return 0, 0
+
+    computed = failed = 0
+    start = time.time()
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    executor = concurrent.futures.ProcessPoolExecutor(
+        processes, initializer=_init_worker, initargs=(cache_dir,)
+    )
+    with executor, open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["ticid"] + FEATURES)
+        if new_file:
+            writer.writeheader()
+        futures = {
+            executor.submit(star_features, ticid, product): ticid
+            for ticid in todo
+        }
+        for future in concurrent.futures.as_completed(futures):
+            ticid = futures[future]
+            try:
+                features = future.result()
+            except Exception as e:
+                print("TIC {0} failed: {1!r}".format(ticid, e))
+                failed += 1
+                continue
+            writer.writerow(dict(features, ticid=ticid))
+            computed += 1
+            if computed % checkpoint == 0:
+                f.flush()
+                print(
+                    "{0}/{1} stars ({2:.1f} stars/s)".format(
+                        computed + failed,
+                        len(todo),
+                        (computed + failed) / (time.time() - start),
+                    )
+                )
+    return computed, failed
+
+
+def join(dataset, features):
+    """
+    The catalog ``dataset`` (a DataFrame with a ``ticid`` column) with the
+    ``features`` (a DataFrame, as saved by `extract`) as new columns, NaN for
+    the stars without features.
+    """
+    features = features.drop_duplicates("ticid", keep="last")
+    columns = [name for name in features.columns if name != "ticid"]
+    joined = dataset.merge(
+        features[["ticid"] + columns].astype(
+            {"ticid": dataset["ticid"].dtype}
+        ),
+        on="ticid",
+        how="left",
+        suffixes=("", "_features"),
+    )
+    joined.index = dataset.index
+    return joined
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="deli-features",
+        description="Compute the light curve features of the stars of a "
+        "catalog (to serve with deli --features).",
+    )
+    parser.add_argument(
+        "output", help="the CSV file the features are appended to"
+    )
+    parser.add_argument(
+        "--catalog",
+        default=None,
+        help="the catalog (with a ticid column; default: the test dataset)",
+    )
+    parser.add_argument(
+        "--product",
+        default="auto",
+        help="the light curve product (20s, 2min, ffi or auto)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=int,
+        default=100,
+        help="save the features every this many stars",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="also store the light curves in this directory (as deli "
+        "--cache-dir)",
+    )
+    args = parser.parse_args(args)
+
+    from .main import load_dataset
+
+    ticids = load_dataset(args.catalog)["ticid"]
+    if args.cache_dir is not None:
+        pathlib.Path(args.cache_dir).mkdir(parents=True, exist_ok=True)
+    computed, failed = extract(
+        list(ticids),
+        args.output,
+        product=args.product,
+        processes=args.processes,
+        checkpoint=args.checkpoint,
+        cache_dir=args.cache_dir,
+    )
+    print("{0} stars done, {1} failed".format(computed, failed))
@@ -0,0 +1,225 @@
+"""
+A minimal reader of the binary tables of FITS files (e.g., TESS light curves).
+
+The file is memory-mapped (or, if it was downloaded, read from its bytes)
+without copying, and only the columns asked for are decoded: each is
+converted once from the big-endian FITS layout to a native array, float32
+by default. Reading the flux of a light curve thus costs one array, instead
+of the whole table.
+
+"""
+
+# Standard library
+import re
+
+# Third-party
+import numpy as np
+
+BLOCK = 2880
+CARD = 80
+
+# The numpy types of the FITS binary table formats (big-endian)
+FORMATS = {
+    "L": "i1",
+    "B": "u1",
+    "I": ">i2",
+    "J": ">i4",
+    "K": ">i8",
+    "E": ">f4",
+    "D": ">f8",
+    "C": ">c8",
+    "M": ">c16",
+    "P": ">i4",
+    "Q": ">i8",
+}
+TFORM = re.compile(r"^\s*(\d*)([A-Z])")
+
+
+def parse_value(value):
+    """Convert the value of a header card to a Python object."""
+    value = value.strip()
+    if value.startswith("'"):
+        # A string, in which '' stands for '
+        end = 1
+        while True:
+            end = value.index("'", end)
+            if value[end + 1 : end + 2] != "'":
+                break
+            end += 2
+        return value[1:end].replace("''", "'").rstrip()
+    value = value.split("/")[0].strip()
+    if value in ("T", "F"):
+        return value == "T"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value.replace("D", "E"))
+    except ValueError:
+        return value
+
+
+def read_header(buf, offset):
+    """
+    Read the header starting at ``offset`` in ``buf``.
+
+    Returns the header (a dict) and the offset of the data that follows it.
+
+    """
+    header = {}
+    while True:
+        block = bytes(buf[offset : offset + BLOCK]).decode("ascii")
+        if len(block) < BLOCK:
+            raise ValueError("Truncated FITS header")
+        offset += BLOCK
+        for i in range(0, BLOCK, CARD):
+            card = block[i : i + CARD]
+            key = card[:8].strip()
+            if key == "END":
+                return header, offset
+            if card[8:10] == "= ":
+                header[key] = parse_value(card[10:])
+
+
+def data_size(header):
+    """The size of the data of an HDU, padded to a whole number of blocks."""
+    naxis = header.get("NAXIS", 0)
+    if naxis == 0:
+        return 0
+    size = 1
+    for i in range(1, naxis + 1):
+        size *= header["NAXIS{0}".format(i)]
+    size = (
+        abs(header["BITPIX"])
+        // 8
+        * header.get("GCOUNT", 1)
+        * (header.get("PCOUNT", 0) + size)
+    )
+    return -(-size // BLOCK) * BLOCK
+
+
+def table_dtype(header):
+    """The (big-endian) numpy record type of the rows of a binary table."""
+    names, formats, offsets = [], [], []
+    offset = 0
+    for i in range(1, header["TFIELDS"] + 1):
+        repeat, code = TFORM.match(header["TFORM{0}".format(i)]).groups()
+        repeat = int(repeat) if repeat else 1
+        if code == "A":
+            dtype, size = np.dtype("S{0}".format(repeat)), repeat
+        elif code == "X":
+            nbytes = -(-repeat // 8)
+            dtype, size = np.dtype(("u1", (nbytes,))), nbytes
+        else:
+            dtype = np.dtype(FORMATS[code])
+            if code in "PQ":
+                # A descriptor of a variable-length array in the heap
+                dtype = np.dtype((dtype, (2,)))
+            elif repeat != 1:
+                dtype = np.dtype((dtype, (repeat,)))
+            size = dtype.itemsize
+        names.append(header.get("TTYPE{0}".format(i), "col{0}".format(i)))
+        formats.append(dtype)
+        offsets.append(offset)
+        offset += size
+    return np.dtype(
+        dict(
+            names=names,
+            formats=formats,
+            offsets=offsets,
+            itemsize=header["NAXIS1"],
+        )
+    )
+
+
+class FitsTable:
+    """
+    A binary table of a FITS file, decoding its columns on demand.
+
+    Parameters
+    ----------
+    source  :  str, path, or bytes
+        the path of the file (memory-mapped), or its content
+    hdu  :  int
+        the index of the HDU of the table (1 for TESS light curves)
+
+    Attributes
+    ----------
+    headers  :  list of dict
+        the headers of the HDUs up to the table (e.g., ``headers[0]`` is the
+        primary header)
+    header  :  dict
+        the header of the table
+
+    """
+
+    def __init__(self, source, hdu=1):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            buf = np.frombuffer(source, dtype=np.uint8)
+        else:
+            buf = np.memmap(source, dtype=np.uint8, mode="r")
+
+        self.headers = []
+        offset = 0
+        for _ in range(hdu + 1):
+            header, offset = read_header(buf, offset)
+            self.headers.append(header)
+            data_offset = offset
+            offset += data_size(header)
+        self.header = self.headers[-1]
+        if self.header.get("XTENSION") != "BINTABLE":
+            raise ValueError("HDU {0} is not a binary table".format(hdu))
+
+        # A view of the rows of the table (no data is read yet)
+        self._rows = np.ndarray(
+            shape=(self.header["NAXIS2"],),
+            dtype=table_dtype(self.header),
+            buffer=buf,
+            offset=data_offset,
+        )
+        self._columns = {}
+
+    @property
+    def names(self):
+        return list(self._rows.dtype.names)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def column(self, name, dtype=np.float32):
+        """
+        Return the column ``name`` as a native array of type ``dtype`` (or of
+        the type of the column if None), scaled if the table says so.
+
+        The column is decoded once; later calls return the same array, so it
+        must not be modified.
+
+        """
+        key = (name, None if dtype is None else np.dtype(dtype))
+        if key not in self._columns:
+            i = self.names.index(name) + 1
+            raw = self._rows[name]
+            if dtype is None:
+                dtype = raw.dtype.newbyteorder("=")
+            scale = self.header.get("TSCAL{0}".format(i), 1)
+            zero = self.header.get("TZERO{0}".format(i), 0)
+            if scale != 1 or zero != 0:
+                values = raw.astype(np.float64) * scale + zero
+                values = values.astype(dtype, copy=False)
+            else:
+                values = raw.astype(dtype)
+            values.flags.writeable = False
+            self._columns[key] = values
+        return self._columns[key]
+
+
+def read_columns(source, names, dtype=np.float32, hdu=1):
+    """
+    Read the columns ``names`` of the binary table of a FITS file.
+
+    Returns a dict of native arrays of type ``dtype`` (see `FitsTable`).
+
+    """
+    table = FitsTable(source, hdu=hdu)
+    return {name: table.column(name, dtype=dtype) for name in names}
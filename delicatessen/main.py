@@ -1,56 +1,158 @@
 # delicatessen
-from . import tools
+from . import catalog, sources, tools
+from .memory import SESSIONS, nbytes
 
 # Standard library
+import functools
 import pathlib
 import sys
 from collections import OrderedDict
 
 # Third-party
-import astropy.table as at
 import numpy as np
-import pandas as pd
-import requests
-from io import BytesIO
+from bokeh.core.property.validation import validate
 from bokeh.io import curdoc
 from bokeh.layouts import column, row, Spacer
 from bokeh.models import (
     ColumnDataSource,
-    AjaxDataSource,
     Div,
-    Select,
     MultiSelect,
-    Slider,
     CheckboxGroup,
     Panel,
     Tabs,
     CustomJS,
+    CustomJSTransform,
+    LinearColorMapper,
 )
 from bokeh.plotting import figure
 from bokeh.models.tools import (
-    BoxSelectTool,
-    BoxZoomTool,
     LassoSelectTool,
     PanTool,
-    PolySelectTool,
     TapTool,
-    WheelZoomTool,
-    WheelPanTool,
-    ZoomInTool,
-    ZoomOutTool,
     HoverTool,
-    CrosshairTool,
     ResetTool,
 )
-from bokeh.models import Range1d
 from bokeh.palettes import Viridis256
 from bokeh.transform import linear_cmap
-from bokeh.server.server import Server
-
 
 DELI_PATH = pathlib.Path(__file__).parent.absolute()
 LOGO_URL = "delicatessen/static/images/logo.gif"
 
+# Memory budget for the light curves etc. cached by a session (bytes)
+MEMORY_BUDGET = 256 * 1024**2
+
+# The dataset served by the app (the data file), in the "Main Dishes" menu
+# with the datasets of `delicatessen.sources`
+DEFAULT_DATASET = "Test data"
+
+# Client-side mode (see `Plot.setup_client_side`): the transforms of the
+# marker sizes (scaled to 0-25 between the min and max of the column) and of
+# the axes (log scale), and the callback applying the choices of the user
+SIZE_TRANSFORM = """
+let low = Infinity, high = -Infinity
+for (const x of xs) {
+    if (isFinite(x)) {
+        low = Math.min(low, x)
+        high = Math.max(high, x)
+    }
+}
+const sizes = new Float64Array(xs.length)
+for (let i = 0; i < xs.length; i++)
+    sizes[i] = 25 * (xs[i] - low) / (high - low)
+return sizes
+"""
+LOG_TRANSFORM = """
+const values = new Float64Array(xs.length)
+for (let i = 0; i < xs.length; i++)
+    values[i] = xs[i] > 0 ? Math.log10(xs[i]) : NaN
+return values
+"""
+APPEARANCE_CALLBACK = """
+const active = checkbox.active
+const axes = [[xaxis, xaxis_widget, active.includes(2), "x"],
+              [yaxis, yaxis_widget, active.includes(3), "y"]]
+const size = size_widget.value[0]
+const color = color_widget.value[0]
+if (color != "None" && color in bounds) {
+    mapper.low = bounds[color][0]
+    mapper.high = bounds[color][1]
+}
+x_range.flipped = active.includes(0)
+y_range.flipped = active.includes(1)
+
+// The glyphs of the selected and unselected points too
+for (const glyph of glyphs) {
+    for (const [axis, widget, log, name] of axes) {
+        const column = widget.value[0]
+        glyph[name] = log ? {field: column, transform: log_transform}
+                          : {field: column}
+        axis.axis_label = log ? "log10 " + column : column
+    }
+    glyph.size = size == "None" ? {value: 5}
+                                : {field: size, transform: size_transform}
+    glyph.fill_color = color == "None" || !(color in bounds)
+        ? {value: mapper.palette[0]}
+        : {field: color, transform: mapper}
+}
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _read_dataset(path, features=None):
+    # The data file can be a catalog file (see `delicatessen.catalog`),
+    # memory-mapped, or any file format that astropy.table can read (only
+    # once per process: the datasets are cached)
+    dataset = catalog.open_table(path)
+    if features is not None:
+        from .features import join
+
+        dataset = join(dataset, catalog.read_table(features))
+    return dataset
+
+
+def load_dataset(data_file=None, features_file=None):
+    """
+    Load a data file as a pandas DataFrame, with the light curve features of
+    ``features_file`` (see `delicatessen.features`) as extra columns.
+
+    Datasets are cached: all the sessions served by a process share the same
+    (read-only) DataFrame, and the worker processes started by the ``deli``
+    launcher share the copy loaded before they were forked. Catalog files
+    written by ``deli ingest`` are opened in constant time (memory-mapped).
+
+    """
+    # This is to have a default / test data file to show. But we probably
+    # want to change this, or remove the default when we "release"!
+    if data_file is None:
+        data_file = DELI_PATH / "data" / "TESS-Gaia-mini.csv"
+    data_file = str(pathlib.Path(data_file).absolute())
+    if features_file is not None:
+        features_file = str(pathlib.Path(features_file).absolute())
+    return _read_dataset(data_file, features_file)
+
+
+def column_range(dataset, name):
+    """
+    The min and max of the column ``name`` of ``dataset``, from the
+    statistics of the catalog file (or of the feed) if they are known.
+    """
+    stats = dataset.attrs.get("stats", {}).get(name)
+    if stats is not None and stats["count"]:
+        return stats["min"], stats["max"]
+    return np.min(dataset[name]), np.max(dataset[name])
+
+
+def _runs(rows):
+    # The runs of consecutive ``rows`` (sorted): (start, stop, index of the
+    # start in ``rows``)
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(rows)]])
+    return [
+        (int(rows[i]), int(rows[j - 1]) + 1, int(i))
+        for i, j in zip(starts, stops)
+    ]
+
 
 class Selector:
     def __init__(
@@ -69,6 +171,7 @@ class Selector:
         self.entries = entries
         self.kind = kind
         self.css_classes = css_classes
+        self.none_allowed = none_allowed
         options = sorted(entries.keys())
         if none_allowed:
             options = ["None"] + options
@@ -99,6 +202,21 @@ class Selector:
         # HACK: This is because we are useing MultiSelect instead of Select
         return self.widget.value[0]
 
+    def set_entries(self, entries, default):
+        """
+        Replace the entries of the menu, keeping the chosen one if it is
+        still there (or choosing ``default``, or else the first one).
+        """
+        self.entries = entries
+        options = sorted(entries.keys())
+        if self.none_allowed:
+            options = ["None"] + options
+        value = self.value
+        self.widget.options = options
+        if value not in options:
+            value = default if default in options else options[0]
+            self.widget.value = [value]
+
     def layout(self, additional_widgets=[], width=None):
         title = Div(
             text="""<h2>{0}</h2><h3>{1}</h3>""".format(self.name, self.descr),
@@ -124,10 +242,20 @@ class Selector:
 
 
 class Plot:
-    def __init__(self, parent, dataset, parameters):
+    def __init__(self, parent, dataset, parameters, client_side=False):
 
         self.parent = parent
         self.dataset = dataset
+        self.default_dataset = dataset
+        self.client_side = client_side
+
+        # The feed of the dataset shown, if it is not the default one (see
+        # `delicatessen.sources`), the version of it shown, and the callback
+        # polling it
+        self.feed = None
+        self.version = None
+        self._poll = None
+        self._switching = False
 
         # Set up the controls
         self.tools = Selector(
@@ -135,7 +263,7 @@ class Plot:
             descr="Choose a plotting tool",
             kind="tools",
             css_classes=["tools"],
-            entries={"Deli-LATTE": tools.DeliLATTE},
+            entries=tools.available_tools(),
             default="None",
             none_allowed=True,
         )
@@ -144,12 +272,11 @@ class Plot:
             descr="Choose a dataset",
             kind="datasets",
             css_classes=["data"],
-            entries={
-                "Test data": "test",
-                # "TOI Catalog": "toi",
-                # "Confirmed Planets": "confirmed",
-            },
-            default="Test data",
+            entries=OrderedDict(
+                [(DEFAULT_DATASET, None)]
+                + [(name, name) for name in sources.available_sources()]
+            ),
+            default=DEFAULT_DATASET,
         )
         self.xaxis = Selector(
             name="Build-Your-Own",
@@ -210,17 +337,20 @@ class Plot:
         )
 
         # Register the callbacks
-        for control in [self.xaxis, self.yaxis, self.size, self.color]:
-            control.widget.on_change("value", self.param_callback)
         self.tools.widget.on_change("value", self.tool_callback)
         self.data.widget.on_change("value", self.data_callback)
-        self.checkbox_group.on_click(self.checkbox_callback)
 
         # Setup the plot
         self.setup_plot()
 
         # Load and display the data
-        self.param_callback(None, None, None)
+        if client_side:
+            self.setup_client_side()
+        else:
+            for control in [self.xaxis, self.yaxis, self.size, self.color]:
+                control.widget.on_change("value", self.param_callback)
+            self.checkbox_group.on_click(self.checkbox_callback)
+            self.param_callback(None, None, None)
 
     def setup_plot(
         self,
@@ -240,8 +370,10 @@ class Plot:
             sizing_mode="stretch_both",
         )
 
-        # Enable Bokeh tools
-        self.plot.add_tools(PanTool(), TapTool(), ResetTool())
+        # Enable Bokeh tools (shift-tap or lasso to select several stars)
+        self.plot.add_tools(
+            PanTool(), TapTool(), LassoSelectTool(), ResetTool()
+        )
 
         # Axes orientation and labels
         self.plot.x_range.flipped = x_flip
@@ -250,7 +382,7 @@ class Plot:
         self.plot.yaxis.axis_label = self.yaxis.value
 
         # Plot the data
-        self.plot.circle(
+        self.renderer = self.plot.circle(
             x="x",
             y="y",
             source=self.source,
@@ -305,55 +437,305 @@ class Plot:
             )
         )
 
+    def setup_client_side(self):
+        """
+        Send all the columns of the dataset to the browser once, and let it
+        plot the chosen columns: the choice of the axes, sizes and colors,
+        and the axis flips and log scales, then cost no server work nor
+        data transfer.
+
+        """
+        glyphs = [
+            glyph
+            for glyph in [
+                self.renderer.glyph,
+                self.renderer.selection_glyph,
+                self.renderer.nonselection_glyph,
+            ]
+            if glyph not in [None, "auto"]
+        ]
+        callback = CustomJS(
+            args=dict(
+                glyphs=glyphs,
+                xaxis=self.plot.xaxis[0],
+                yaxis=self.plot.yaxis[0],
+                x_range=self.plot.x_range,
+                y_range=self.plot.y_range,
+                xaxis_widget=self.xaxis.widget,
+                yaxis_widget=self.yaxis.widget,
+                size_widget=self.size.widget,
+                color_widget=self.color.widget,
+                checkbox=self.checkbox_group,
+                bounds={},
+                mapper=LinearColorMapper(palette=Viridis256, low=0, high=1),
+                size_transform=CustomJSTransform(v_func=SIZE_TRANSFORM),
+                log_transform=CustomJSTransform(v_func=LOG_TRANSFORM),
+            ),
+            code=APPEARANCE_CALLBACK,
+        )
+        self.appearance = callback
+        for control in [self.xaxis, self.yaxis, self.size, self.color]:
+            control.widget.js_on_change("value", callback)
+        self.checkbox_group.js_on_change("active", callback)
+        self.show_client_side()
+
+        # The initial choices
+        for glyph in glyphs:
+            glyph.x, glyph.y = self.xaxis.value, self.yaxis.value
+            glyph.size = 5
+            glyph.fill_color = Viridis256[0]
+
+    def show_client_side(self):
+        """
+        Send all the columns of the dataset to the browser, with their
+        ranges (for the color map).
+        """
+        columns = {
+            name: self.own(self.dataset[name].to_numpy())
+            for name in self.dataset
+        }
+        self.source.data = columns
+        self.update_bounds()
+
+    def update_bounds(self):
+        """
+        Send the browser the ranges of the numeric columns of the dataset,
+        for the color map.
+        """
+        bounds = {}
+        stats = self.dataset.attrs.get("stats", {})
+        for name in self.dataset:
+            values = self.dataset[name].to_numpy()
+            if name in stats and stats[name]["count"]:
+                bounds[name] = [stats[name]["min"], stats[name]["max"]]
+            elif values.dtype.kind in "iuf" and np.isfinite(values).any():
+                bounds[name] = [
+                    float(np.nanmin(values)),
+                    float(np.nanmax(values)),
+                ]
+        if bounds != self.appearance.args["bounds"]:
+            self.appearance.args = dict(self.appearance.args, bounds=bounds)
+            mapper = self.appearance.args["mapper"]
+            if self.color.value in bounds:
+                mapper.low, mapper.high = bounds[self.color.value]
+
     def tool_callback(self, attr, old, new):
         if self.tools.value != "None":
-            self.parent.change_tool(self.tools.entries[self.tools.value])
+            # Only import the tool (and its dependencies) once it is chosen
+            self.parent.change_tool(tools.load_tool(self.tools.value))
         else:
             self.parent.change_tool(tools.BaseTool)
 
     def data_callback(self, attr, old, new):
-        # TODO: Change datasets!
-        pass
+        """
+        Triggered when the user chooses another dataset: the datasets of
+        `delicatessen.sources` are loaded in a worker thread (once per
+        process), and shown once loaded.
 
-    def param_callback(self, attr, old, new):
         """
-        Triggered when the user changes what we're plotting on the main plot.
+        name = self.data.value
+        if self._poll is not None:
+            self.parent.doc.remove_periodic_callback(self._poll)
+            self._poll = None
+        if name == DEFAULT_DATASET:
+            self.feed = self.version = None
+            self.set_dataset(self.default_dataset)
+            return
+
+        future = sources.load(name)
+        doc = self.parent.doc
+        if future.done() or doc.session_context is None:
+            self._loaded(name, future)
+        else:
+            future.add_done_callback(
+                lambda future: doc.add_next_tick_callback(
+                    functools.partial(self._loaded, name, future)
+                )
+            )
 
+    def _loaded(self, name, future):
+        if self.dataset is None or self.data.value != name:
+            # The session has ended, or the user has chosen another dataset
+            # in the meantime
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print("Failed to load {0}: {1!r}".format(name, e))
+            return
+        self.feed = sources.feed(name)
+        self.version, dataset, _, _ = self.feed.changes(None)
+        self.set_dataset(dataset)
+        if self.parent.doc.session_context is not None:
+            self._poll = self.parent.doc.add_periodic_callback(
+                self.poll, sources.POLL_INTERVAL * 1000
+            )
+
+    def set_dataset(self, dataset):
         """
-        # Update the axis labels
+        Show ``dataset`` in the plot, and its columns in the menus (keeping
+        the chosen ones if it has them).
+        """
+        self.dataset = self.parent.dataset = dataset
+        parameters = OrderedDict((col, col) for col in sorted(dataset.columns))
+        self._switching = True
+        try:
+            self.xaxis.set_entries(parameters, "ra")
+            self.yaxis.set_entries(parameters, "dist")
+            self.size.set_entries(parameters, "None")
+            self.color.set_entries(parameters, "None")
+        finally:
+            self._switching = False
+        self.source.selected.indices = []
+        self.show_dataset()
+
+    def show_dataset(self):
+        """Send the dataset to the browser."""
+        if self.client_side:
+            self.show_client_side()
+        else:
+            self.param_callback(None, None, None)
+
+    def poll(self):
+        """
+        Show the changes of the feed of the dataset, and refresh the feed (in
+        a worker thread: its changes are shown at the next poll).
+        """
+        self.apply_changes()
+        self.feed.refresh_async()
+
+    def apply_changes(self):
+        """
+        Send the browser the rows of the feed of the dataset appended or
+        patched since they were shown (the whole dataset if the feed has
+        changed too much since).
+        """
+        if self.feed is None:
+            return
+        version, dataset, start, patched = self.feed.changes(self.version)
+        if version == self.version:
+            return
+        self.version = version
+        self.dataset = self.parent.dataset = dataset
+        if start is None:
+            self.set_dataset(dataset)
+            return
+
+        if self.client_side:
+            names = list(self.source.data)
+            new = {name: dataset[name].to_numpy()[start:] for name in names}
+            changed = {
+                name: dataset[name].to_numpy()[patched] for name in names
+            }
+            self.update_bounds()
+        else:
+            if self.ranges() != self._ranges:
+                # The scales of the sizes or colors have changed
+                self.param_callback(None, None, None)
+                return
+            new = self.columns(slice(start, None))
+            changed = self.columns(patched)
+
+        if len(patched):
+            patches = {
+                name: [
+                    (slice(a, b), values[i : i + b - a])
+                    for a, b, i in _runs(patched)
+                ]
+                for name, values in changed.items()
+            }
+        # Bokeh checks every value of every column of the source after a
+        # patch or a stream, in Python: seconds for a million rows
+        with validate(False):
+            if len(patched):
+                self.source.patch(patches)
+            if len(dataset) > start:
+                self.source.stream(new)
+
+    def own(self, values):
+        """
+        The ``values`` of a column of the dataset to show in the plot: a copy
+        if the dataset is a feed, since the source of the plot is patched in
+        place by its changes (see `apply_changes`), and the columns of the
+        dataset are shared by the sessions.
+        """
+        return values.copy() if self.feed is not None else values
+
+    def ranges(self):
+        """The ranges of the columns scaled to the marker sizes and colors."""
+        return [
+            (
+                None
+                if control.value == "None"
+                else column_range(self.dataset, control.entries[control.value])
+            )
+            for control in [self.size, self.color]
+        ]
+
+    def columns(self, rows=slice(None)):
+        """
+        The columns of the source of the plot for the ``rows`` of the
+        dataset (a slice or positions), with the scales of the sizes and
+        colors of the plot.
+        """
+
+        # The rows are taken from the columns: taking them from the dataset
+        # would copy all its columns into blocks first
+        def values(name):
+            return self.own(self.dataset[name].to_numpy()[rows])
+
         x_name = self.xaxis.entries[self.xaxis.value]
         y_name = self.yaxis.entries[self.yaxis.value]
-        self.plot.xaxis.axis_label = self.xaxis.value
-        self.plot.yaxis.axis_label = self.yaxis.value
+        size_range, color_range = self._ranges
+        ticid = values("ticid")
 
-        # Update the "sides"
-        if self.size.value != "None":
+        if size_range is not None:
+            low, high = size_range
             s_name = self.size.entries[self.size.value]
-            size = (
-                25
-                * (self.dataset[s_name] - np.min(self.dataset[s_name]))
-                / (np.max(self.dataset[s_name]) - np.min(self.dataset[s_name]))
-            )
+            size = 25 * (values(s_name) - low) / (high - low)
         else:
-            size = np.ones_like(self.dataset["ticid"]) * 5
+            size = np.ones_like(ticid) * 5
 
-        if self.color.value != "None":
+        if color_range is not None:
+            low, high = color_range
             c_name = self.color.entries[self.color.value]
-            color = (self.dataset[c_name] - np.min(self.dataset[c_name])) / (
-                np.max(self.dataset[c_name]) - np.min(self.dataset[c_name])
-            )
+            color = (values(c_name) - low) / (high - low)
         else:
-            color = np.zeros_like(self.dataset["ticid"])
+            color = np.zeros_like(ticid)
 
-        # Update the data source
-        self.source.data = dict(
-            x=self.dataset[x_name],
-            y=self.dataset[y_name],
+        return dict(
+            x=values(x_name),
+            y=values(y_name),
             size=size,
-            ticid=self.dataset["ticid"],
+            ticid=ticid,
             color=color,
         )
 
+    def param_callback(self, attr, old, new):
+        """
+        Triggered when the user changes what we're plotting on the main plot.
+
+        """
+        if self._switching:
+            # The menus are being updated for another dataset
+            return
+
+        # Update the axis labels
+        self.plot.xaxis.axis_label = self.xaxis.value
+        self.plot.yaxis.axis_label = self.yaxis.value
+
+        # Update the "sides" and the data source
+        self._ranges = self.ranges()
+        self.source.data = self.columns()
+
+    def release(self):
+        """
+        Drop the plotted data and the reference to the dataset.
+
+        """
+        self.source.data = dict(x=[], y=[], size=[], color=[])
+        self.dataset = self.default_dataset = self.feed = None
+
     def checkbox_callback(self, new):
         """
         Triggered when the user interacts with check boxes in appearance panel.
@@ -455,19 +837,20 @@ class Plot:
 
 
 class Delicatessen:
-    def __init__(self, doc, data_file=None):
+    def __init__(
+        self,
+        doc,
+        data_file=None,
+        memory_budget=MEMORY_BUDGET,
+        features_file=None,
+        client_side=False,
+    ):
 
         # Current HTML document
         self.doc = doc
+        self.memory_budget = memory_budget
 
-        # This is to have a default / test data file to show. But we probably
-        # want to change this, or remove the default when we "release"!
-        if data_file is None:
-            data_file = DELI_PATH / "data" / "TESS-Gaia-mini.csv"
-
-        # The data file can be any file format that astropy.table can read:
-        data = at.Table.read(data_file)
-        dataset = data.to_pandas()
+        dataset = load_dataset(data_file, features_file)
 
         # Things the user can plot - now the labels are the same as the table
         # column names! We may want to make these nicer for things like "ra"?
@@ -476,26 +859,75 @@ class Delicatessen:
         self.dataset = dataset
 
         # Instantiate the plot
-        self.primary = Plot(self, dataset, parameters)
+        self.primary = Plot(self, dataset, parameters, client_side=client_side)
         self.layout = column(
             self.primary.layout(), Div(), sizing_mode="stretch_width"
         )
 
-        # Set up the tool (none by default)
+        # Set up the tool (none by default). The tools are built the first
+        # time they are chosen, and then reused: tool class -> (tool, layout)
+        self.tool_cache = {}
+        self.secondary = None
         self.change_tool(tools.BaseTool)
 
+        # Free the session's data when the user leaves
+        SESSIONS.add(self)
+        self.doc.on_session_destroyed(self.session_destroyed)
+
         # Go!
         self.doc.add_root(self.layout)
         self.doc.title = "delicatessen"
 
     def change_tool(self, tool):
-        self.secondary = tool(self)
+        if self.secondary is not None:
+            self.secondary.deactivate()
+        if tool not in self.tool_cache:
+            instance = tool(self)
+            self.tool_cache[tool] = (instance, instance.layout())
+        self.secondary, layout = self.tool_cache[tool]
         self.layout.children.pop()
-        self.layout.children.append(self.secondary.layout())
+        self.layout.children.append(layout)
+        self.secondary.activate()
+
+    def session_destroyed(self, session_context):
+        """
+        Triggered when the session is destroyed: drop all the data, in case
+        something still holds a reference to the session's models.
+
+        """
+        SESSIONS.discard(self)
+        self.secondary.deactivate()
+        for tool, _ in self.tool_cache.values():
+            tool.release()
+        self.tool_cache.clear()
+        self.primary.release()
+        self.dataset = None
+
+    def memory(self):
+        """
+        Memory used by this session (bytes): the data shown in its plots and
+        the results cached by its tool.
+
+        """
+        session_context = self.doc.session_context
+        return dict(
+            session_id=session_context.id if session_context else None,
+            sources=sum(
+                nbytes(source.data)
+                for source in self.doc.select({"type": ColumnDataSource})
+            ),
+            results=sum(tool.nbytes for tool, _ in self.tool_cache.values()),
+        )
+
 
+# Only build the app when run by `bokeh serve`, so that this module can also
+# be imported (e.g., by the benchmarks)
+if __name__.startswith("bokeh_app_"):
 
-data_file = None
-if len(sys.argv) > 1:
-    data_file = sys.argv[1]
+    data_file = features_file = None
+    if len(sys.argv) > 1:
+        data_file = sys.argv[1]
+    if len(sys.argv) > 2:
+        features_file = sys.argv[2]
 
-Delicatessen(curdoc(), data_file=data_file)
+    Delicatessen(curdoc(), data_file=data_file, features_file=features_file)
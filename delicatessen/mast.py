@@ -0,0 +1,300 @@
+"""
+An asyncio client of MAST: the TIC catalog queries and the light curve
+downloads of DeliLATTE.
+
+The requests are made with Tornado's `AsyncHTTPClient`, on one event loop
+(the loop of the Bokeh server, or a background thread), so that the
+downloads of all the sessions share it:
+
+- concurrent requests of the same URL are coalesced: they wait for the same
+  download;
+- at most ``max_connections`` requests are made at once;
+- a cancelled request cancels its download, unless other requests wait for
+  it.
+
+Synchronous code (e.g., the worker threads of `delicatessen.cache`) runs the
+coroutines of the client with `run`. ``configure(url=...)`` sends all the
+requests to another server with the same paths, e.g., a local stand-in for
+MAST (see ``benchmarks/fake_mast.py``).
+
+"""
+
+# delicatessen
+from . import products
+
+# Standard library
+import asyncio
+import concurrent.futures
+import json
+import threading
+from urllib.parse import quote, urlsplit, urlunsplit
+
+# Third-party
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+
+MAST_URL = "https://mast.stsci.edu"
+INVOKE_PATH = "/api/v0/invoke"
+
+# The number of requests made at once, and how long a request may take (s)
+MAX_CONNECTIONS = 8
+TIMEOUT = 120
+
+# Light curve files can be large (20-second cadence)
+MAX_BODY_SIZE = 512 * 1024**2
+
+
+class MastClient:
+    """
+    An asyncio client of MAST.
+
+    Parameters
+    ----------
+    url  :  str or None
+        the server the requests are sent to, instead of the hosts of their
+        URLs (e.g., ``"http://localhost:8123"``)
+    max_connections  :  int
+        the number of requests made at once
+    timeout  :  float
+        how long a request may take (s)
+
+    """
+
+    def __init__(
+        self, url=None, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT
+    ):
+        self.url = url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.requests = 0
+        self._http = None
+        self._semaphore = None
+        self._in_flight = {}
+
+    def _rewrite(self, url):
+        # The URL on the server of the client (if any)
+        if self.url is None:
+            return url
+        base, parts = urlsplit(self.url), urlsplit(url)
+        return urlunsplit(
+            parts._replace(scheme=base.scheme, netloc=base.netloc)
+        )
+
+    async def _fetch(self, request):
+        # Created in the loop they are used in
+        if self._http is None:
+            self._http = AsyncHTTPClient(
+                force_instance=True,
+                max_clients=self.max_connections,
+                max_body_size=MAX_BODY_SIZE,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        async with self._semaphore:
+            self.requests += 1
+            # Errors are raised here rather than by the fetch, which keeps
+            # running if the download is cancelled
+            response = await self._http.fetch(request, raise_error=False)
+        response.rethrow()
+        return response.body
+
+    async def _coalesced(self, key, request):
+        entry = self._in_flight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._fetch(request))
+            entry = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not task.done():
+                # No one waits for it anymore
+                task.cancel()
+
+    async def get(self, url):
+        """
+        The content of ``url`` (bytes). Raises `HTTPClientError` if the
+        server answers with an error.
+        """
+        url = self._rewrite(url)
+        request = HTTPRequest(url, request_timeout=self.timeout)
+        return await self._coalesced(("GET", url), request)
+
+    async def get_first(self, urls):
+        """
+        The content of the first of ``urls`` that can be downloaded, or None
+        if none can.
+        """
+        for url in urls:
+            try:
+                return await self.get(url)
+            except (HTTPClientError, OSError):
+                continue
+        return None
+
+    async def query(self, request):
+        """The result of the MAST API ``request`` (a dict), decoded."""
+        body = "request=" + quote(json.dumps(request))
+        url = self._rewrite(MAST_URL + INVOKE_PATH)
+        http_request = HTTPRequest(
+            url,
+            method="POST",
+            body=body,
+            headers={
+                "Content-type": "application/x-www-form-urlencoded",
+                "Accept": "text/plain",
+            },
+            request_timeout=self.timeout,
+        )
+        content = await self._coalesced(("POST", url, body), http_request)
+        return json.loads(content.decode("utf-8"))
+
+    async def tic_position(self, tic):
+        """The right ascension and declination (degrees) of star ``tic``."""
+        result = await self.query(
+            {
+                "service": "Mast.Catalogs.Filtered.Tic",
+                "params": {
+                    "columns": "*",
+                    "filters": [
+                        {"paramName": "ID", "values": [str(int(tic))]}
+                    ],
+                },
+                "format": "json",
+                "removenullcolumns": True,
+            }
+        )
+        if not result["data"]:
+            raise KeyError("TIC {0} is not in the TIC".format(tic))
+        star = result["data"][0]
+        return star["ra"], star["dec"]
+
+    async def find_sectors(self, tic):
+        """The sectors in which the star ``tic`` falls on a camera."""
+        from tess_stars2px import tess_stars2px_function_entry
+
+        ra, dec = await self.tic_position(tic)
+        # tess-point takes a few milliseconds: keep the loop free meanwhile
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, tess_stars2px_function_entry, int(tic), ra, dec
+        )
+        return result[3]
+
+    async def refresh_sectors(self, path=None):
+        """
+        Add the sectors released since the sector table was last updated to
+        the table file ``path`` (by default, the refreshed table; see
+        `delicatessen.products`), as listed by the MAST bulk download
+        scripts. Returns the new sectors (none if MAST cannot be reached).
+        """
+        path = path or products.REFRESHED_SECTOR_TABLE
+        known = products.read_sector_table(products.SECTOR_TABLE)
+        known.update(products.read_sector_table(path))
+        sector = max(known) + 1
+        new = {}
+        while True:
+            # The first line of the bulk download script is enough
+            url = self._rewrite(products.BULK_SCRIPT_URL.format(sector=sector))
+            request = HTTPRequest(
+                url,
+                headers={"Range": "bytes=0-1023"},
+                request_timeout=self.timeout,
+            )
+            try:
+                content = await self._coalesced(("GET", url), request)
+            except (HTTPClientError, OSError):
+                break
+            row = products.parse_bulk_script(
+                content.decode("ascii", "replace")
+            )
+            if row is None:
+                break
+            new[sector] = row
+            sector += 1
+        return products.add_sectors(new, path)
+
+    async def lightcurve_files(self, tic, product="auto"):
+        """
+        Download the light curve files of the star ``tic``, all its sectors
+        at once.
+
+        Returns
+        -------
+        list of bytes
+            the content of the file of each sector that could be downloaded
+            (in the product, or a coarser one; see `delicatessen.products`)
+
+        """
+        sectors = await self.find_sectors(tic)
+        if products.needs_refresh(sectors):
+            await self.refresh_sectors()
+        if product == "auto":
+            product = products.choose_product(sectors)
+        links = products.download_links(tic, sectors, product)
+        files = await asyncio.gather(*map(self.get_first, links))
+        return [content for content in files if content is not None]
+
+
+# The client of this process, and the event loop it runs on (the Bokeh
+# server's, or one in a background thread started by `run`)
+_client = MastClient()
+_loop = None
+_lock = threading.Lock()
+
+
+def configure(url=None, max_connections=None, timeout=None, loop=None):
+    """
+    Configure the client of this process (see `MastClient`): the ``loop``
+    it runs on is, e.g., the loop of the Bokeh server.
+    """
+    global _client, _loop
+    _client = MastClient(
+        url=url,
+        max_connections=max_connections or MAX_CONNECTIONS,
+        timeout=timeout or TIMEOUT,
+    )
+    if loop is not None:
+        _loop = loop
+
+
+def client():
+    """The client of this process."""
+    return _client
+
+
+def _background_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(
+        target=loop.run_forever, name="delicatessen-mast", daemon=True
+    )
+    thread.start()
+    return loop
+
+
+def run(coroutine, timeout=None):
+    """
+    Run ``coroutine`` (e.g., ``client().lightcurve_files(tic)``) on the loop
+    of the client, from another thread, and return its result. The coroutine
+    is cancelled if it takes longer than ``timeout`` (s).
+    """
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = _background_loop()
+        loop = _loop
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("run() would block the loop of the MAST client")
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
@@ -0,0 +1,97 @@
+"""Memory accounting and limits for the sessions served by a process."""
+
+# Standard library
+import weakref
+from collections import OrderedDict
+
+# Third-party
+import numpy as np
+
+# The live `Delicatessen` sessions of this process
+SESSIONS = weakref.WeakSet()
+
+
+def nbytes(obj):
+    """
+    Estimate the memory used by the arrays in ``obj``.
+
+    Arrays (and pandas objects) count for their data buffers; lists, tuples
+    and dicts for their items, plus one pointer per item.
+
+    """
+    if hasattr(obj, "memory_usage"):
+        # pandas DataFrame or Series
+        return int(np.sum(obj.memory_usage(index=False)))
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(nbytes(value) for value in obj.values()) + 8 * len(obj)
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(value) for value in obj) + 8 * len(obj)
+    if isinstance(obj, (int, float, np.number)):
+        return 8
+    return 0
+
+
+class LRUCache:
+    """
+    A least-recently-used cache with a memory budget (in bytes).
+
+    Storing a value evicts the least recently used ones until the cache fits
+    in the budget again; the value just stored is always kept, even if it
+    alone exceeds the budget.
+
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._items = OrderedDict()
+        self._sizes = {}
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key, default=None):
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        self._sizes[key] = nbytes(value)
+        while self.nbytes > self.budget and len(self._items) > 1:
+            self.pop(next(iter(self._items)))
+
+    def pop(self, key):
+        self._sizes.pop(key, None)
+        return self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+
+
+def memory_report():
+    """
+    Report the memory used by the live sessions of this process (bytes).
+
+    Datasets are shared by the sessions that show them, so they are counted
+    once, separately from the sessions' own data.
+
+    """
+    sessions = [session.memory() for session in list(SESSIONS)]
+    datasets = {id(s.dataset): s.dataset for s in list(SESSIONS)}
+    return dict(
+        sessions=sessions,
+        total=sum(s["sources"] + s["results"] for s in sessions),
+        datasets=sum(nbytes(dataset) for dataset in datasets.values()),
+    )
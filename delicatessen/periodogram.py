@@ -0,0 +1,190 @@
+"""
+Incremental Lomb-Scargle periodograms of multi-sector light curves.
+
+The periodogram (the PSD-normalized Lomb-Scargle periodogram of lightkurve,
+with a floating mean) only depends on a few sums over the data points at
+every frequency (Zechmeister & Kürster 2009). They are computed for each
+sector separately, on a fixed frequency grid, with the fast method of Press
+& Rybicki (1989); the periodogram of several sectors is then obtained by
+adding their sums. Adding a sector to a periodogram thus only costs the sums
+of the new sector, and the sums of every sector can be cached.
+
+The grid has a fixed spacing, `DF`, so that the sums of all the sectors are
+on the same grid; each sector extends it up to its own Nyquist frequency,
+and the periodogram of several sectors goes up to the lowest of these.
+
+"""
+
+# Third-party
+import numpy as np
+
+# The frequency grid (micro Hz): spacing (the resolution of a year of data)
+# and highest frequency (the Nyquist frequency of the 2-minute cadence)
+DF = 1e6 / (365.25 * 86400)
+MAX_FREQUENCY = 1e6 / 240
+
+# micro Hz in cycles per day
+MICROHZ = 86400 * 1e-6
+
+
+def clip_outliers(flux, sigma=5.0, maxiters=5):
+    """
+    The points of ``flux`` within ``sigma`` standard deviations of its
+    median, iteratively (like ``LightCurve.remove_outliers``), as a boolean
+    mask. NaNs are left out.
+
+    """
+    mask = np.isfinite(flux)
+    for _ in range(maxiters):
+        values = flux[mask]
+        if not len(values):
+            break
+        deviation = np.abs(flux - np.median(values))
+        clipped = mask & (deviation <= sigma * np.std(values))
+        if clipped.sum() == mask.sum():
+            break
+        mask = clipped
+    return mask
+
+
+def sector_sums(time, flux, df=DF, max_frequency=MAX_FREQUENCY):
+    """
+    Compute the sums of the light curve of one sector that its periodogram
+    depends on, on the grid ``df * (1 + arange(nf))`` (micro Hz), up to the
+    Nyquist frequency of the light curve.
+
+    Returns
+    -------
+    dict of the number of points ``n``, the sums ``y`` and ``yy`` of the
+    flux and of its square, the first and last times ``tmin`` and ``tmax``,
+    and the arrays (one value per frequency) ``S``, ``C``, ``Sy``, ``Cy``,
+    ``S2`` and ``C2``: the sums of sin(wt), cos(wt), y sin(wt), y cos(wt),
+    sin(2wt) and cos(2wt)
+
+    """
+    from astropy.timeseries.periodograms.lombscargle.implementations.utils import (
+        trig_sum,
+    )
+
+    mask = np.isfinite(time) & clip_outliers(flux)
+    time = np.asarray(time[mask], dtype=np.float64)
+    flux = np.asarray(flux[mask], dtype=np.float64)
+
+    if len(time) > 1:
+        nyquist = 0.5 / np.median(np.diff(time)) / MICROHZ
+    else:
+        nyquist = 0.0
+    nf = int(min(nyquist, max_frequency) / df)
+
+    sums = dict(
+        n=len(time),
+        y=flux.sum(),
+        yy=np.dot(flux, flux),
+        tmin=time.min() if len(time) else np.nan,
+        tmax=time.max() if len(time) else np.nan,
+    )
+    if nf < 1:
+        empty = np.zeros(0)
+        sums.update(S=empty, C=empty, Sy=empty, Cy=empty, S2=empty, C2=empty)
+        return sums
+
+    kwargs = dict(f0=df * MICROHZ, df=df * MICROHZ, N=nf)
+    ones = np.ones_like(time)
+    sums["S"], sums["C"] = trig_sum(time, ones, **kwargs)
+    sums["Sy"], sums["Cy"] = trig_sum(time, flux, **kwargs)
+    sums["S2"], sums["C2"] = trig_sum(time, ones, freq_factor=2, **kwargs)
+    return sums
+
+
+class Periodogram:
+    """
+    The periodogram of a light curve, to which sectors are added one at a
+    time.
+
+    Parameters
+    ----------
+    df  :  float
+        the spacing of the frequency grid (micro Hz) of the sums added
+
+    """
+
+    ARRAYS = ["S", "C", "Sy", "Cy", "S2", "C2"]
+
+    def __init__(self, df=DF):
+        self.df = df
+        self.sectors = []
+        self._n = 0
+        self._y = self._yy = 0.0
+        self._tmin, self._tmax = np.inf, -np.inf
+        self._sums = None
+
+    def add(self, sector, sums):
+        """Add the ``sums`` (see `sector_sums`) of ``sector``."""
+        if sector in self.sectors:
+            raise ValueError("Sector {0} is already included".format(sector))
+        self.sectors.append(sector)
+        if not sums["n"]:
+            return
+        self._n += sums["n"]
+        self._y += sums["y"]
+        self._yy += sums["yy"]
+        self._tmin = min(self._tmin, sums["tmin"])
+        self._tmax = max(self._tmax, sums["tmax"])
+        if self._sums is None:
+            self._sums = {name: np.array(sums[name]) for name in self.ARRAYS}
+            return
+        nf = min(len(self._sums["S"]), len(sums["S"]))
+        for name in self.ARRAYS:
+            self._sums[name] = self._sums[name][:nf] + sums[name][:nf]
+
+    @property
+    def frequency(self):
+        """The frequency grid (micro Hz)."""
+        nf = 0 if self._sums is None else len(self._sums["S"])
+        return self.df * (1 + np.arange(nf))
+
+    def power(self):
+        """
+        The power spectral density at every frequency of the grid, in the
+        units of lightkurve (flux^2 per micro Hz).
+
+        """
+        if self._sums is None or self._n < 2:
+            return np.zeros(0)
+
+        # The weighted sums of the floating-mean periodogram, as in
+        # astropy's `lombscargle_fast` (with unit uncertainties)
+        n = self._n
+        S, C = self._sums["S"] / n, self._sums["C"] / n
+        S2, C2 = self._sums["S2"] / n, self._sums["C2"] / n
+        mean = self._y / n
+        Sh = self._sums["Sy"] / n - mean * S
+        Ch = self._sums["Cy"] / n - mean * C
+
+        tan_2omega_tau = (S2 - 2 * S * C) / (C2 - (C * C - S * S))
+        S2w = tan_2omega_tau / np.sqrt(1 + tan_2omega_tau**2)
+        C2w = 1 / np.sqrt(1 + tan_2omega_tau**2)
+        Cw = np.sqrt(0.5) * np.sqrt(1 + C2w)
+        Sw = np.sqrt(0.5) * np.sign(S2w) * np.sqrt(1 - C2w)
+
+        YC = Ch * Cw + Sh * Sw
+        YS = Sh * Cw - Ch * Sw
+        CC = 0.5 * (1 + C2 * C2w + S2 * S2w) - (C * Cw + S * Sw) ** 2
+        SS = 0.5 * (1 - C2 * C2w - S2 * S2w) - (S * Cw - C * Sw) ** 2
+        power = YC * YC / CC + YS * YS / SS
+
+        # lightkurve's PSD normalization: per unit of the frequency
+        # resolution, 1 / baseline
+        resolution = 1 / (self._tmax - self._tmin) / MICROHZ
+        return power / resolution
+
+
+def smooth(power, width, df=DF):
+    """``power`` smoothed with a box kernel of ``width`` (micro Hz)."""
+    size = max(1, int(np.ceil(width / df)))
+    if not len(power):
+        return power
+    kernel = np.ones(size) / size
+    # Normalize by the kernel weight within the grid at the edges
+    weight = np.convolve(np.ones_like(power), kernel, mode="same")
+    return np.convolve(power, kernel, mode="same") / weight
@@ -0,0 +1,268 @@
+"""
+The TESS light curve products, and which one to download for a star.
+
+Three products are available, at different cadences:
+
+- ``"20s"``: the SPOC 20-second light curves (``*-a_fast-lc.fits``), from
+  sector 27 on, for a few thousand targets per sector;
+- ``"2min"``: the SPOC 2-minute light curves (``*-s_lc.fits``), for the
+  targets of the 2-minute program;
+- ``"ffi"``: the TESS-SPOC light curves extracted from the full frame images,
+  at the FFI cadence (30 minutes up to sector 26, 10 minutes up to sector 55,
+  200 seconds since), for most stars brighter than T = 16.
+
+The file names of the SPOC products include the date and pipeline run of
+their sector, which are listed in a table (``data/tess_sectors.csv``) that
+is refreshed from MAST as new sectors are released, by the MAST client (see
+``delicatessen.mast.MastClient.refresh_sectors``): when a star was observed
+in a sector newer than the table (see `needs_refresh`), or when the server
+starts with ``--refresh-sectors``. The sectors found are saved in
+`REFRESHED_SECTOR_TABLE`; to add them to the table shipped with delicatessen
+instead, run::
+
+    from delicatessen import mast, products
+
+    mast.run(mast.client().refresh_sectors(products.SECTOR_TABLE))
+
+"""
+
+# Standard library
+import csv
+import functools
+import os
+import pathlib
+import re
+import threading
+import time
+
+# Third-party
+import numpy as np
+
+# The sector table shipped with delicatessen, and the one extended by the
+# refreshes
+SECTOR_TABLE = pathlib.Path(__file__).parent / "data" / "tess_sectors.csv"
+REFRESHED_SECTOR_TABLE = pathlib.Path.home() / ".delicatessen" / "sectors.csv"
+
+# How often the sectors newer than the table are looked up at MAST (s): the
+# stars are also observed in the sectors scheduled but not released yet
+SECTOR_REFRESH_INTERVAL = 3600
+
+# The product names, as shown in the DeliLATTE cadence menu
+PRODUCTS = {"auto": "Auto", "20s": "20 s", "2min": "2 min", "ffi": "FFI"}
+
+# The duration of a sector (days)
+SECTOR_DAYS = 27.4
+
+# The largest number of points `choose_product` downloads for a star: about
+# ten sectors at 2-minute cadence
+MAX_POINTS = 200000
+
+DOWNLOAD_URL = "https://mast.stsci.edu/api/v0.1/Download/file/?uri="
+SPOC_URI = (
+    "mast:TESS/product/tess{date}-s{sector:04d}-{tic:016d}-{pipeline}-{suffix}"
+)
+TESS_SPOC_URL = (
+    "https://archive.stsci.edu/hlsps/tess-spoc/s{sector:04d}/target/"
+    "{tic_path}/hlsp_tess-spoc_tess_phot_{tic:016d}-s{sector:04d}"
+    "_tess_v1_lc.fits"
+)
+SUFFIXES = {"20s": "a_fast-lc.fits", "2min": "s_lc.fits"}
+
+# The bulk download scripts of MAST, which list the light curves of a sector
+BULK_SCRIPT_URL = (
+    "https://archive.stsci.edu/missions/tess/download_scripts/sector/"
+    "tesscurl_sector_{sector}_lc.sh"
+)
+BULK_SCRIPT_FILE = re.compile(
+    r"tess(\d{13})-s(\d{4})-\d{16}-(\d{4})-s_lc\.fits"
+)
+
+
+def read_sector_table(path):
+    """
+    Return the sectors listed in the sector table file ``path``: sector ->
+    (date, pipeline) of their SPOC products (none if it does not exist).
+
+    """
+    table = {}
+    if path.exists():
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                table[int(row["sector"])] = (row["date"], row["pipeline"])
+    return table
+
+
+@functools.lru_cache()
+def load_sector_table():
+    """
+    Return the sector table: sector -> (date, pipeline) of its SPOC products.
+
+    """
+    table = read_sector_table(SECTOR_TABLE)
+    table.update(read_sector_table(REFRESHED_SECTOR_TABLE))
+    return table
+
+
+# When the sectors newer than the table were last looked up
+_looked_up = None
+_looked_up_lock = threading.Lock()
+
+
+def needs_refresh(sectors):
+    """
+    Whether the table should be refreshed for a star observed in
+    ``sectors``: some are newer than the table, and they were not looked up
+    in the last `SECTOR_REFRESH_INTERVAL` seconds (a lookup is then due, and
+    this returns False until the next one).
+
+    """
+    global _looked_up
+    if not len(sectors) or max(sectors) <= max(load_sector_table()):
+        return False
+    with _looked_up_lock:
+        now = time.monotonic()
+        if (
+            _looked_up is not None
+            and now - _looked_up < SECTOR_REFRESH_INTERVAL
+        ):
+            return False
+        _looked_up = now
+        return True
+
+
+def parse_bulk_script(text):
+    """
+    The (date, pipeline) of the SPOC products of a sector, from the first
+    line of its bulk download script ``text``, or None if it lists none.
+
+    """
+    match = BULK_SCRIPT_FILE.search(text)
+    if match is None:
+        return None
+    date, _, pipeline = match.groups()
+    return date, pipeline
+
+
+def add_sectors(new, path=REFRESHED_SECTOR_TABLE):
+    """
+    Add the ``new`` sectors (sector -> (date, pipeline)) to the sector table
+    file ``path`` (by default, the refreshed table). Returns the new sectors.
+
+    """
+    if new:
+        rows = read_sector_table(path)
+        rows.update(new)
+        # Written aside and then moved, since the worker processes may read
+        # or refresh it at the same time
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written = path.with_name("{0}.{1}".format(path.name, os.getpid()))
+        with open(written, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sector", "date", "pipeline"])
+            for sector in sorted(rows):
+                writer.writerow([sector, *rows[sector]])
+        os.replace(written, path)
+        load_sector_table.cache_clear()
+    return sorted(new)
+
+
+def cadence(product, sector):
+    """The cadence (s) of ``product`` in ``sector``."""
+    if product == "20s":
+        return 20
+    if product == "2min":
+        return 120
+    if sector <= 26:
+        return 1800
+    if sector <= 55:
+        return 600
+    return 200
+
+
+def released(sector):
+    """Whether ``sector`` is in the sector table."""
+    return sector in load_sector_table()
+
+
+def fallbacks(product, sector):
+    """
+    The products to try in ``sector`` for ``product``, in order of
+    preference: ``product``, then the coarser ones, since most stars are not
+    in the 20-second and 2-minute programs.
+
+    """
+    if not released(sector):
+        return []
+    order = ["20s", "2min", "ffi"]
+    products = order[order.index(product) :]
+    if sector < 27:
+        # No 20-second cadence yet
+        products = [p for p in products if p != "20s"]
+    return products
+
+
+def npoints(product, sectors):
+    """The number of points of the light curves of ``product``, at most."""
+    return sum(
+        SECTOR_DAYS * 86400 / cadence(fallbacks(product, s)[0], s)
+        for s in sectors
+        if fallbacks(product, s)
+    )
+
+
+def choose_product(sectors, max_points=MAX_POINTS):
+    """
+    Choose the finest-cadence product whose light curves in all the
+    ``sectors`` have at most ``max_points`` points: a star observed in one
+    sector is shown at 20-second cadence, one observed for a year from the
+    FFIs, which also keeps the download and the plots small.
+
+    """
+    for product in ["20s", "2min"]:
+        if npoints(product, sectors) <= max_points:
+            return product
+    return "ffi"
+
+
+def download_links(tic, sectors, product):
+    """
+    Return the download links of the light curves of the star ``tic`` in
+    the released ``sectors``: for each sector, a tuple of the links of the
+    products to try, in order (see `fallbacks`).
+
+    """
+    table = load_sector_table()
+    tic = int(tic)
+    links = []
+    for sector in sectors:
+        sector = int(sector)
+        urls = []
+        for fallback in fallbacks(product, sector):
+            if fallback == "ffi":
+                digits = "{0:016d}".format(tic)
+                tic_path = "/".join(digits[i : i + 4] for i in range(0, 16, 4))
+                urls.append(
+                    TESS_SPOC_URL.format(
+                        sector=sector, tic=tic, tic_path=tic_path
+                    )
+                )
+            else:
+                date, pipeline = table[sector]
+                urls.append(
+                    DOWNLOAD_URL
+                    + SPOC_URI.format(
+                        date=date,
+                        sector=sector,
+                        tic=tic,
+                        pipeline=pipeline,
+                        suffix=SUFFIXES[fallback],
+                    )
+                )
+        if urls:
+            links.append(tuple(urls))
+    return links
+
+
+def bin_factor(cadence, binned_cadence=600):
+    """The binning factor that brings ``cadence`` (s) to ``binned_cadence``."""
+    return max(1, int(np.round(binned_cadence / cadence)))
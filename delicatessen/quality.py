@@ -0,0 +1,142 @@
+"""
+TESS quality flags, and vectorized masks and per-sector reductions over the
+concatenated light curves of all the sectors of a star.
+
+The functions work on whole multi-sector arrays in one pass; the sector of
+every cadence is given by an array of group numbers (see `sector_groups`).
+They never modify their inputs, and return new arrays (masks, indices) that
+can be reused to select the same cadences in several columns.
+
+"""
+
+# Third-party
+import numpy as np
+
+# The QUALITY bits of the SPOC light curves (TESS Science Data Products
+# Description Document)
+ATTITUDE_TWEAK = 1
+SAFE_MODE = 2
+COARSE_POINT = 4
+EARTH_POINT = 8
+ARGABRIGHTENING = 16
+MOMENTUM_DUMP = 32
+APERTURE_COSMIC = 64
+MANUAL_EXCLUDE = 128
+DISCONTINUITY = 256
+IMPULSIVE_OUTLIER = 512
+COLLATERAL_COSMIC = 1024
+STRAYLIGHT = 2048
+STRAYLIGHT2 = 4096
+PLANET_SEARCH_EXCLUDE = 8192
+BAD_CALIBRATION_EXCLUDE = 16384
+INSUFFICIENT_TARGETS = 32768
+
+# The cadences to exclude, as in lightkurve: "default" excludes the cadences
+# that are certainly bad, "hard" also those that may be, and "hardest" every
+# flagged cadence
+DEFAULT_BITMASK = (
+    ATTITUDE_TWEAK
+    | SAFE_MODE
+    | COARSE_POINT
+    | EARTH_POINT
+    | MOMENTUM_DUMP
+    | MANUAL_EXCLUDE
+)
+HARD_BITMASK = (
+    DEFAULT_BITMASK
+    | APERTURE_COSMIC
+    | COLLATERAL_COSMIC
+    | STRAYLIGHT
+    | STRAYLIGHT2
+)
+HARDEST_BITMASK = 65535
+BITMASKS = {
+    "none": 0,
+    "default": DEFAULT_BITMASK,
+    "hard": HARD_BITMASK,
+    "hardest": HARDEST_BITMASK,
+}
+
+
+def bitmask(preset):
+    """The bitmask of ``preset`` (a name in `BITMASKS`, or a bitmask)."""
+    if isinstance(preset, str):
+        return BITMASKS[preset]
+    return int(preset)
+
+
+def good_mask(quality, preset="default"):
+    """The cadences with none of the flags of ``preset`` set (boolean)."""
+    return np.bitwise_and(quality, bitmask(preset)) == 0
+
+
+def flagged(quality, flags):
+    """The indices of the cadences with any of ``flags`` set."""
+    return np.flatnonzero(np.bitwise_and(quality, bitmask(flags)))
+
+
+def sector_groups(lengths):
+    """
+    The group number of every row of concatenated arrays, from the number
+    of rows of each sector: e.g., ``[0, 0, 0, 1, 1]`` for ``[3, 2]``.
+
+    """
+    return np.repeat(np.arange(len(lengths)), lengths)
+
+
+def group_counts(groups, ngroups, mask=None):
+    """The number of rows of every group (in ``mask``, if given)."""
+    if mask is not None:
+        groups = groups[mask]
+    return np.bincount(groups, minlength=ngroups)
+
+
+def grouped_nanmedian(values, groups, ngroups):
+    """
+    The median of the finite ``values`` of every group (NaN for groups with
+    none).
+
+    Concatenated sectors have contiguous groups: the median of each is then
+    computed on a view of its rows (by partition, in linear time). Otherwise
+    the values are sorted by group once.
+
+    """
+    dtype = np.result_type(values.dtype, np.float32)
+    if np.all(groups[1:] >= groups[:-1]):
+        bounds = np.searchsorted(groups, np.arange(ngroups + 1))
+        medians = np.full(ngroups, np.nan, dtype=dtype)
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            rows = values[start:stop]
+            rows = rows[np.isfinite(rows)]
+            if len(rows):
+                medians[i] = np.median(rows)
+        return medians
+
+    finite = np.isfinite(values)
+    values, groups = values[finite], groups[finite]
+    values = values[np.lexsort((values, groups))]
+    counts = np.bincount(groups, minlength=ngroups)
+    if not len(values):
+        return np.full(ngroups, np.nan, dtype=dtype)
+    starts = np.cumsum(counts) - counts
+    lower = np.minimum(
+        starts + np.maximum(counts - 1, 0) // 2, len(values) - 1
+    )
+    upper = np.minimum(starts + counts // 2, len(values) - 1)
+    medians = 0.5 * (values[lower] + values[upper])
+    return np.where(counts > 0, medians, np.nan).astype(dtype)
+
+
+def subtract_grouped_median(values, groups, ngroups):
+    """``values`` minus the median of their group (a new array)."""
+    return values - grouped_nanmedian(values, groups, ngroups)[groups]
+
+
+def divide_grouped_median(values, groups, ngroups, *others):
+    """
+    ``values`` (and ``others``, e.g., their errors) divided by the median of
+    the values of their group (new arrays).
+
+    """
+    scale = grouped_nanmedian(values, groups, ngroups)[groups]
+    return tuple(v / scale for v in (values,) + others)
@@ -0,0 +1,97 @@
+"""
+The stars selected in the main plot, as seen by the tools.
+
+Bokeh reports every change of the selected indices of a source: a lasso or
+a burst of taps triggers several of them, and re-plotting the data (e.g.,
+choosing another axis) can report the same stars again. A `SelectionManager`
+turns them into the TIC IDs of the selected stars, once the selection has
+settled, and only when they change.
+
+"""
+
+# Standard library
+import time
+
+# How long the selection must be stable before it is passed on (ms)
+DELAY = 100
+
+
+class SelectionManager:
+    """
+    Pass the TIC IDs of the selected points of ``source`` to ``on_select``.
+
+    Parameters
+    ----------
+    doc  :  Document
+        the document of the session
+    source  :  ColumnDataSource
+        the source of the main plot (with a ``ticid`` column)
+    on_select  :  callable
+        called with the tuple of the selected TIC IDs (empty once the
+        selection is cleared), when they change
+    delay  :  int
+        how long the selection must be stable before ``on_select`` is called
+        (ms). Outside of a server (e.g., in scripts), it is called right away.
+
+    """
+
+    def __init__(self, doc, source, on_select, delay=DELAY):
+        self.doc = doc
+        self.source = source
+        self.on_select = on_select
+        self.delay = delay
+        self.ticids = None
+        self._changed_at = None
+        self._pending = False
+        self._timeout = None
+
+    def attach(self):
+        """Start following the selection, and pass on the current one."""
+        self.source.selected.on_change("indices", self._changed)
+        self.flush()
+
+    def detach(self):
+        """
+        Stop following the selection (a change that has not settled yet is
+        not passed on).
+        """
+        self.source.selected.remove_on_change("indices", self._changed)
+        if self._timeout is not None:
+            self.doc.remove_timeout_callback(self._timeout)
+            self._timeout = None
+        self._pending = False
+        self.ticids = None
+
+    def _changed(self, attr, old, new):
+        self._changed_at = time.monotonic()
+        if self.doc.session_context is None:
+            self.flush()
+        elif not self._pending:
+            self._pending = True
+            self._timeout = self.doc.add_timeout_callback(
+                self._settled, self.delay
+            )
+
+    def _settled(self):
+        # Wait until no change has been reported for ``delay``
+        self._timeout = None
+        remaining = self.delay - 1e3 * (time.monotonic() - self._changed_at)
+        if remaining > 1:
+            self._timeout = self.doc.add_timeout_callback(
+                self._settled, int(remaining)
+            )
+            return
+        self._pending = False
+        self.flush()
+
+    def flush(self):
+        """Pass on the current selection, if it changed."""
+        ticids = self.source.data.get("ticid", [])
+        ticids = tuple(
+            int(ticids[i])
+            for i in self.source.selected.indices
+            if i < len(ticids)
+        )
+        if ticids != self.ticids:
+            self.ticids = ticids
+            self.on_select(ticids)
@@ -0,0 +1,310 @@
+"""
+The ``deli`` launcher: serve the app with an embedded Bokeh server.
+
+In production, several worker processes can share the listening socket
+(``--num-procs``). The dataset is loaded before the workers are forked, so
+that they all share its memory pages (copy-on-write) instead of each loading
+its own copy.
+
+"""
+
+# delicatessen
+from . import mast
+from .cache import RESULTS
+from .main import DELI_PATH, MEMORY_BUDGET, Delicatessen, load_dataset
+from .memory import memory_report
+
+# Standard library
+import argparse
+import gc
+import json
+import os
+import sys
+
+# Third-party
+from bokeh.application import Application
+from bokeh.application.handlers import FunctionHandler
+from bokeh.server.server import Server
+from bokeh.themes import Theme
+from jinja2 import Environment, FileSystemLoader
+from tornado.process import task_id
+from tornado.web import RequestHandler, StaticFileHandler
+
+APP_PATH = "/delicatessen"
+MEMORY_PATH = "/deli-memory"
+SNAPSHOTS_PATH = "/snapshots"
+
+
+class DeliHandler(FunctionHandler):
+    """
+    Build a ``Delicatessen`` document for every session, with the same HTML
+    template, theme and static files as ``bokeh serve delicatessen``.
+
+    """
+
+    def __init__(
+        self,
+        data_file=None,
+        memory_budget=MEMORY_BUDGET,
+        features_file=None,
+        client_side=False,
+    ):
+        super().__init__(self._make_document)
+        self.data_file = data_file
+        self.memory_budget = memory_budget
+        self.features_file = features_file
+        self.client_side = client_side
+        env = Environment(
+            loader=FileSystemLoader(str(DELI_PATH / "templates"))
+        )
+        self._template = env.get_template("index.html")
+        self._theme = Theme(filename=str(DELI_PATH / "theme.yaml"))
+
+    def _make_document(self, doc):
+        doc.template = self._template
+        doc.theme = self._theme
+        Delicatessen(
+            doc,
+            data_file=self.data_file,
+            memory_budget=self.memory_budget,
+            features_file=self.features_file,
+            client_side=self.client_side,
+        )
+
+    def static_path(self):
+        return str(DELI_PATH / "static")
+
+
+class MemoryHandler(RequestHandler):
+    """Report the memory used by the live sessions of this process as JSON."""
+
+    def get(self):
+        report = memory_report()
+        report["shared_results"] = RESULTS.nbytes
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(report))
+
+
+def dev_server(data_file=None, features_file=None):
+    """Replace this process with ``bokeh serve --dev`` (auto-reload)."""
+    cmd = ["bokeh", "serve", "--show", str(DELI_PATH), "--dev"]
+    if data_file is not None or features_file is not None:
+        cmd += [
+            "--args",
+            data_file or str(DELI_PATH / "data" / "TESS-Gaia-mini.csv"),
+        ]
+        if features_file is not None:
+            cmd += [features_file]
+    os.execvp(cmd[0], cmd)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    if args[:1] == ["ingest"]:
+        # deli ingest: convert a catalog (see `delicatessen.catalog`)
+        from .catalog import main as ingest
+
+        return ingest(args[1:])
+
+    parser = argparse.ArgumentParser(
+        prog="deli",
+        description="Serve the delicatessen app (or, with deli ingest "
+        "CATALOG, convert a catalog into its serving format).",
+    )
+    parser.add_argument("--port", type=int, default=5006)
+    parser.add_argument("--address", default=None)
+    parser.add_argument(
+        "--num-procs",
+        type=int,
+        default=1,
+        help="number of worker processes; 0 means one per CPU",
+    )
+    parser.add_argument(
+        "--allow-websocket-origin",
+        action="append",
+        default=None,
+        help="public hostname(s) the app is served at (e.g., behind a proxy)",
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        default=37000,
+        help="interval between keep-alive pings to the browsers (ms)",
+    )
+    parser.add_argument(
+        "--check-unused-sessions",
+        type=int,
+        default=17000,
+        help="interval between two cleanups of unused sessions (ms)",
+    )
+    parser.add_argument(
+        "--unused-session-lifetime",
+        type=int,
+        default=15000,
+        help="how long a session without connections is kept (ms)",
+    )
+    parser.add_argument(
+        "--websocket-max-message-size",
+        type=int,
+        default=20 * 1024 * 1024,
+        help="largest websocket message accepted from a browser (bytes)",
+    )
+    parser.add_argument(
+        "--session-memory-budget",
+        type=float,
+        default=MEMORY_BUDGET / 1024**2,
+        help="memory for the light curves etc. cached by a session (MB)",
+    )
+    parser.add_argument(
+        "--cache-memory",
+        type=float,
+        default=RESULTS.budget / 1024**2,
+        help="memory for the results shared by the sessions of a process (MB)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="also store the shared results in this directory, to share them "
+        "between processes and across restarts",
+    )
+    parser.add_argument(
+        "--cache-workers",
+        type=int,
+        default=None,
+        help="number of threads computing results, per process",
+    )
+    parser.add_argument(
+        "--refresh-sectors",
+        action="store_true",
+        help="add the TESS sectors released since the last refresh to the "
+        "sector table, from MAST",
+    )
+    parser.add_argument(
+        "--mast-url",
+        default=None,
+        help="send the MAST requests to this server instead (e.g., a local "
+        "stand-in for tests, see benchmarks/fake_mast.py)",
+    )
+    parser.add_argument(
+        "--mast-connections",
+        type=int,
+        default=mast.MAX_CONNECTIONS,
+        help="number of requests made to MAST at once, per process",
+    )
+    parser.add_argument(
+        "--features",
+        default=None,
+        metavar="FILE",
+        help="light curve features to join to the data file as extra "
+        "columns (computed by deli-features)",
+    )
+    parser.add_argument(
+        "--snapshots",
+        default=None,
+        metavar="DIR",
+        help="serve the static snapshots of this directory (rendered by "
+        "deli-snapshots) at {0}/".format(SNAPSHOTS_PATH),
+    )
+    parser.add_argument(
+        "--client-side",
+        action="store_true",
+        help="send all the columns of the dataset to the browser once, and "
+        "let it apply the choice of axes, sizes, colors and axis transforms",
+    )
+    parser.add_argument(
+        "--show", action="store_true", help="open the app in a browser"
+    )
+    parser.add_argument(
+        "--dev",
+        action="store_true",
+        help="development mode: single process, reload on file changes",
+    )
+    parser.add_argument(
+        "--args",
+        nargs=argparse.REMAINDER,
+        default=[],
+        metavar="DATA_FILE",
+        help="the data file to serve (any format astropy.table can read, "
+        "or a catalog file written by deli ingest)",
+    )
+    args = parser.parse_args(args)
+    data_file = args.args[0] if len(args.args) else None
+
+    if args.dev:
+        dev_server(data_file, args.features)
+
+    if args.refresh_sectors:
+        # (the workers configure the client again, on the loop of the server)
+        mast.configure(url=args.mast_url)
+        new = mast.run(mast.client().refresh_sectors())
+        print("New TESS sectors: {0}".format(new or "none"))
+
+    RESULTS.configure(
+        budget=int(args.cache_memory * 1024**2),
+        directory=args.cache_dir,
+        max_workers=args.cache_workers,
+    )
+
+    # Load the dataset before forking: the workers share its memory pages.
+    # Freezing the garbage collector keeps it from writing to these pages
+    # (and thus copying them) in every worker.
+    load_dataset(data_file, args.features)
+    gc.freeze()
+
+    extra_patterns = [(MEMORY_PATH, MemoryHandler)]
+    if args.snapshots is not None:
+        extra_patterns.append(
+            (
+                SNAPSHOTS_PATH + "/(.*)",
+                StaticFileHandler,
+                dict(path=args.snapshots, default_filename="index.json"),
+            )
+        )
+
+    server = Server(
+        {
+            APP_PATH: Application(
+                DeliHandler(
+                    data_file,
+                    memory_budget=int(args.session_memory_budget * 1024**2),
+                    features_file=args.features,
+                    client_side=args.client_side,
+                )
+            )
+        },
+        port=args.port,
+        address=args.address,
+        num_procs=args.num_procs,
+        allow_websocket_origin=args.allow_websocket_origin,
+        keep_alive_milliseconds=args.keep_alive,
+        check_unused_sessions_milliseconds=args.check_unused_sessions,
+        unused_session_lifetime_milliseconds=args.unused_session_lifetime,
+        websocket_max_message_size=args.websocket_max_message_size,
+        extra_patterns=extra_patterns,
+    )
+    server.start()
+
+    # The downloads run on the loop of the server (of this worker process)
+    mast.configure(
+        url=args.mast_url,
+        max_connections=args.mast_connections,
+        loop=server.io_loop.asyncio_loop,
+    )
+
+    # Only one of the workers reports and opens the browser
+    if task_id() in [None, 0]:
+        print(
+            "delicatessen running at http://{0}:{1}{2} ({3} process{4})".format(
+                args.address or "localhost",
+                server.port,
+                APP_PATH,
+                args.num_procs or os.cpu_count(),
+                "" if args.num_procs == 1 else "es",
+            )
+        )
+        sys.stdout.flush()
+        if args.show:
+            server.io_loop.add_callback(server.show, APP_PATH)
+
+    server.io_loop.start()
@@ -0,0 +1,258 @@
+"""
+Static snapshots of the DeliLATTE panels of popular stars, which can be
+shown (e.g., linked to) without a live Bokeh session.
+
+``deli-snapshots`` renders the DeliLATTE layout of each star of a list, in
+a pool of processes, from the results cached by the server (see ``deli
+--cache-dir``; the missing ones are downloaded). The arrays are decimated to
+keep the pages small, and embedded as binary (base64) columns. Each star gets
+a standalone HTML page and a JSON document (for ``Bokeh.embed.embed_item``),
+and ``index.json`` maps the TIC IDs to them. The server serves the directory
+(``deli --snapshots DIR``).
+
+"""
+
+# delicatessen
+from .cache import RESULTS
+from .main import DELI_PATH
+from .tools import delilatte
+
+# Standard library
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import pathlib
+import tempfile
+import types
+
+# Third-party
+import numpy as np
+from bokeh.document import Document
+from bokeh.embed import file_html, json_item
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource, Tabs
+from bokeh.resources import CDN
+from bokeh.themes import Theme
+
+INDEX = "index.json"
+
+# The largest number of points of each plot of a snapshot
+MAX_POINTS = 20000
+
+
+def decimate(data, max_points=MAX_POINTS):
+    """
+    The light curves ``data`` of a star (a dict with the DeliLATTE
+    ``DATA_KEYS``) with every group of columns (see ``DATA_GROUPS``) thinned
+    to at most ``max_points`` rows, as native arrays, and ``sec_rows``
+    counting the rows kept in each sector.
+    """
+    data = dict(data)
+    rows = np.asarray(data["sec_rows"], dtype=int)
+    rows = rows.reshape(-1, len(delilatte.DATA_GROUPS))
+    stops = np.cumsum(rows, axis=0)
+    starts = stops - rows
+    kept = np.zeros_like(rows)
+    for i, group in enumerate(delilatte.DATA_GROUPS):
+        step = max(1, -(-len(data[group[0]]) // max_points))
+        for name in group:
+            data[name] = np.ascontiguousarray(data[name][::step])
+        # The rows kept in a sector are the multiples of ``step`` in it:
+        # ceil(stop / step) - ceil(start / step)
+        kept[:, i] = -starts[:, i] // step - -stops[:, i] // step
+    data["sec_rows"] = kept
+    return data
+
+
+def decimate_transits(result, max_points=MAX_POINTS):
+    """
+    The transit search ``result`` (a dict with the DeliLATTE
+    ``TRANSIT_KEYS``) with the folded light curve thinned to at most
+    ``max_points`` points.
+    """
+    result = dict(result)
+    step = max(1, -(-len(result["phase"]) // max_points))
+    for name in ["phase", "flux"]:
+        result[name] = np.ascontiguousarray(result[name][::step])
+    return result
+
+
+class _Session:
+    # The parts of a `Delicatessen` app that a DeliLATTE tool uses, for a
+    # tool rendered outside of a session
+    memory_budget = 0
+
+    def __init__(self):
+        self.doc = Document()
+        self.primary = types.SimpleNamespace(
+            source=ColumnDataSource(data=dict(ticid=[]))
+        )
+
+
+def render(ticid, product, directory):
+    """
+    Write the snapshot of the star ``ticid`` (of the given ``product``) to
+    ``directory``.
+
+    Returns
+    -------
+    dict
+        the entry of the star in the index
+
+    """
+    data = RESULTS.get(
+        ("lightcurves", ticid, product),
+        lambda: delilatte.fetch_lightcurves(ticid, product),
+    )
+    sectors = "_".join(str(int(s)) for s in data["in_sec"])
+    periodogram = RESULTS.get(
+        ("periodogram", ticid, product, sectors),
+        lambda: delilatte.periodogram_of(data, ticid, product),
+    )
+    transits = RESULTS.get(
+        ("transits", ticid, product, sectors),
+        lambda: delilatte.transits_of(data, ticid, product),
+    )
+
+    tool = delilatte.DeliLATTE(_Session())
+    # A static page does not follow the time range: the decimated light
+    # curve is shown whole, and no tiles are computed (nor cached)
+    tool.tiled = False
+    # (the product first: its callback shows the star, if one is set)
+    tool.product.value = product
+    tool.ticid = ticid
+    tool.show(ticid, product, decimate(data), tabs=[0, 1])
+    # (the periodogram is sampled by the tool, like in a session)
+    tool.show_periodogram(ticid, product, periodogram)
+    tool.show_transits(ticid, product, decimate_transits(transits))
+    tool.plot.title.text = "TIC {0}".format(ticid)
+    # The same panels, in tabs without the Python callback of the tool (a
+    # static page has none; the tabs still switch)
+    tabs = Tabs(tabs=tool.tabs.tabs, css_classes=tool.tabs.css_classes)
+    layout = column(tool.plot, tabs, sizing_mode="stretch_width")
+
+    theme = Theme(filename=str(DELI_PATH / "theme.yaml"))
+    title = "TIC {0} - delicatessen".format(ticid)
+    name = str(ticid)
+    with open(os.path.join(directory, name + ".html"), "w") as f:
+        f.write(file_html(layout, CDN, title, theme=theme))
+    with open(os.path.join(directory, name + ".json"), "w") as f:
+        json.dump(json_item(layout, name, theme=theme), f)
+
+    return dict(
+        html=name + ".html",
+        json=name + ".json",
+        product=product,
+        sectors=[int(s) for s in data["in_sec"]],
+        created=datetime.datetime.utcnow().isoformat(timespec="seconds"),
+    )
+
+
+def read_index(directory):
+    """The index of the snapshots in ``directory``: TIC ID -> entry."""
+    path = os.path.join(directory, INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {int(ticid): entry for ticid, entry in json.load(f).items()}
+
+
+def write_index(directory, index):
+    # Replace the index at once, so that readers never see a partial file
+    fd, tmp = tempfile.mkstemp(suffix=".json", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump({str(ticid): entry for ticid, entry in index.items()}, f)
+    os.replace(tmp, os.path.join(directory, INDEX))
+
+
+def _init_worker(cache_dir):
+    # Read (and store) the results where the server keeps them, without
+    # keeping them in memory
+    RESULTS.configure(budget=0, directory=cache_dir)
+
+
+def export(ticids, directory, product="auto", processes=None, cache_dir=None):
+    """
+    Render the snapshots of the stars ``ticids`` in a pool of ``processes``
+    and add them to the index of ``directory``.
+
+    Returns
+    -------
+    rendered, failed  :  int
+        the number of stars rendered, or whose rendering failed
+
+    """
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    index = read_index(directory)
+    ticids = list(dict.fromkeys(int(ticid) for ticid in ticids))
+
+    failed = 0
+    executor = concurrent.futures.ProcessPoolExecutor(
+        processes, initializer=_init_worker, initargs=(cache_dir,)
+    )
+    with executor:
+        futures = {
+            executor.submit(render, ticid, product, directory): ticid
+            for ticid in ticids
+        }
+        for future in concurrent.futures.as_completed(futures):
+            ticid = futures[future]
+            try:
+                index[ticid] = future.result()
+            except Exception as e:
+                print("TIC {0} failed: {1!r}".format(ticid, e))
+                failed += 1
+    write_index(directory, index)
+    return len(ticids) - failed, failed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="deli-snapshots",
+        description="Render static snapshots of the Deli-LATTE panels of "
+        "stars (to serve with deli --snapshots).",
+    )
+    parser.add_argument("directory", help="where to write the snapshots")
+    parser.add_argument(
+        "ticids",
+        nargs="*",
+        type=int,
+        help="the TIC IDs of the stars (or use --list)",
+    )
+    parser.add_argument(
+        "--list",
+        default=None,
+        help="a file with the TIC IDs of the stars, one per line",
+    )
+    parser.add_argument(
+        "--product",
+        default="auto",
+        help="the light curve product (20s, 2min, ffi or auto)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="the directory of the cached results (as deli --cache-dir)",
+    )
+    args = parser.parse_args(args)
+
+    ticids = list(args.ticids)
+    if args.list is not None:
+        with open(args.list) as f:
+            ticids += [int(line) for line in f if line.strip()]
+    rendered, failed = export(
+        ticids,
+        args.directory,
+        product=args.product,
+        processes=args.processes,
+        cache_dir=args.cache_dir,
+    )
+    print("{0} snapshots rendered, {1} failed".format(rendered, failed))
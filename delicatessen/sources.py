@@ -0,0 +1,548 @@
+"""
+The datasets of the "Main Dishes" menu, and their incremental refresh.
+
+A dataset comes from an adapter (a `DataSource`): a local file
+(`FileTable`), a remote CSV or JSON endpoint (`RemoteTable`, e.g., the TOI
+catalog of ExoFOP, see `toi_feed`), or a directory of partitions
+(`PartitionedTable`). Its `Feed` holds the dataset, shared by all the
+sessions of a process, and refreshes it: the adapter returns only the rows
+that may be new or changed since the last refresh (e.g., the rows of the
+partitions added since, or nothing if the server answers that the endpoint
+has not changed), and the feed appends the rows with new keys and patches
+the others. The columns are kept in buffers with room to grow, so that a
+refresh costs the rows it brings, not a reload of the catalog (but for the
+columns it patches, which are copied: the published datasets are views of the
+buffers, and never change); the index of the keys and the statistics of the
+columns are updated as well.
+
+The sessions showing a feed poll it (see ``Plot.poll``), and send the
+browser only its changes (`Feed.changes`), with ``ColumnDataSource.stream``
+and ``patch``.
+
+Packages can add datasets to the menu with `register_source`.
+
+"""
+
+# delicatessen
+from . import catalog
+
+# Standard library
+import io
+import json
+import os
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Third-party
+import numpy as np
+import pandas as pd
+
+# How often the sessions showing a feed poll it, and how often a feed is
+# refreshed at most (s)
+POLL_INTERVAL = 60
+REFRESH_INTERVAL = 300
+
+# The number of refreshes remembered by a feed: sessions that missed more
+# get the whole dataset again
+LOG_SIZE = 100
+
+# How long a request to a remote endpoint may take (s)
+TIMEOUT = 60
+
+# The TOI catalog of ExoFOP (CSV), and its columns kept in the dataset:
+# name in the CSV -> column
+TOI_URL = (
+    "https://exofop.ipac.caltech.edu/tess/download_toi.php"
+    "?sort=toi&output=csv"
+)
+TOI_COLUMNS = OrderedDict(
+    [
+        ("TIC ID", "ticid"),
+        ("TOI", "toi"),
+        ("TESS Mag", "tmag"),
+        ("Period (days)", "period"),
+        ("Duration (hours)", "duration"),
+        ("Depth (ppm)", "depth"),
+        ("Planet Radius (R_Earth)", "planet_radius"),
+        ("Planet Equil Temp (K)", "planet_teq"),
+        ("Planet SNR", "snr"),
+        ("Stellar Distance (pc)", "dist"),
+        ("Stellar Eff Temp (K)", "teff"),
+        ("Stellar Radius (R_Sun)", "star_radius"),
+    ]
+)
+
+
+class DataSource:
+    """
+    An adapter of a dataset of the menu.
+
+    ``load()`` returns the dataset (a DataFrame), and ``refresh()`` the rows
+    that may be new or changed since the last call (a DataFrame, or None if
+    nothing changed). The rows are told apart by their ``key`` column.
+
+    """
+
+    def __init__(self, key=catalog.TICID):
+        self.key = key
+
+    def load(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        return None
+
+
+def _signature(path):
+    # What tells whether a file has changed
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileTable(DataSource):
+    """
+    A table in a local file (see `delicatessen.catalog.open_table`), read
+    again when the file changes.
+    """
+
+    def __init__(self, path, key=catalog.TICID, format=None):
+        super().__init__(key)
+        self.path = str(path)
+        self.format = format
+        self._signature = None
+
+    def load(self):
+        self._signature = _signature(self.path)
+        return catalog.open_table(self.path, format=self.format)
+
+    def refresh(self):
+        signature = _signature(self.path)
+        if signature == self._signature:
+            return None
+        self._signature = signature
+        return catalog.open_table(self.path, format=self.format)
+
+
+class PartitionedTable(DataSource):
+    """
+    A table split in the files of a ``directory`` that match ``pattern``
+    (e.g., one per day): a refresh reads the partitions added or modified
+    since (the rows of the removed ones are kept).
+    """
+
+    def __init__(self, directory, pattern="*", key=catalog.TICID, format=None):
+        super().__init__(key)
+        self.directory = pathlib.Path(directory)
+        self.pattern = pattern
+        self.format = format
+        self._signatures = {}
+
+    def _read(self, changed_only):
+        tables = []
+        for path in sorted(self.directory.glob(self.pattern)):
+            signature = _signature(path)
+            if changed_only and self._signatures.get(path) == signature:
+                continue
+            self._signatures[path] = signature
+            tables.append(catalog.open_table(str(path), format=self.format))
+        if not tables:
+            return None
+        return pd.concat(tables, ignore_index=True)
+
+    def load(self):
+        self._signatures = {}
+        dataset = self._read(changed_only=False)
+        if dataset is None:
+            raise ValueError("No partitions in {0}".format(self.directory))
+        return dataset
+
+    def refresh(self):
+        return self._read(changed_only=True)
+
+
+class RemoteTable(DataSource):
+    """
+    A table served as CSV or JSON (a list of records, or a dict of columns)
+    at ``url``.
+
+    A refresh is a conditional request (with the ``ETag`` or
+    ``Last-Modified`` of the last answer), so that an unchanged table is not
+    downloaded again. If the endpoint can return only the rows modified
+    after some value (e.g., a date), ``since`` is the name of this parameter
+    and of the column of the table it applies to: ``(parameter, column)``.
+    ``transform`` (if given) is applied to the parsed tables.
+    """
+
+    def __init__(
+        self,
+        url,
+        key=catalog.TICID,
+        format="csv",
+        transform=None,
+        since=None,
+        timeout=TIMEOUT,
+    ):
+        super().__init__(key)
+        self.url = url
+        self.format = format
+        self.transform = transform
+        self.since = since
+        self.timeout = timeout
+        self._validators = {}
+        self._latest = None
+
+    def _get(self, conditional):
+        import requests
+
+        headers, params = {}, {}
+        if conditional:
+            if "ETag" in self._validators:
+                headers["If-None-Match"] = self._validators["ETag"]
+            if "Last-Modified" in self._validators:
+                headers["If-Modified-Since"] = self._validators[
+                    "Last-Modified"
+                ]
+            if self.since is not None and self._latest is not None:
+                params[self.since[0]] = self._latest
+        response = requests.get(
+            self.url, headers=headers, params=params, timeout=self.timeout
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self._validators = {
+            name: response.headers[name]
+            for name in ["ETag", "Last-Modified"]
+            if name in response.headers
+        }
+
+        if self.format == "json":
+            table = pd.DataFrame(json.loads(response.content))
+        else:
+            table = pd.read_csv(io.BytesIO(response.content))
+        if self.transform is not None:
+            table = self.transform(table)
+        if self.since is not None and len(table):
+            latest = table[self.since[1]].max()
+            if self._latest is None or latest > self._latest:
+                self._latest = latest
+        return table
+
+    def load(self):
+        self._validators, self._latest = {}, None
+        return self._get(conditional=False)
+
+    def refresh(self):
+        return self._get(conditional=True)
+
+
+def _degrees(values, hours=False):
+    # Sexagesimal strings ("hh:mm:ss.s" or "dd:mm:ss.s") as degrees
+    parts = pd.Series(values, dtype=str).str.split(":", expand=True)
+    parts = parts.reindex(columns=range(3)).apply(
+        pd.to_numeric, errors="coerce"
+    )
+    sign = np.where(pd.Series(values, dtype=str).str.startswith("-"), -1, 1)
+    degrees = parts[0].abs() + parts[1] / 60 + parts[2] / 3600
+    return sign * degrees.to_numpy() * (15 if hours else 1)
+
+
+def toi_columns(table):
+    """
+    The columns of the TOI catalog of ExoFOP kept in the dataset (see
+    `TOI_COLUMNS`), as numbers, and the coordinates of the stars in degrees
+    (``ra`` and ``dec``).
+    """
+    columns = OrderedDict()
+    for name, column in TOI_COLUMNS.items():
+        if name in table:
+            columns[column] = pd.to_numeric(table[name], errors="coerce")
+    if "RA" in table and "Dec" in table:
+        columns["ra"] = _degrees(table["RA"], hours=True)
+        columns["dec"] = _degrees(table["Dec"])
+    return pd.DataFrame(columns)
+
+
+def toi_feed(url=TOI_URL):
+    """The live TOI catalog of ExoFOP, one row per TOI."""
+    return RemoteTable(url, key="toi", transform=toi_columns)
+
+
+def _equal(a, b):
+    # Whether the values of ``a`` and ``b`` are the same (NaNs included)
+    with np.errstate(invalid="ignore"):
+        return (a == b) | (pd.isnull(a) & pd.isnull(b))
+
+
+class Feed:
+    """
+    The dataset of a `DataSource`, shared by the sessions of a process, and
+    refreshed incrementally.
+
+    Attributes
+    ----------
+    dataset  :  DataFrame or None
+        the dataset (None until loaded): its columns are views of the
+        buffers of the feed, so it must not be modified (a refresh publishes
+        a new dataset, and never modifies the rows of a published one)
+    version  :  int
+        the number of refreshes that changed the dataset
+
+    """
+
+    def __init__(self, source, interval=REFRESH_INTERVAL):
+        self.source = source
+        self.interval = interval
+        self.dataset = None
+        self.version = 0
+        self._buffers = {}
+        self._owned = set()
+        self._nrows = 0
+        self._rows = {}
+        self._stats = None
+        self._log = []
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = None
+        self._refreshed = 0
+
+    def load(self):
+        """The dataset, loaded by the first call."""
+        with self._lock:
+            if self.dataset is None:
+                dataset = self.source.load()
+                self._buffers = {
+                    str(name): dataset[name].to_numpy() for name in dataset
+                }
+                self._owned = set()
+                self._nrows = len(dataset)
+                self._rows = {
+                    key: row
+                    for row, key in enumerate(dataset[self.source.key])
+                }
+                self._stats = dataset.attrs.get("stats") or {
+                    name: catalog.column_stats(values)
+                    for name, values in self._buffers.items()
+                    if values.dtype.kind in "iuf"
+                }
+                self._refreshed = time.time()
+                self._publish()
+            return self.dataset
+
+    def _publish(self):
+        # The dataset, as views of the buffers
+        dataset = pd.DataFrame(
+            {
+                name: buffer[: self._nrows]
+                for name, buffer in self._buffers.items()
+            },
+            copy=False,
+        )
+        dataset.attrs["stats"] = self._stats
+        self.dataset = dataset
+
+    def _buffer(self, name, size, dtype):
+        # The buffer of column ``name``, writable, with room for ``size``
+        # rows, and a type that holds ``dtype`` values (the strings are
+        # objects, like in pandas)
+        buffer = self._buffers[name]
+        dtype = np.result_type(
+            object if buffer.dtype.kind in "SU" else buffer.dtype, dtype
+        )
+        owned = name in self._owned
+        if owned and len(buffer) >= size and dtype == buffer.dtype:
+            return buffer
+
+        # The buffers grow by half their size at least, so that appending
+        # rows costs the rows appended on average
+        capacity = len(buffer)
+        if not owned or capacity < size:
+            capacity = max(size, self._nrows + self._nrows // 2, 16)
+        grown = np.empty(capacity, dtype=dtype)
+        grown[: self._nrows] = buffer[: self._nrows]
+        if dtype.kind == "O":
+            grown[self._nrows :] = None
+        self._buffers[name] = grown
+        self._owned.add(name)
+        return grown
+
+    def _apply(self, rows):
+        key = self.source.key
+        rows = rows.drop_duplicates(key, keep="last")
+        positions = np.array(
+            [self._rows.get(k, -1) for k in rows[key]], dtype=np.int64
+        )
+        new = positions < 0
+        old = positions[~new]
+
+        # The rows with known keys: patch the values that changed
+        patched, changed = [], set()
+        for name in self._buffers:
+            if name not in rows or not len(old):
+                continue
+            values = rows[name].to_numpy()[~new]
+            differ = ~_equal(self._buffers[name][old], values)
+            if differ.any():
+                # The published datasets are views of the buffer: patch a
+                # copy of it
+                self._owned.discard(name)
+                buffer = self._buffer(name, self._nrows, values.dtype)
+                buffer[old[differ]] = values[differ]
+                patched.append(old[differ])
+                changed.add(name)
+
+        # The rows with new keys: append them (the missing columns are NaN)
+        appended = rows[new]
+        n, m = self._nrows, len(appended)
+        if m:
+            for name in self._buffers:
+                if name in appended:
+                    values = appended[name].to_numpy()
+                else:
+                    values = np.full(m, np.nan)
+                buffer = self._buffer(name, n + m, values.dtype)
+                buffer[n : n + m] = values
+            for row, k in enumerate(appended[key], start=n):
+                self._rows[k] = row
+            self._nrows = n + m
+
+        if not m and not patched:
+            return False
+        stats = dict(self._stats)
+        for name in stats:
+            if name in changed:
+                stats[name] = catalog.column_stats(
+                    self._buffers[name][: self._nrows]
+                )
+            elif m:
+                stats[name] = catalog.merge_stats(
+                    stats[name], self._buffers[name][n : n + m]
+                )
+        self._stats = stats
+        self.version += 1
+        patched = np.unique(np.concatenate(patched or [np.zeros(0, int)]))
+        self._log.append((self.version, n, patched))
+        del self._log[:-LOG_SIZE]
+        self._publish()
+        return True
+
+    def refresh(self):
+        """
+        Apply the rows of the source that are new or changed since the last
+        refresh. Returns whether the dataset changed.
+        """
+        self.load()
+        with self._refresh_lock:
+            rows = self.source.refresh()
+            self._refreshed = time.time()
+            if rows is None or not len(rows):
+                return False
+            with self._lock:
+                return self._apply(rows)
+
+    def refresh_async(self):
+        """
+        Refresh the feed in a worker thread, unless it was refreshed less
+        than ``interval`` seconds ago or is being refreshed. Returns the
+        future of the refresh (None if there is none).
+        """
+        with self._lock:
+            if self._refreshing is not None and not self._refreshing.done():
+                return self._refreshing
+            if time.time() - self._refreshed < self.interval:
+                return None
+            self._refreshing = _executor().submit(self.refresh)
+            return self._refreshing
+
+    def changes(self, version):
+        """
+        The changes of the dataset since ``version``.
+
+        Returns
+        -------
+        version  :  int
+            the current version
+        dataset  :  DataFrame
+            the current dataset
+        start  :  int or None
+            the first row appended since (the rows after it are new), or
+            None if ``version`` is None, too old, or not one of this feed
+            (e.g., newer, from the feed of a source registered again): the
+            whole dataset has changed
+        patched  :  array or None
+            the rows before ``start`` patched since
+
+        """
+        with self._lock:
+            if version == self.version:
+                return version, self.dataset, self._nrows, np.zeros(0, int)
+            if version is None:
+                return self.version, self.dataset, None, None
+            entries = [entry for entry in self._log if entry[0] > version]
+            if not entries or entries[0][0] != version + 1:
+                return self.version, self.dataset, None, None
+            start = entries[0][1]
+            patched = np.unique(
+                np.concatenate([entry[2] for entry in entries])
+            )
+            return self.version, self.dataset, start, patched[patched < start]
+
+
+# The registered sources (name in the menu -> source, or a function that
+# returns it), and their feeds in this process
+_REGISTRY = OrderedDict([("TOI Catalog", toi_feed)])
+_FEEDS = {}
+_FEEDS_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def _executor():
+    # Created on first use, so that no thread is started before the server
+    # forks its worker processes
+    global _EXECUTOR
+    with _FEEDS_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(4)
+        return _EXECUTOR
+
+
+def register_source(name, source):
+    """
+    Add a dataset to the "Main Dishes" menu: ``source`` is a `DataSource`,
+    or a function that returns one (called when a user first chooses it).
+    """
+    with _FEEDS_LOCK:
+        _REGISTRY[name] = source
+        _FEEDS.pop(name, None)
+
+
+def available_sources():
+    """The names of the registered datasets."""
+    return list(_REGISTRY)
+
+
+def feed(name):
+    """The feed of the dataset ``name`` in this process."""
+    with _FEEDS_LOCK:
+        if name not in _FEEDS:
+            source = _REGISTRY[name]
+            if not isinstance(source, DataSource):
+                source = source()
+            _FEEDS[name] = Feed(source)
+        return _FEEDS[name]
+
+
+def load(name):
+    """
+    The future of the dataset ``name``, loaded in a worker thread (done if
+    it is already loaded).
+    """
+    current = feed(name)
+    if current.dataset is not None:
+        future = Future()
+        future.set_result(current.dataset)
+        return future
+    return _executor().submit(current.load)
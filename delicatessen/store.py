@@ -0,0 +1,162 @@
+"""
+A compact file format for processed light curves.
+
+A file holds the columns of the light curves of one star (e.g., time, flux,
+quality bitmask), each stored contiguously, in little-endian order and
+aligned, so that reading a file memory-maps it and returns its columns as
+arrays without copying them (they can be passed as they are to a
+``ColumnDataSource``). Columns can also be compressed (with zlib), at the
+cost of decompressing them on every read.
+
+Each column has a sector index: the range of its rows that comes from each
+sector, which `read` uses to return only some of the sectors.
+
+The layout is::
+
+    MAGIC (8 bytes)
+    header size (uint64)
+    header (JSON): columns (dtype, length, offset, size, compression),
+                   sector index of every column, and metadata
+    padding
+    columns, each aligned to ALIGN bytes
+
+"""
+
+# Standard library
+import json
+import zlib
+
+# Third-party
+import numpy as np
+
+MAGIC = b"DELILC01"
+ALIGN = 64
+
+
+def _padding(offset):
+    return -offset % ALIGN
+
+
+def write(path, columns, index=None, meta=None, compress=False):
+    """
+    Write a light curve file.
+
+    Parameters
+    ----------
+    path  :  str or path
+        the file to write
+    columns  :  dict
+        the columns (1d arrays), stored with their own dtype
+    index  :  dict or None
+        for each column (optional), a list of ``(sector, start, stop)``: the
+        range of its rows that comes from each sector
+    meta  :  dict or None
+        anything else (JSON-serializable, e.g., the magnitude of the star)
+    compress  :  bool
+        compress the columns (with the fastest zlib level; the file cannot be
+        memory-mapped then)
+
+    """
+    payloads = []
+    layout = {}
+    offset = 0
+    for name, values in columns.items():
+        values = np.ascontiguousarray(values)
+        values = values.astype(values.dtype.newbyteorder("<"), copy=False)
+        payload = values.tobytes()
+        if compress:
+            payload = zlib.compress(payload, 1)
+        layout[name] = dict(
+            dtype=values.dtype.str,
+            length=len(values),
+            offset=offset,
+            size=len(payload),
+            compression="zlib" if compress else None,
+        )
+        payloads.append(payload)
+        offset += len(payload) + _padding(len(payload))
+
+    header = json.dumps(
+        dict(
+            columns=layout,
+            index={
+                name: [[int(s), int(a), int(b)] for s, a, b in rows]
+                for name, rows in (index or {}).items()
+            },
+            meta=meta or {},
+        )
+    ).encode()
+    start = len(MAGIC) + 8 + len(header)
+    start += _padding(start)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).astype("<u8").tobytes())
+        f.write(header)
+        f.write(b"\0" * (start - f.tell()))
+        for payload in payloads:
+            f.write(payload)
+            f.write(b"\0" * _padding(len(payload)))
+
+
+def read(path, sectors=None):
+    """
+    Read a light curve file.
+
+    Uncompressed columns are read-only views of the memory-mapped file. If
+    ``sectors`` is given, only the rows of these sectors are returned (as a
+    view if they are contiguous in the file, as a copy otherwise).
+
+    Returns
+    -------
+    columns  :  dict
+        the columns
+    index  :  dict
+        the sector index of the columns (see `write`)
+    meta  :  dict
+        the metadata
+
+    """
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(buf[: len(MAGIC)]) != MAGIC:
+        raise ValueError("{0} is not a light curve file".format(path))
+    size = int(buf[len(MAGIC) : len(MAGIC) + 8].view("<u8")[0])
+    header = json.loads(bytes(buf[len(MAGIC) + 8 : len(MAGIC) + 8 + size]))
+    start = len(MAGIC) + 8 + size
+    start += _padding(start)
+
+    columns = {}
+    for name, column in header["columns"].items():
+        dtype = np.dtype(column["dtype"])
+        offset = start + column["offset"]
+        if column["compression"] == "zlib":
+            payload = zlib.decompress(buf[offset : offset + column["size"]])
+            values = np.frombuffer(payload, dtype=dtype)
+        else:
+            values = np.ndarray(
+                shape=(column["length"],),
+                dtype=dtype,
+                buffer=buf,
+                offset=offset,
+            )
+        columns[name] = values
+
+    index = header["index"]
+    if sectors is not None:
+        for name, rows in index.items():
+            rows = [(s, a, b) for s, a, b in rows if s in sectors]
+            if rows and all(r[2] == q[1] for r, q in zip(rows, rows[1:])):
+                columns[name] = columns[name][rows[0][1] : rows[-1][2]]
+            else:
+                columns[name] = np.concatenate(
+                    [columns[name][:0]]
+                    + [columns[name][a:b] for _, a, b in rows]
+                )
+            # The rows of each sector in the returned column
+            stops = np.cumsum([b - a for _, a, b in rows], dtype=int)
+            index[name] = [
+                (s, int(stop - (b - a)), int(stop))
+                for (s, a, b), stop in zip(rows, stops)
+            ]
+
+    return columns, index, header["meta"]
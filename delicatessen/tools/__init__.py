@@ -1,2 +1,69 @@
 from .base import BaseTool
-from .delilatte import DeliLATTE
+
+# Standard library
+import importlib
+from collections import OrderedDict
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:  # Python < 3.8
+    entry_points = None
+
+
+# Packages can add tools to the "Beverages" menu by declaring an entry point
+# in this group, e.g. in their setup.py:
+#
+#   entry_points={"delicatessen.tools": ["My Tool = mypackage.tool:MyTool"]}
+#
+ENTRY_POINT_GROUP = "delicatessen.tools"
+
+# The built-in tools: name in the menu -> "module:class" (relative to this
+# package)
+_REGISTRY = OrderedDict([("Deli-LATTE", ".delilatte:DeliLATTE")])
+
+
+def register_tool(name, target):
+    """
+    Add a tool to the menu.
+
+    ``target`` is either a tool class, or a ``"module:class"`` string: the
+    module is then only imported when a user first chooses the tool.
+
+    """
+    _REGISTRY[name] = target
+
+
+def available_tools():
+    """
+    Return the registered tools (name -> class or ``"module:class"``),
+    including those declared as entry points, without importing them.
+
+    """
+    tools = OrderedDict(_REGISTRY)
+    if entry_points is not None:
+        eps = entry_points()
+        if hasattr(eps, "select"):
+            eps = eps.select(group=ENTRY_POINT_GROUP)
+        else:
+            eps = eps.get(ENTRY_POINT_GROUP, [])
+        for ep in eps:
+            tools.setdefault(ep.name, ep.value)
+    return tools
+
+
+def load_tool(name):
+    """Return the class of the tool called ``name``, importing it if needed."""
+    target = available_tools()[name]
+    if not isinstance(target, str):
+        return target
+    module, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module, package=__name__), attr)
+
+
+# The tools are only imported (with their dependencies) when first used
+def __getattr__(name):
+    if name == "DeliLATTE":
+        return load_tool("Deli-LATTE")
+    raise AttributeError(
+        "module {0!r} has no attribute {1!r}".format(__name__, name)
+    )
@@ -11,5 +11,34 @@ class BaseTool:
     def callback(self, attr, old, new):
         pass
 
+    def activate(self):
+        """
+        Called when the user switches to this tool. Tools are built once per
+        session, so this can be called several times.
+
+        """
+        pass
+
+    def deactivate(self):
+        """
+        Called when the user switches to another tool: unregister callbacks
+        and empty the plots, but keep any results the tool may reuse when the
+        user switches back.
+
+        """
+        pass
+
+    def release(self):
+        """
+        Drop the tool's cached results. Called when the session is destroyed.
+
+        """
+        pass
+
+    @property
+    def nbytes(self):
+        """Memory used by the tool's cached results (bytes)."""
+        return 0
+
     def layout(self):
         return Div()
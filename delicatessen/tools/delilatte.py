@@ -1,73 +1,345 @@
 # delicatessen
 from .base import BaseTool
+from .. import detrend, mast, periodogram, products, quality, store
+from .. import transits
+from ..cache import RESULTS, register_format
+from ..fits import FitsTable
+from ..memory import LRUCache
+from ..selection import SelectionManager
 
 # Third-party
 import numpy as np
-from bokeh.models import ColumnDataSource, Panel, Tabs
+from bokeh.core.property.validation import validate
+from bokeh.models import ColumnDataSource, Panel, Select, Tabs
 from bokeh.plotting import figure
 
-import sys
-import json
-import requests
-import lightkurve as lk
-from urllib.parse import quote as urlencode
-from tess_stars2px import tess_stars2px_function_entry
+from functools import partial
 
-import http.client as httplib
-import astropy.io.fits as pf
 from bokeh.layouts import column, row, Spacer
 
+# NOTE: the heavy dependencies (tess-point and requests) are
+# imported in the functions that use them, so that they are only loaded once
+# a user actually looks at a light curve.
+
+# The outputs of `download_data` and `compute_periodogram`
+DATA_KEYS = [
+    "alltime",
+    "allflux",
+    "allflux_err",
+    "all_md",
+    "alltimebinned",
+    "allfluxbinned",
+    "allx1",
+    "allx2",
+    "ally1",
+    "ally2",
+    "alltimel2",
+    "allfbkg",
+    "start_sec",
+    "end_sec",
+    "in_sec",
+    "tessmag",
+    "teff",
+    "srad",
+    "allquality",
+    "sec_rows",
+]
+PERIODOGRAM_KEYS = ["freq", "power", "freq_smooth", "power_smooth"]
+
+# The outputs of `transits_of` and `preprocessed_of`
+TRANSIT_KEYS = transits.RESULT_KEYS
+PREPROCESSED_KEYS = ["flux", "trend", "fluxbinned"]
+
+# The outputs of `centroid_tracks`: the time, the centroid columns (x1, x2,
+# y1 and y2: see `download_data`), and the same smoothed
+CENTROID_COLUMNS = ["allx1", "allx2", "ally1", "ally2"]
+CENTROID_KEYS = (
+    ["time"]
+    + [name[3:] for name in CENTROID_COLUMNS]
+    + [name[3:] + "_smooth" for name in CENTROID_COLUMNS]
+)
+
+# The resolutions of the centroid tracks (minutes; None for every cadence),
+# as shown in the menu of the centroid panel, and the window of their
+# smoothing (days)
+CENTROID_RESOLUTIONS = {
+    "full": None,
+    "10min": 10,
+    "30min": 30,
+    "2h": 120,
+}
+CENTROID_RESOLUTION_NAMES = {
+    "full": "Every cadence",
+    "10min": "10 min",
+    "30min": "30 min",
+    "2h": "2 h",
+}
+CENTROID_SMOOTHING = 2 / 24
+
+# The shortest bins the centroid tracks are smoothed in (minutes)
+CENTROID_SMOOTHING_BIN = 10
+
+# The gaps that the centroid tracks are not binned or smoothed across (days)
+CENTROID_GAP = 0.5
+
+# The resolutions of the tiles of the light curves (minutes; None for every
+# cadence), finest first, and the number of bins a tile spans (of 2 minutes,
+# for every cadence: see `tile_span`)
+TILE_RESOLUTIONS = {
+    "full": None,
+    "10min": 10,
+    "30min": 30,
+    "2h": 120,
+    "8h": 480,
+}
+TILE_BINS = 720
+
+# The most points of a light curve in the visible time range (it is shown at
+# the finest resolution under it), and the most points the plot holds before
+# the tiles out of view are dropped
+MAX_TILE_POINTS = 20000
+TILE_CAPACITY = 2 * MAX_TILE_POINTS
+
+# How often the tiles follow the time range while the user pans or zooms (ms)
+TILE_DELAY = 100
+
+# The most frequencies of the periodogram shown (it is computed on a much
+# finer grid: see `sample_periodogram`)
+PERIODOGRAM_POINTS = 5000
+
+# The number of stars whose light curves are stacked when several stars are
+# selected
+MAX_STACKED = 10
+
+# The columns of the data of a star, by group of columns with one row per
+# cadence (the first column of a group is the time)
+DATA_GROUPS = [
+    ["alltime", "allflux", "allflux_err", "allfbkg", "allquality"],
+    ["alltimebinned", "allfluxbinned"],
+    ["alltimel2", "allx1", "allx2", "ally1", "ally2"],
+    ["all_md"],
+]
+
 # --- functions needed to download the TESS data
 
 
-def mastQuery(request, proxy_uri=None):
+def read_lightcurves(lcfiles, binfac=None, test="no", bitmask="hardest"):
+    """
+    Read, normalize and bin the light curves of the chosen target star.
+
+    Parameters
+    ----------
+    lcfiles  :  list
+        download links (or local paths) of the light curve files; an item
+        can also be a tuple of links, of which the first that can be
+        downloaded is used, or the content of a file (bytes)
+    binfac  :  int or None
+        The factor by which the data should be binned. By default, every
+        light curve is binned to 10-minute cadence.
+    test   :   str
+        if not "no", open the files directly instead of downloading them
+    bitmask  :  str or int
+        the quality flags of the cadences left out of the centroid plots
+        ("default", "hard", "hardest" or a bitmask, see
+        `delicatessen.quality`)
+
+    Returns
+    -------
+    See `download_data`.
 
-    host = "mast.stsci.edu"
-    # Grab Python Version
-    version = ".".join(map(str, sys.version_info[:3]))
+    """
 
-    # Create Http Header Variables
-    headers = {
-        "Content-type": "application/x-www-form-urlencoded",
-        "Accept": "text/plain",
-        "User-agent": "python-requests/" + version,
+    def rebin(arr, new_shape):
+        shape = (
+            new_shape[0],
+            arr.shape[0] // new_shape[0],
+            new_shape[1],
+            arr.shape[1] // new_shape[1],
+        )
+        return arr.reshape(shape).mean(-1).mean(1)
+
+    # define all the empty lists to append the columns of every sector to:
+    # they are then processed all at once
+
+    columns = {
+        name: []
+        for name in [
+            "TIME",
+            "PDCSAP_FLUX",
+            "PDCSAP_FLUX_ERR",
+            "SAP_BKG",
+            "QUALITY",
+            "MOM_CENTR1",
+            "MOM_CENTR2",
+            "POS_CORR1",
+            "POS_CORR2",
+        ]
     }
+    binfacs = []
 
-    # Encoding the request as a json string
-    requestString = json.dumps(request)
-    requestString = urlencode(requestString)
+    start_sec = []
+    end_sec = []
+    in_sec = []
 
-    # opening the https connection
-    if None == proxy_uri:
-        conn = httplib.HTTPSConnection(host)
-    else:
-        port = 443
-        url = urlparse(proxy_uri)
-        conn = httplib.HTTPSConnection(url.hostname, url.port)
+    # loop through all the download links - all the data that we want to access
+    for lcfile in lcfiles:
 
-        if url.username and url.password:
-            auth = "%s:%s" % (url.username, url.password)
-            headers["Proxy-Authorization"] = "Basic " + str(
-                base64.b64encode(auth.encode())
-            ).replace("b'", "").replace("'", "")
-        conn.set_tunnel(host, port, headers)
+        # !-!-!-!-!-!-!-
+        # if this a test run, download the file already on the system
+        if test != "no" or isinstance(lcfile, bytes):
+            lchdu = FitsTable(lcfile)
+        # !-!-!-!-!-!-!-
 
-    # Making the query
-    conn.request("POST", "/api/v0/invoke", "request=" + requestString, headers)
+        else:
+            import requests
+
+            lchdu = None
+            # try the links of the sector in order, until one exists
+            links = [lcfile] if isinstance(lcfile, str) else lcfile
+            for link in links:
+                try:
+                    # use the downlload link to download the file from the
+                    # server - need an internet connection for this to work
+                    response = requests.get(link)
+                    if not response.ok:
+                        continue
+
+                    # open the downloaded file (without downloading it again)
+                    lchdu = FitsTable(response.content)
+                    break
+                except (OSError, KeyError, ValueError):
+                    # the download failed (requests' errors are OSErrors),
+                    # or the file is not a light curve
+                    continue
+            if lchdu is None:
+                continue
 
-    # Getting the response
-    resp = conn.getresponse()
-    head = resp.getheaders()
-    content = resp.read().decode("utf-8")
+        # only the columns used below are decoded from the lightcurve
+        # extension, as float32 (but the time, which needs float64, and the
+        # quality flags)
+        for name in columns:
+            if name == "TIME":
+                dtype = np.float64
+            elif name == "QUALITY":
+                dtype = None
+            else:
+                dtype = np.float32
+            columns[name].append(lchdu.column(name, dtype=dtype))
+        time = columns["TIME"][-1]
+
+        sec = int(lchdu.headers[0]["SECTOR"])  # the TESS observational sector
+
+        tessmag = lchdu.headers[0]["TESSMAG"]  # magnitude in the FITS header
+        teff = lchdu.headers[0][
+            "TEFF"
+        ]  # effective temperature in the FITS header (kelvin)
+        srad = lchdu.headers[0][
+            "RADIUS"
+        ]  # stellar radius in the FITS header (solar radii)
 
-    # Close the https connection
-    conn.close()
+        # the cadence of the light curve (days)
+        timedel = lchdu.header.get("TIMEDEL", np.nanmedian(np.diff(time)))
 
-    return head, content
+        # store the sector we are looking at
+        in_sec.append(sec)
 
+        # the binning factor of this sector
+        if binfac is None:
+            binfacs.append(products.bin_factor(timedel * 86400))
+        else:
+            binfacs.append(binfac)
+
+        start_sec.append([time[0]])
+        end_sec.append([time[-1]])
+
+    # the sector of every cadence of the concatenated columns
+    lengths = [len(time) for time in columns["TIME"]]
+    nsec = len(lengths)
+    groups = quality.sector_groups(lengths)
+    columns = {name: np.hstack(values) for name, values in columns.items()}
+
+    alltime = columns["TIME"]
+    allfbkg = columns["SAP_BKG"]  # background flux
+    allquality = columns["QUALITY"]  # quality flags (SPOC pipeline)
 
-def download_data(tic, binfac=5, test="no"):
+    # normalize by dividing by the median flux of each sector (ignore nan
+    # values), and the errors on the flux likewise
+    allflux, allflux_err = quality.divide_grouped_median(
+        columns["PDCSAP_FLUX"], groups, nsec, columns["PDCSAP_FLUX_ERR"]
+    )
+
+    # CCD column position of target’s flux-weighted centroid, and the CCD
+    # column local motion differential velocity aberration (DVA), pointing
+    # drift, and thermal effects, relative to their median in each sector
+    x1, y1, x2, y2 = [
+        quality.subtract_grouped_median(columns[name], groups, nsec)
+        for name in ["MOM_CENTR1", "MOM_CENTR2", "POS_CORR1", "POS_CORR2"]
+    ]
+
+    # the good quality data (for the centroid plots)
+    l2 = quality.good_mask(allquality, bitmask)
+    allx1 = x1[l2]
+    allx2 = x2[l2]
+    ally1 = y1[l2]
+    ally2 = y2[l2]
+    alltimel2 = alltime[l2]
+
+    # the time of the momentum dumps are indicated by the quality flag
+    mom_dump = quality.flagged(allquality, quality.MOMENTUM_DUMP)
+    all_md = alltime[mom_dump]
+
+    # binned data, in each sector
+    alltimebinned = []
+    allfluxbinned = []
+    stops = np.cumsum(lengths)
+    for start, stop, binfac_ in zip(stops - lengths, stops, binfacs):
+        n = int(np.floor((stop - start) / binfac_) * binfac_)
+        X = np.zeros((2, n))
+        X[0, :] = alltime[start : start + n]
+        X[1, :] = allflux[start : start + n]
+        Xb = rebin(X, (2, int(n / binfac_)))
 
+        alltimebinned.append(Xb[0])
+        allfluxbinned.append(Xb[1])
+    binned_lengths = [len(time) for time in alltimebinned]
+    alltimebinned = np.hstack(alltimebinned)
+    allfluxbinned = np.hstack(allfluxbinned)
+
+    # the number of rows of each sector in each group of columns
+    sec_rows = np.column_stack(
+        [
+            lengths,
+            binned_lengths,
+            quality.group_counts(groups, nsec, l2),
+            quality.group_counts(groups, nsec, mom_dump),
+        ]
+    )
+
+    return (
+        alltime,
+        allflux,
+        allflux_err,
+        all_md,
+        alltimebinned,
+        allfluxbinned,
+        allx1,
+        allx2,
+        ally1,
+        ally2,
+        alltimel2,
+        allfbkg,
+        start_sec,
+        end_sec,
+        in_sec,
+        tessmag,
+        teff,
+        srad,
+        allquality,
+        sec_rows,
+    )
+
+
+def download_data(tic, binfac=None, test="no", product="auto"):
     """
     Download the LCs for the chosen target star.
 
@@ -77,13 +349,16 @@ def download_data(tic, binfac=5, test="no"):
         path to where the data will be saved (defaul = "./LATTE_output")
     tic : str
         TIC (Tess Input Catalog) ID of the target
-    binfac  :  int
+    binfac  :  int or None
         The factor by which the data should be binned.
-        Default = 5 (which is what is shown on PHT)
+        Default: to 10-minute cadence (which is what is shown on PHT)
 
     test   :   str
         in order to test the function with unittests we want to run it
         with an input file (string to input file)
+    product  :  str
+        "20s", "2min", "ffi", or "auto" to choose the finest cadence that
+        keeps the light curves small (see `delicatessen.products`)
 
     Returns
     -------
@@ -125,271 +400,433 @@ def download_data(tic, binfac=5, test="no"):
         effective temperature of the tagret star (K)
     srad  :  float
         radius of the target star (solar radii)
+    allquality  :  array
+        quality flags (bitmask)
+    sec_rows  :  array
+        for each sector, its number of rows in alltime, alltimebinned,
+        alltimel2 and all_md (see `DATA_GROUPS`)
 
     """
 
-    # -------------------
-    # find the sectors in which the target is osberved using TESS POINT
+    # the files of all the sectors are downloaded at once (see
+    # `delicatessen.mast`)
+    lcfiles = mast.run(mast.client().lightcurve_files(tic, product))
 
-    starTics = np.array(["{}".format(tic)], dtype=np.int64)
-    ticStringList = ["{0:d}".format(x) for x in starTics]
+    return read_lightcurves(lcfiles, binfac=binfac, test=test)
 
-    # Setup mast query
-    request = {
-        "service": "Mast.Catalogs.Filtered.Tic",
-        "params": {
-            "columns": "*",
-            "filters": [{"paramName": "ID", "values": ticStringList}],
-        },
-        "format": "json",
-        "removenullcolumns": True,
-    }
 
-    headers, outString = mastQuery(request)
+def compute_periodogram(time, flux):
+    """
+    Compute the PSD periodogram of the light curve and a smoothed version.
 
-    outObject = json.loads(outString)
-    starRa = np.array([x["ra"] for x in outObject["data"]])[0]
-    starDec = np.array([x["dec"] for x in outObject["data"]])[0]
+    Returns
+    -------
+    freq, power, freq_smooth, power_smooth  :  arrays
+        frequency (micro Hz) and power spectral density, raw and smoothed
 
-    (
-        outID,
-        outEclipLong,
-        outEclipLat,
-        outSec,
-        outCam,
-        outCcd,
-        outColPix,
-        outRowPix,
-        scinfo,
-    ) = tess_stars2px_function_entry(tic, starRa, starDec)
+    """
+    pgram = periodogram.Periodogram()
+    pgram.add(0, periodogram.sector_sums(time, flux))
+    return periodogram_arrays(pgram)
 
-    # -------------------
 
-    def rebin(arr, new_shape):
-        shape = (
-            new_shape[0],
-            arr.shape[0] // new_shape[0],
-            new_shape[1],
-            arr.shape[1] // new_shape[1],
-        )
-        return arr.reshape(shape).mean(-1).mean(1)
+def periodogram_arrays(pgram):
+    """
+    The arrays returned by `compute_periodogram`, from a
+    `delicatessen.periodogram.Periodogram` (as float32, for the plots).
+    """
+    freq = pgram.frequency.astype(np.float32)
+    power = pgram.power()
+    smooth = periodogram.smooth(power, 20.0, df=pgram.df)
+    return freq, power.astype(np.float32), freq, smooth.astype(np.float32)
 
-    sector_codes = {
-        "1": ["2018206045859", "0120"],
-        "2": ["2018234235059", "0121"],
-        "3": ["2018263035959", "0123"],
-        "4": ["2018292075959", "0124"],
-        "5": ["2018319095959", "0125"],
-        "6": ["2018349182459", "0126"],
-        "7": ["2019006130736", "0131"],
-        "8": ["2019032160000", "0136"],
-        "9": ["2019058134432", "0139"],
-        "10": ["2019085135100", "0140"],
-        "11": ["2019112060037", "0143"],
-        "12": ["2019140104343", "0144"],
-        "13": ["2019169103026", "0146"],
-        "14": ["2019198215352", "0150"],
-        "15": ["2019226182529", "0151"],
-        "16": ["2019253231442", "0152"],
-        "17": ["2019279210107", "0161"],
-        "18": ["2019306063752", "0162"],
-        "19": ["2019331140908", "0164"],
-        "20": ["2019357164649", "0165"],
-        "21": ["2020020091053", "0167"],
-        "22": ["2020049080258", "0174"],
-        "23": ["2020078014623", "0177"],
-        "24": ["2020106103520", "0180"],
-        "25": ["2020133194932", "0182"],
-        "26": ["2020160202036", "0188"],
-    }
 
-    last_sector = sorted(np.array(list(sector_codes), dtype=int))[-1]
+def sample_periodogram(periodogram, max_points=PERIODOGRAM_POINTS):
+    """
+    The ``periodogram`` (a dict with the `PERIODOGRAM_KEYS`) at most
+    ``max_points`` frequencies, evenly spaced in log (it is plotted on log
+    axes): the frequencies are cut in bins of the same width in log, and
+    the highest point of the raw power in each one is kept, so that the
+    peaks are kept too.
+    """
+    power = np.asarray(periodogram["power"])
+    n = len(power)
+    if n <= max_points:
+        return periodogram
+    starts = np.unique(np.geomspace(1, n + 1, max_points).astype(int) - 1)
+    starts = starts[starts < n]
+    bins = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # The points of each bin, from the highest
+    order = np.lexsort((-np.where(np.isfinite(power), power, -np.inf), bins))
+    index = order[starts]
+    return {
+        name: np.asarray(values)[index] for name, values in periodogram.items()
+    }
 
-    # only look at the sectors that have alreadt been observed:
 
-    sectors = outSec[outSec <= last_sector]
+def fetch_lightcurves(ticid, product="auto"):
+    """
+    Download and process the light curves of the star ``ticid`` (of the
+    given ``product``), as a dict with the `DATA_KEYS`.
+    """
+    print("Fetching data for TIC ID {0}".format(ticid))
+    data = dict(
+        zip(DATA_KEYS, download_data(ticid, test="no", product=product))
+    )
+    print("... download done.")
+    return data
 
-    dwload_link = []  # list of the download lins=ks
 
-    for sector in sectors:
+def save_data(path, data, compress=False):
+    """
+    Save the ``data`` of a star (a dict with the `DATA_KEYS`) as a compact
+    light curve file (see `delicatessen.store`), with the times as float64,
+    the quality flags as a 16-bit bitmask (if they fit in it, as the TESS
+    flags do: see `delicatessen.quality`) and the other columns as float32.
+    """
+    columns, index = {}, {}
+    for group, rows in zip(DATA_GROUPS, np.asarray(data["sec_rows"]).T):
+        stops = np.cumsum(rows)
+        sectors = list(zip(data["in_sec"], stops - rows, stops))
+        for name in group:
+            values = np.asarray(data[name])
+            if name != group[0] and values.dtype.kind == "f":
+                values = values.astype(np.float32)
+            elif name == "allquality" and np.array_equal(
+                values, values.astype(np.uint16)
+            ):
+                values = values.astype(np.uint16)
+            columns[name] = values
+            index[name] = sectors
+    meta = {
+        name: np.asarray(data[name]).tolist()
+        for name in DATA_KEYS
+        if name not in columns
+    }
+    store.write(path, columns, index=index, meta=meta, compress=compress)
 
-        sector = str(sector)
 
-        download_url = (
-            "https://mast.stsci.edu/api/v0.1/Download/file/?uri=mast:TESS/product/tess"
-            + sector_codes[sector][0].rjust(13, "0")
-            + "-s"
-            + sector.rjust(4, "0")
-            + "-"
-            + str(tic).rjust(16, "0")
-            + "-"
-            + sector_codes[sector][1]
-            + "-s_lc.fits"
+def load_data(path):
+    """
+    Load the data of a star saved by `save_data`: the columns are read-only
+    views of the memory-mapped file.
+    """
+    columns, index, meta = store.read(path)
+    data = dict(meta, **columns)
+    data["sec_rows"] = np.array(data["sec_rows"], dtype=int)
+    return data
+
+
+# Cache the light curves in this format (rather than as .npz files)
+register_format("lightcurves", ".lc", save_data, load_data)
+
+
+def _sectors(data, ticid=None, product=None, out=None):
+    # The sector, first and last rows, and preprocessed light curve (see
+    # `delicatessen.detrend`) of every sector of ``data``; for a star
+    # ``ticid``, the latter are cached, so that they are shared by the plots
+    # and the periodograms, and computed once for each sector. If ``out`` (a
+    # float32 array with a row per cadence) is given, the detrended flux of
+    # every sector is written there: in place by the preprocessing, or
+    # copied from the cache
+    rows = np.asarray(data["sec_rows"])[:, 0]
+    stops = np.cumsum(rows)
+    for sector, start, stop in zip(data["in_sec"], stops - rows, stops):
+        part = None if out is None else out[start:stop]
+        compute = partial(
+            detrend.preprocess,
+            data["alltime"][start:stop],
+            data["allflux"][start:stop],
+            out=part,
         )
-
-        dwload_link.append(download_url)
-
-    # define all the empty lists to append to in order to return
-    # the data that will be requrides later on in the script
-
-    alltimebinned = []
-    allfluxbinned = []
-
-    allx1 = []
-    allx2 = []
-    ally1 = []
-    ally2 = []
-    alltimel2 = []
-    allfbkg = []
-
-    start_sec = []
-    end_sec = []
-    in_sec = []
-
-    alltime = []
-    allflux = []
-    allflux_err = []
-    all_md = []
-
-    # loop through all the download links - all the data that we want to access
-    for lcfile in dwload_link:
-
-        # !-!-!-!-!-!-!-
-        # if this a test run, download the file already on the system
-        if test != "no":
-            lchdu = pf.open(lcfile)
-        # !-!-!-!-!-!-!-
-
+        if ticid is None:
+            flux, trend = compute()
         else:
-            try:
-                # use the downlload link to download the file from the server
-                # - need an internet connection for this to work
-                response = requests.get(lcfile)
-
-                # open the file using the response url
-                lchdu = pf.open(
-                    response.url
-                )  # this needs to be a URL - not a file
-            except:
-                continue
-
-        # open and view columns in lightcurve extension
-        lcdata = lchdu[1].data
-        lchdu[1].columns
-
-        f02 = lcdata["PDCSAP_FLUX"]  # Presearch Data Conditioning
-        f02_err = lcdata["PDCSAP_FLUX_ERR"]
-        quality = lcdata[
-            "QUALITY"
-        ]  # quality flags as determined by the SPOC pipeline
-        time = lcdata["TIME"]
-        f0 = lcdata["SAP_FLUX"]  #
-        fbkg = lcdata["SAP_BKG"]  # background flux
-
-        med = np.nanmedian(
-            f02
-        )  # determine the median flux (ignore nan values)
-        f1 = f02 / med  # normalize by dividing byt the median flux
-        f1_err = f02_err / med  # normalise the errors on the flux
-
-        x1 = lcdata[
-            "MOM_CENTR1"
-        ]  # CCD column position of target’s flux-weighted centroid
-        x1 -= np.nanmedian(x1)
-        y1 = lcdata["MOM_CENTR2"]
-        y1 -= np.nanmedian(y1)
-        x2 = lcdata["POS_CORR1"]  # The CCD column local motion differential
-        # velocity aberration (DVA), pointing drift, and thermal effects.
-        x2 -= np.nanmedian(x2)
-        y2 = lcdata["POS_CORR2"]
-        y2 -= np.nanmedian(y2)
-        l = quality > 0  # good quality data
-        l2 = quality <= 0  # bad quality data
-
-        sec = int(lchdu[0].header["SECTOR"])  # the TESS observational sector
-
-        tessmag = lchdu[0].header["TESSMAG"]  # magnitude in the FITS header
-        teff = lchdu[0].header[
-            "TEFF"
-        ]  # effective temperature in the FITS header (kelvin)
-        srad = lchdu[0].header[
-            "RADIUS"
-        ]  # stellar radius in the FITS header (solar radii)
-
-        flux = lcdata["SAP_FLUX"]
-
-        lchdu.close()
-
-        # store the sector we are looking at
-        in_sec.append(sec)
+            result = RESULTS.get(
+                ("preprocessed-sector", ticid, product, int(sector)),
+                lambda: dict(zip(["flux", "trend"], compute())),
+            )
+            flux, trend = result["flux"], result["trend"]
+        if part is not None and flux is not part:
+            part[:] = flux
+        yield int(sector), start, stop, flux, trend
 
-        # binned data
-        N = len(time)
-        n = int(np.floor(N / binfac) * binfac)
-        X = np.zeros((2, n))
-        X[0, :] = time[:n]
-        X[1, :] = f1[:n]
-        Xb = rebin(X, (2, int(n / binfac)))
 
-        time_binned = Xb[0]
-        flux_binned = Xb[1]
+def preprocessed_of(data, ticid=None, product=None):
+    """
+    The light curves ``data`` detrended, without their outliers (see
+    `delicatessen.detrend`), as a dict with the `PREPROCESSED_KEYS`: the
+    detrended flux (NaN for the outliers), the trend, and the detrended flux
+    binned as ``allfluxbinned`` (float32).
+
+    For a star ``ticid``, the sectors are cached: when a new sector is
+    released, only it is preprocessed. The sectors are preprocessed in place,
+    in the detrended flux of the star (which the cache then shares).
+    """
+    rows = np.asarray(data["sec_rows"])
+    flux = np.empty(int(rows[:, 0].sum()), dtype=np.float32)
+    trends, binned = [], []
+    for (_, _, _, part, trend), nbins in zip(
+        _sectors(data, ticid, product, out=flux), rows[:, 1]
+    ):
+        trends.append(trend)
+        binned.append(detrend.bin_flux(part, nbins))
+    empty = np.zeros(0, dtype=np.float32)
+    return dict(
+        zip(
+            PREPROCESSED_KEYS,
+            [flux]
+            + [
+                np.concatenate(values).astype(np.float32) if values else empty
+                for values in [trends, binned]
+            ],
+        )
+    )
 
-        # the time of the momentum dumps are indicated by the quality flag
-        mom_dump = np.bitwise_and(quality, 2 ** 5) >= 1
 
-        # store the relevant information in the given list
-        alltime.append(list(time))
-        allflux.append(list(f1))
-        allflux_err.append(list(f1_err))
-        all_md.append(list(time[mom_dump]))
+def periodogram_of(data, ticid=None, product=None):
+    """
+    The periodogram of the light curves ``data``, as a dict with the
+    `PERIODOGRAM_KEYS`.
 
-        alltimebinned.append(list(time_binned))
-        allfluxbinned.append(list(flux_binned))
+    It is the sum of the contributions of the sectors (see
+    `delicatessen.periodogram`), computed without the outliers of the light
+    curves (but not detrended). For a star ``ticid``, those are cached: when
+    a new sector is released, only its contribution is computed.
+    """
+    pgram = periodogram.Periodogram()
+    for sector, start, stop, flux, _ in _sectors(data, ticid, product):
+        compute = partial(
+            periodogram.sector_sums,
+            data["alltime"][start:stop],
+            np.where(np.isfinite(flux), data["allflux"][start:stop], np.nan),
+        )
+        if ticid is None:
+            sums = compute()
+        else:
+            sums = RESULTS.get(
+                ("periodogram-sector", ticid, product, sector), compute
+            )
+        pgram.add(sector, sums)
+    return dict(zip(PERIODOGRAM_KEYS, periodogram_arrays(pgram)))
+
+
+def _bin_means(time, values, width):
+    # The mean time of the points in bins of ``width`` (days), and the means
+    # of the finite ``values`` (a list of columns) in them
+    index = ((time - time[0]) / width).astype(np.int64)
+    counts = np.bincount(index)
+    full = counts > 0
+    means = []
+    for v in values:
+        finite = np.isfinite(v)
+        n = np.bincount(index[finite], minlength=len(counts))[full]
+        sums = np.bincount(
+            index[finite], weights=v[finite], minlength=len(counts)
+        )[full]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means.append((sums / n).astype(np.float32))
+    return np.bincount(index, weights=time)[full] / counts[full], means
+
+
+def centroid_tracks(data, resolution=None, smoothing=CENTROID_SMOOTHING):
+    """
+    The centroid tracks of the light curves ``data`` (the good-quality
+    cadences of ``alltimel2``), as a dict with the `CENTROID_KEYS`: their
+    shared time, the centroid columns, and the same smoothed by a rolling
+    median of ``smoothing`` days (float32, but the time).
+
+    If ``resolution`` (minutes) is given, the columns are the means of the
+    cadences in bins of this duration (the time is their mean time, in
+    float32 too: its precision, about 20 seconds, is well below a bin). The
+    smoothed tracks are the rolling medians of the means in bins of at
+    least `CENTROID_SMOOTHING_BIN`, interpolated at the time of the tracks.
+    The bins and the smoothing stop at the gaps of the light curves (between
+    sectors or orbits; see `CENTROID_GAP`), so that the columns of ``data``
+    can be thinned.
+    """
+    time = np.asarray(data["alltimel2"], dtype=np.float64)
+    columns = [np.asarray(data[name]) for name in CENTROID_COLUMNS]
+    stops = np.append(np.flatnonzero(np.diff(time) > CENTROID_GAP) + 1, [0])
+    stops[-1] = len(time)
+    tracks = dict.fromkeys(CENTROID_KEYS, [])
+    parts = {name: [] for name in CENTROID_KEYS}
+    width = max(resolution or 0, CENTROID_SMOOTHING_BIN) / 1440
+    for start, stop in zip(np.append(0, stops[:-1]), stops):
+        t = time[start:stop]
+        if not len(t):
+            continue
+        values = [c[start:stop].astype(np.float32) for c in columns]
+        if resolution is not None:
+            t, values = _bin_means(t, values, resolution / 1440)
+
+        # The rolling medians of the coarser bins
+        ts, smooth = _bin_means(t, values, width)
+        window = int(smoothing / width)
+        parts["time"].append(t if resolution is None else t.astype(np.float32))
+        for name, v, vs in zip(CENTROID_COLUMNS, values, smooth):
+            vs = detrend.rolling_location(vs, window)
+            good = np.isfinite(vs)
+            if good.any():
+                vs = np.interp(t, ts[good], vs[good])
+            else:
+                vs = np.full(len(t), np.nan)
+            parts[name[3:]].append(v)
+            parts[name[3:] + "_smooth"].append(vs.astype(np.float32))
+    for name, values in parts.items():
+        if values:
+            tracks[name] = np.concatenate(values)
+    return tracks
+
+
+def tile_span(resolution):
+    """The time spanned by a tile of ``resolution`` (minutes), in days."""
+    return TILE_BINS * (resolution or 2) / 1440
+
+
+def sector_tiles(time, flux):
+    """
+    The light curve (``time``, ``flux``) of a sector at every resolution of
+    `TILE_RESOLUTIONS`, without its missing points, as a dict with the time
+    and flux (float32) at each: ``time_<name>`` and ``flux_<name>``.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float32)
+    good = np.isfinite(time) & np.isfinite(flux)
+    time, flux = time[good], flux[good]
+    tiles = {}
+    for name, resolution in TILE_RESOLUTIONS.items():
+        t, f = time, flux
+        if resolution is not None and len(t):
+            t, (f,) = _bin_means(t, [f], resolution / 1440)
+        tiles["time_" + name], tiles["flux_" + name] = t, f
+    return tiles
+
+
+def tiles_of(data, ticid=None, product=None, detrended=False):
+    """
+    The tiles of the light curves ``data``: their normalised flux, or their
+    detrended flux (see `preprocessed_of`), at every resolution of
+    `TILE_RESOLUTIONS` (see `sector_tiles`), cut in tiles of `tile_span`
+    (tile ``k`` spans ``k`` to ``k + 1`` spans from time 0).
+
+    The result is a dict with, for every resolution, the time and flux
+    (``time_<name>`` and ``flux_<name>``), the numbers of the tiles
+    (``tiles_<name>``) and their first rows, followed by the number of rows
+    (``bounds_<name>``). For a star ``ticid``, the sectors are cached: when
+    a new sector is released, only it is tiled.
+    """
+    kind = "detrended" if detrended else "normalised"
+    if detrended:
+        sectors = [
+            (sector, start, stop, flux)
+            for sector, start, stop, flux, _ in _sectors(data, ticid, product)
+        ]
+    else:
+        # One row per sector, one column per group of `DATA_GROUPS`
+        rows = np.asarray(data["sec_rows"], dtype=int)
+        rows = rows.reshape(-1, len(DATA_GROUPS))[:, 0]
+        stops = np.cumsum(rows)
+        sectors = [
+            (int(sector), start, stop, data["allflux"][start:stop])
+            for sector, start, stop in zip(data["in_sec"], stops - rows, stops)
+        ]
+
+    parts = []
+    for sector, start, stop, flux in sectors:
+        compute = partial(sector_tiles, data["alltime"][start:stop], flux)
+        if ticid is None:
+            parts.append(compute())
+        else:
+            parts.append(
+                RESULTS.get(
+                    ("tiles-sector", ticid, product, sector, kind), compute
+                )
+            )
 
-        allx1.append(list(x1[l2]))
-        allx2.append(list(x2[l2]))
-        ally1.append(list(y1[l2]))
-        ally2.append(list(y2[l2]))
-        alltimel2.append(list(time[l2]))
+    tiles = {}
+    for name, resolution in TILE_RESOLUTIONS.items():
+        time = np.concatenate(
+            [part["time_" + name] for part in parts] or [np.zeros(0)]
+        )
+        flux = np.concatenate(
+            [part["flux_" + name] for part in parts]
+            or [np.zeros(0, dtype=np.float32)]
+        )
+        if np.any(np.diff(time) < 0):
+            # Sectors that overlap (or are not in order): the tiles are cut
+            # and searched in time order
+            order = np.argsort(time, kind="stable")
+            time, flux = time[order], flux[order]
+        numbers = np.floor(time / tile_span(resolution)).astype(np.int64)
+        first = np.flatnonzero(np.diff(numbers, prepend=numbers[:1] - 1))
+        tiles["time_" + name] = time
+        tiles["flux_" + name] = flux
+        tiles["tiles_" + name] = numbers[first]
+        tiles["bounds_" + name] = np.append(first, len(time))
+    return tiles
+
+
+def visible_tiles(tiles, start, end, max_points=MAX_TILE_POINTS):
+    """
+    The resolution (a name of `TILE_RESOLUTIONS`) and the numbers of the
+    ``tiles`` (see `tiles_of`) shown for the time range from ``start`` to
+    ``end``: the tiles in the range, at the finest resolution with at most
+    ``max_points`` points in it (or the coarsest).
+    """
+    for name, resolution in TILE_RESOLUTIONS.items():
+        time = tiles["time_" + name]
+        count = np.searchsorted(time, end, side="right") - np.searchsorted(
+            time, start
+        )
+        if count <= max_points:
+            break
+    span = tile_span(resolution)
+    numbers = tiles["tiles_" + name]
+    inside = (numbers >= np.floor(start / span)) & (
+        numbers <= np.floor(end / span)
+    )
+    return name, numbers[inside]
 
-        allfbkg.append(fbkg)
 
-        start_sec.append([time[0]])
-        end_sec.append([time[-1]])
+def tile_data(tiles, name, numbers):
+    """
+    The points of the tiles ``numbers`` of ``tiles`` (see `tiles_of`) at
+    the resolution ``name``, as the columns of the light curve plot.
+    """
+    bounds = tiles["bounds_" + name]
+    index = np.searchsorted(tiles["tiles_" + name], numbers)
+    rows = [slice(bounds[i], bounds[i + 1]) for i in index]
+    return dict(
+        x=np.concatenate(
+            [tiles["time_" + name][r] for r in rows] or [np.zeros(0)]
+        ),
+        y=np.concatenate(
+            [tiles["flux_" + name][r] for r in rows]
+            or [np.zeros(0, dtype=np.float32)]
+        ),
+    )
 
-    alltime = np.hstack(alltime)
-    allflux = np.hstack(allflux)
-    allflux_err = np.hstack(allflux_err)
-    all_md = np.hstack(all_md)
-    alltimebinned = np.hstack(alltimebinned)
-    allfluxbinned = np.hstack(allfluxbinned)
-    allx1 = np.hstack(allx1)
-    allx2 = np.hstack(allx2)
-    ally1 = np.hstack(ally1)
-    ally2 = np.hstack(ally2)
-    alltimel2 = np.hstack(alltimel2)
-    allfbkg = np.hstack(allfbkg)
 
-    return (
-        alltime,
-        allflux,
-        allflux_err,
-        all_md,
-        alltimebinned,
-        allfluxbinned,
-        allx1,
-        allx2,
-        ally1,
-        ally2,
-        alltimel2,
-        allfbkg,
-        start_sec,
-        end_sec,
-        in_sec,
-        tessmag,
-        teff,
-        srad,
+def transits_of(data, ticid=None, product=None):
+    """
+    The transit search (see `delicatessen.transits.search`) in the binned
+    light curves ``data``, detrended (see `preprocessed_of`), as a dict with
+    the `TRANSIT_KEYS` (the arrays as float32, for the plots).
+    """
+    preprocessed = preprocessed_of(data, ticid, product)
+    result = transits.search(
+        np.asarray(data["alltimebinned"], dtype=np.float64),
+        preprocessed["fluxbinned"].astype(np.float64),
     )
+    return {
+        name: (
+            value.astype(np.float32)
+            if isinstance(value, np.ndarray) and name != "period_grid"
+            else value
+        )
+        for name, value in result.items()
+    }
 
 
 # - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -467,13 +904,21 @@ class DeliLATTE(BaseTool):
         # - - - Centroic Plot - - -
         # - - - - - - - - - - - - -
 
-        self.source_xcen1 = ColumnDataSource(data=dict(x_xcen1=[], y_xcen1=[]))
-
-        self.source_xcen2 = ColumnDataSource(data=dict(x_xcen2=[], y_xcen2=[]))
-
-        self.source_ycen1 = ColumnDataSource(data=dict(x_ycen1=[], y_ycen1=[]))
+        # The centroid tracks share their time (see `centroid_tracks`)
+        self.source_centroid = ColumnDataSource(
+            data=dict.fromkeys(CENTROID_KEYS, [])
+        )
 
-        self.source_ycen2 = ColumnDataSource(data=dict(x_ycen2=[], y_ycen2=[]))
+        # Their resolution
+        self.centroid_resolution = Select(
+            title="Resolution",
+            options=[
+                (name, CENTROID_RESOLUTION_NAMES[name])
+                for name in CENTROID_RESOLUTIONS
+            ],
+            value="10min",
+            width=120,
+        )
 
         self.plot_xcen = figure(
             plot_height=150,
@@ -493,45 +938,43 @@ class DeliLATTE(BaseTool):
             x_range=self.plot.x_range,
         )
 
-        self.plot_xcen.circle(
-            x="x_xcen1",
-            y="y_xcen1",
-            source=self.source_xcen1,
-            line_color=None,
-            color="red",
-            alpha=0.4,
-            size=2,
-        )
-
-        self.plot_xcen.circle(
-            x="x_xcen2",
-            y="y_xcen2",
-            source=self.source_xcen2,
-            line_color=None,
-            color="black",
-            alpha=0.3,
-            size=2,
-        )
-
-        self.plot_ycen.circle(
-            x="x_ycen1",
-            y="y_ycen1",
-            source=self.source_ycen1,
-            line_color=None,
-            color="red",
-            alpha=0.4,
-            size=2,
-        )
-
-        self.plot_ycen.circle(
-            x="x_ycen2",
-            y="y_ycen2",
-            source=self.source_ycen2,
-            line_color=None,
-            color="black",
-            alpha=0.3,
-            size=2,
-        )
+        for plot, column_1, column_2 in [
+            (self.plot_xcen, "x1", "x2"),
+            (self.plot_ycen, "y1", "y2"),
+        ]:
+            plot.circle(
+                x="time",
+                y=column_1,
+                source=self.source_centroid,
+                line_color=None,
+                color="red",
+                alpha=0.4,
+                size=2,
+            )
+            plot.circle(
+                x="time",
+                y=column_2,
+                source=self.source_centroid,
+                line_color=None,
+                color="black",
+                alpha=0.3,
+                size=2,
+            )
+            # The smoothed tracks
+            plot.line(
+                x="time",
+                y=column_1 + "_smooth",
+                source=self.source_centroid,
+                line_color="darkred",
+                line_width=1.5,
+            )
+            plot.line(
+                x="time",
+                y=column_2 + "_smooth",
+                source=self.source_centroid,
+                line_color="black",
+                line_width=1.5,
+            )
 
         # self.plot_xcen.xaxis.axis_label = "Time (BJD - 2457000)"
         self.plot_xcen.yaxis.axis_label = "x-centroid"
@@ -541,12 +984,10 @@ class DeliLATTE(BaseTool):
         # - - - Periodogram - - -
         # - - - - - - - - - - - - -
 
+        # The raw and smoothed periodograms share their frequencies (see
+        # `sample_periodogram`)
         self.source_periodgrm = ColumnDataSource(
-            data=dict(x_periodgrm=[], y_periodgrm=[])
-        )
-
-        self.source_periodgrm_smooth = ColumnDataSource(
-            data=dict(x_periodgrm_smooth=[], y_periodgrm_smooth=[])
+            data=dict(x_periodgrm=[], y_periodgrm=[], y_periodgrm_smooth=[])
         )
 
         # add an extra figure to plot an additional parameter - such as the background or the centroid shifts.
@@ -570,9 +1011,9 @@ class DeliLATTE(BaseTool):
         )
 
         self.plot_periodgrm.line(
-            x="x_periodgrm_smooth",
+            x="x_periodgrm",
             y="y_periodgrm_smooth",
-            source=self.source_periodgrm_smooth,
+            source=self.source_periodgrm,
             line_color="red",
             color="red",
             alpha=1,
@@ -583,136 +1024,602 @@ class DeliLATTE(BaseTool):
             "Power Spectral Density (A^2 mu Hz^-1)"
         )
 
+        # - - - Transit Search - -
+        # - - - - - - - - - - - - -
+
+        self.source_bls = ColumnDataSource(data=dict(x_bls=[], y_bls=[]))
+
+        self.source_folded = ColumnDataSource(
+            data=dict(x_folded=[], y_folded=[])
+        )
+
+        self.source_folded_binned = ColumnDataSource(
+            data=dict(x_folded_binned=[], y_folded_binned=[])
+        )
+
+        self.plot_bls = figure(
+            plot_height=150,
+            min_width=600,
+            min_height=150,
+            title="",
+            sizing_mode="stretch_both",
+            x_axis_type="log",
+        )
+
+        self.plot_bls.line(
+            x="x_bls",
+            y="y_bls",
+            source=self.source_bls,
+            line_color="black",
+            alpha=1,
+        )
+
+        self.plot_folded = figure(
+            plot_height=150,
+            min_width=600,
+            min_height=150,
+            title="",
+            sizing_mode="stretch_both",
+        )
+
+        self.plot_folded.circle(
+            x="x_folded",
+            y="y_folded",
+            source=self.source_folded,
+            line_color=None,
+            color="darkorange",
+            alpha=0.5,
+            size=2,
+        )
+
+        self.plot_folded.circle(
+            x="x_folded_binned",
+            y="y_folded_binned",
+            source=self.source_folded_binned,
+            line_color=None,
+            color="black",
+            alpha=0.8,
+            size=4,
+        )
+
+        self.plot_bls.xaxis.axis_label = "Period (days)"
+        self.plot_bls.yaxis.axis_label = "BLS Power"
+        self.plot_folded.xaxis.axis_label = "Time from Mid-transit (hours)"
+        self.plot_folded.yaxis.axis_label = "Normalised Flux"
+
         # -    -    -    -    -
 
-        # Register the callback
-        self.parent.primary.source.selected.on_change("indices", self.callback)
+        panels = [None, None, None, None]
 
-        # Run it
-        self.callback(None, None, None)
+        # Main panel: data
+        panels[0] = Panel(child=self.plot_bkg, title="Background Flux")
 
-    def callback(self, attr, old, new):
-        """
-        Triggered when the user selects a point on the main plot.
-        """
-        # If a point is selected...
-        if len(self.parent.primary.source.selected.indices):
+        # Secondary panel: appearance
+        panels[1] = Panel(
+            child=column(
+                self.centroid_resolution,
+                self.plot_xcen,
+                self.plot_ycen,
+                sizing_mode="stretch_width",
+            ),
+            title="Centroid Position",
+        )
 
-            # Get the TIC ID
-            ticid = self.parent.primary.source.data["ticid"][
-                self.parent.primary.source.selected.indices[0]
-            ]
-            print("Fetching data for TIC ID {0}".format(ticid))
+        panels[2] = Panel(child=self.plot_periodgrm, title="Periodogram")
 
-            (
-                alltime,
-                allflux,
-                allflux_err,
-                all_md,
-                alltimebinned,
-                allfluxbinned,
-                allx1,
-                allx2,
-                ally1,
-                ally2,
-                alltimel2,
-                allfbkg,
-                start_sec,
-                end_sec,
-                in_sec,
-                tessmag,
-                teff,
-                srad,
-            ) = download_data(ticid, binfac=5, test="no")
-
-            print("... download done.")
-
-            self.source.data = dict(x=alltime, y=allflux)
-
-            self.source_binned.data = dict(
-                x_binned=alltimebinned, y_binned=allfluxbinned
-            )
+        panels[3] = Panel(
+            child=column(
+                self.plot_bls, self.plot_folded, sizing_mode="stretch_width"
+            ),
+            title="Transit Search",
+        )
+
+        # panels[1] = Panel(child=self.checkbox_group, title="appearance",)
 
-            # - - - Backgrounds - - - -
-            # - - - - - - - - - - - - -
-            self.source_bkg.data = dict(x_bkg=alltime, y_bkg=allfbkg)
+        # Only the plots of the visible tab hold data (see `show`)
+        self.tabs = Tabs(tabs=panels, css_classes=["deli-tabs"])
 
-            # - - - Centroic Plot - - -
-            # - - - - - - - - - - - - -
+        # The light curve product: by default, the finest cadence that keeps
+        # the download and the plots small (see `delicatessen.products`)
+        self.product = Select(
+            title="Cadence",
+            options=list(products.PRODUCTS.items()),
+            value="auto",
+            width=120,
+        )
 
-            self.source_xcen1.data = dict(x_xcen1=alltimel2, y_xcen1=allx1)
-            self.source_xcen2.data = dict(x_xcen2=alltimel2, y_xcen2=allx2)
+        # The flux shown: normalised, or detrended without its outliers (see
+        # `delicatessen.detrend`)
+        self.flux = Select(
+            title="Flux",
+            options=[
+                ("normalised", "Normalised"),
+                ("detrended", "Detrended"),
+            ],
+            value="normalised",
+            width=120,
+        )
 
-            # -   -   -   -   -   -   -
-            self.source_ycen1.data = dict(x_ycen1=alltimel2, y_ycen1=ally1)
-            self.source_ycen2.data = dict(x_ycen2=alltimel2, y_ycen2=ally2)
+        # The results (light curves, periodograms and transit searches) of the
+        # stars looked at in this session, least recently used first; the
+        # oldest are dropped to keep within the budget
+        self.results = LRUCache(parent.memory_budget)
+
+        # The selected star, or the stars shown stacked when several are
+        # selected (the selection is followed while the tool is active)
+        self.ticid = None
+        self.stacked = None
+
+        # The tabs whose plots show the star (the others are filled when the
+        # user switches to them)
+        self.tabs_shown = set()
+
+        # The tiles of the light curve of the star (see `tiles_of`), and the
+        # resolution and numbers of those in the plot: the plot holds the
+        # tiles of the visible time range only (see `update_tiles`)
+        self.tiles = None
+        self.tile_resolution = None
+        self.tiles_shown = []
+        self._tiles_pending = False
+
+        # Whether the light curve is shown by tiles; if not (e.g., in a
+        # static snapshot, where nothing follows the time range), all its
+        # points are shown
+        self.tiled = True
+
+        self.selection = SelectionManager(
+            parent.doc, parent.primary.source, self.select
+        )
 
-            # - - - Periodogram - - - -
-            # - - - - - - - - - - - - -
-            finite_mask = np.isfinite(alltime) & np.isfinite(allflux)
+        # Register the callbacks
+        self.tabs.on_change("active", self.tab_callback)
+        self.product.on_change("value", self.product_callback)
+        self.flux.on_change("value", self.flux_callback)
+        self.centroid_resolution.on_change("value", self.resolution_callback)
+        self.plot.x_range.on_change("start", self.range_callback)
+        self.plot.x_range.on_change("end", self.range_callback)
 
-            lc = lk.lightcurve.LightCurve(
-                time=alltime[finite_mask], flux=allflux[finite_mask]
-            )
+    def activate(self):
+        # Follow the selection, starting with the current one
+        self.selection.attach()
 
-            lc = lc.remove_outliers().remove_nans()
-            ls = lc.to_periodogram(normalization="psd")
+    def deactivate(self):
+        self.selection.detach()
+        self.ticid = self.stacked = None
+        self.show(None, None, None)
 
-            smooth = ls.smooth(method="boxkernel", filter_width=20.0)
+    def select(self, ticids):
+        """
+        Triggered when the user selects stars on the main plot (see
+        `delicatessen.selection`): show the light curves of a single star, or
+        those of several stars stacked.
+        """
+        self.ticid = ticids[0] if len(ticids) == 1 else None
+        self.stacked = ticids if len(ticids) > 1 else None
+        self.fetch_lightcurves()
 
-            freq = ls.frequency
-            power = ls.power
+    def tab_callback(self, attr, old, new):
+        """
+        Triggered when the user switches tabs: fill the plots of the new tab,
+        unless they already show the star.
+        """
+        if self.ticid is not None and new not in self.tabs_shown:
+            self.fetch_data(partial(self.show_tab, new))
 
-            freq_smooth = smooth.frequency
-            power_smooth = smooth.power
+    def product_callback(self, attr, old, new):
+        """
+        Triggered when the user switches cadence.
+        """
+        if self.ticid is not None or self.stacked:
+            self.fetch_lightcurves()
 
-            self.source_periodgrm.data = dict(
-                x_periodgrm=freq, y_periodgrm=power
+    def flux_callback(self, attr, old, new):
+        """
+        Triggered when the user switches between the normalised and detrended
+        flux: only the light curve plot changes.
+        """
+        if self.ticid is not None:
+            self.fetch_data(self.show_lightcurve)
+
+    def resolution_callback(self, attr, old, new):
+        """
+        Triggered when the user changes the resolution of the centroid tracks.
+        """
+        if self.ticid is not None and 1 in self.tabs_shown:
+            self.fetch_data(partial(self.show_tab, 1))
+
+    def range_callback(self, attr, old, new):
+        """
+        Triggered when the user pans or zooms the light curve plot: show the
+        tiles of the new time range, at most every `TILE_DELAY`.
+        """
+        doc = self.parent.doc
+        if doc.session_context is None:
+            self.update_tiles()
+        elif not self._tiles_pending:
+            self._tiles_pending = True
+            doc.add_timeout_callback(self._tiles_due, TILE_DELAY)
+
+    def _tiles_due(self):
+        self._tiles_pending = False
+        self.update_tiles()
+
+    def fetch_lightcurves(self):
+        """
+        Show the light curves of the selected star(s), in the selected
+        product.
+        """
+        ticid, product = self.ticid, self.product.value
+        if self.stacked:
+            self.fetch_stacked()
+        elif ticid is None:
+            self.show(None, None, None)
+        else:
+            self.fetch(
+                ("lightcurves", ticid, product),
+                partial(fetch_lightcurves, ticid, product),
+                partial(self.show, ticid, product),
             )
 
-            self.source_periodgrm_smooth.data = dict(
-                x_periodgrm_smooth=freq_smooth, y_periodgrm_smooth=power_smooth
+    def fetch_data(self, then):
+        """
+        Pass the light curves of the selected star, in the selected product,
+        to ``then(ticid, product, data)``.
+        """
+        ticid, product = self.ticid, self.product.value
+        self.fetch(
+            ("lightcurves", ticid, product),
+            partial(fetch_lightcurves, ticid, product),
+            partial(then, ticid, product),
+        )
+
+    def fetch_stacked(self):
+        """
+        Show the binned light curves of the selected stars (the first
+        `MAX_STACKED`) one above the other, each streamed to the plot as soon
+        as it is fetched.
+        """
+        ticids, product = self.stacked, self.product.value
+        self.show(None, None, None)
+        self.plot.title.text = "{0} stars{1}".format(
+            len(ticids),
+            (
+                ""
+                if len(ticids) <= MAX_STACKED
+                else " (the first {0} shown)".format(MAX_STACKED)
+            ),
+        )
+        self.plot.yaxis.axis_label = "Scaled Flux (one star per row)"
+        for position, ticid in enumerate(ticids[:MAX_STACKED]):
+            self.fetch(
+                ("lightcurves", ticid, product),
+                partial(fetch_lightcurves, ticid, product),
+                partial(self.show_stacked, ticids, product, position),
             )
 
+    def show_stacked(self, ticids, product, position, data):
+        """
+        Add the binned light curve ``data`` of one of the stacked stars
+        ``ticids`` to the plot, in the row ``position``: scaled to the height of a row
+        (between its 5th and 95th percentiles) and shifted down.
+        """
+        if ticids != self.stacked or product != self.product.value:
+            # The user has selected other stars in the meantime
+            return
+        flux = np.asarray(data["allfluxbinned"], dtype=np.float64)
+        finite = flux[np.isfinite(flux)]
+        if len(finite):
+            low, median, high = np.percentile(finite, [5, 50, 95])
+            flux = 0.8 * (flux - median) / max(high - low, 1e-6) - position
+        self.source_binned.stream(
+            dict(x_binned=data["alltimebinned"], y_binned=flux)
+        )
+
+    def fetch(self, key, compute, then):
+        """
+        Get the result ``key`` and pass it to ``then``.
+
+        Results are shared by all sessions (see `delicatessen.cache`): if
+        the result is not cached, it is computed with ``compute()`` in a
+        worker thread, or awaited if another session is already computing it.
+        ``then`` is called from the session's thread once it is ready, so the
+        server keeps serving other users in the meantime. Outside of a server
+        (e.g., in scripts), this waits for the result.
+        """
+        result = self.results.get(key)
+        if result is not None:
+            then(result)
+            return
+
+        future = RESULTS.submit(key, compute)
+        doc = self.parent.doc
+        if future.done() or doc.session_context is None:
+            self._fetched(key, then, future)
         else:
-            # Clear the plot
-            self.source.data = dict(x=[], y=[])
-            self.source_binned.data = dict(x_binned=[], y_binned=[])
-            # - - -
-            self.source_bkg.data = dict(x_bkg=[], y_bkg=[])
-            # - - -
-            self.source_xcen1.data = dict(x_xcen1=[], y_xcen1=[])
-            self.source_xcen2.data = dict(x_xcen2=[], y_xcen2=[])
-            self.source_ycen1.data = dict(x_ycen1=[], y_ycen1=[])
-            self.source_ycen2.data = dict(x_ycen2=[], y_ycen2=[])
-
-            self.source_periodgrm.data = dict(x_periodgrm=[], y_periodgrm=[])
-            self.source_periodgrm_smooth.data = dict(
-                x_periodgrm_smooth=[], y_periodgrm_smooth=[]
+            future.add_done_callback(
+                lambda future: doc.add_next_tick_callback(
+                    partial(self._fetched, key, then, future)
+                )
             )
 
-            # self.plot.xaxis.axis_label = 'Time (BJD - 2457000)'
-            # self.plot.yaxis.axis_label = 'Normalised Flux'
+    def _fetched(self, key, then, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            print("Failed to get {0}: {1!r}".format(key, e))
+            return
+        self.results.put(key, result)
+        then(result)
 
-    def layout(self):
+    def show(self, ticid, product, data, tabs=None):
+        """
+        Show the ``data`` of the star ``ticid`` (of the given ``product``) in
+        the light curve plot and in the visible tab (or in ``tabs``, a list of
+        tab indices), and empty the plots of the other tabs: they are filled
+        when the user switches to them (see `tab_callback`). If ``data`` is
+        None, clear all the plots.
+        """
+        if not self.selected(ticid, product):
+            # The user has selected another star in the meantime
+            return
+
+        self.plot.title.text = ""
+        if data is None:
+            data, tabs = dict.fromkeys(DATA_KEYS, []), []
+        elif tabs is None:
+            tabs = [self.tabs.active]
+
+        self.show_lightcurve(ticid, product, data)
+        self.tabs_shown = set()
+        for tab in range(len(self.tabs.tabs)):
+            self.show_tab(tab, ticid, product, data if tab in tabs else None)
+
+    def show_lightcurve(self, ticid, product, data):
+        """
+        Show the light curve ``data`` of the star ``ticid`` in the light curve
+        plot, with the flux selected in the Flux menu.
+        """
+        if not self.selected(ticid, product):
+            return
+        sectors = "_".join(str(int(s)) for s in data["in_sec"])
+        if self.flux.value == "detrended" and ticid is not None:
+            # The detrended light curve, once the sectors are preprocessed
+            self.show_flux(ticid, product, data, None)
+            self.fetch(
+                ("preprocessed", ticid, product, sectors),
+                partial(preprocessed_of, data, ticid, product),
+                partial(self.show_flux, ticid, product, data),
+            )
+        else:
+            self.show_flux(ticid, product, data, data)
 
-        panels = [None, None, None]
+    def show_tab(self, tab, ticid, product, data):
+        """
+        Show the ``data`` of the star ``ticid`` in the plots of the tab
+        ``tab`` (its index), or empty them if ``data`` is None.
+        """
+        if not self.selected(ticid, product):
+            return
+        if data is not None:
+            self.tabs_shown.add(tab)
+            sectors = "_".join(str(int(s)) for s in data["in_sec"])
 
-        # Main panel: data
-        panels[0] = Panel(child=self.plot_bkg, title="Background Flux")
+        # - - - Backgrounds - - - -
+        # - - - - - - - - - - - - -
+        if tab == 0:
+            columns = data or dict.fromkeys(DATA_KEYS, [])
+            self.source_bkg.data = dict(
+                x_bkg=columns["alltime"], y_bkg=columns["allfbkg"]
+            )
 
-        # Secondary panel: appearance
-        panels[1] = Panel(
-            child=column(
-                self.plot_xcen, self.plot_ycen, sizing_mode="stretch_width"
-            ),
-            title="Centroid Position",
+        # - - - Centroic Plot - - -
+        # - - - - - - - - - - - - -
+        elif tab == 1:
+            if data is not None:
+                self.source_centroid.data = centroid_tracks(
+                    data, CENTROID_RESOLUTIONS[self.centroid_resolution.value]
+                )
+            else:
+                self.source_centroid.data = dict.fromkeys(CENTROID_KEYS, [])
+
+        # - - - Periodogram - - - -
+        # - - - - - - - - - - - - -
+        elif tab == 2:
+            self.show_periodogram(ticid, product, None)
+            if data is not None:
+                # The periodogram of these sectors (it is extended when the
+                # light curves of a new sector are added)
+                self.fetch(
+                    ("periodogram", ticid, product, sectors),
+                    partial(periodogram_of, data, ticid, product),
+                    partial(self.show_periodogram, ticid, product),
+                )
+
+        # - - - Transit Search - - -
+        # - - - - - - - - - - - - -
+        elif tab == 3:
+            self.show_transits(ticid, product, None)
+            if data is not None:
+                # The search is slow: it runs in a worker thread, and its
+                # result is shared and kept with those of the other stars
+                self.fetch(
+                    ("transits", ticid, product, sectors),
+                    partial(transits_of, data, ticid, product),
+                    partial(self.show_transits, ticid, product),
+                )
+
+    def show_flux(self, ticid, product, data, flux):
+        """
+        Show the light curve of the star ``ticid`` in the main plot: the
+        times of ``data``, with the normalised flux of ``data`` or the
+        detrended flux of ``flux`` (see `preprocessed_of`), or no points if
+        ``flux`` is None.
+        """
+        if not self.selected(ticid, product):
+            return
+        detrended = flux is not data
+        if flux is None:
+            time = time_binned = y = y_binned = []
+        else:
+            time, time_binned = data["alltime"], data["alltimebinned"]
+            y = flux["flux" if detrended else "allflux"]
+            y_binned = flux["fluxbinned" if detrended else "allfluxbinned"]
+        self.plot.yaxis.axis_label = (
+            "Detrended Flux" if detrended else "Normalised Flux"
         )
+        self.source_binned.data = dict(x_binned=time_binned, y_binned=y_binned)
+        if not self.tiled:
+            self.source.data = dict(x=time, y=y)
+            return
+
+        # The points of every cadence, by tiles of the visible time range;
+        # the plot is emptied only while they are computed (Bokeh would send
+        # the data of the plot for both changes)
+        self.tiles = None
+        if flux is not None and ticid is not None:
+            sectors = "_".join(str(int(s)) for s in data["in_sec"])
+            self.fetch(
+                (
+                    "tiles",
+                    ticid,
+                    product,
+                    sectors,
+                    "detrended" if detrended else "normalised",
+                ),
+                partial(tiles_of, data, ticid, product, detrended),
+                partial(self.show_tiles, ticid, product, detrended),
+            )
+        if self.tiles is None:
+            self.show_tiles(ticid, product, detrended, None)
 
-        panels[2] = Panel(child=self.plot_periodgrm, title="Periodogram")
+    def show_tiles(self, ticid, product, detrended, tiles):
+        """
+        Show the ``tiles`` of the light curve of the star ``ticid`` (see
+        `tiles_of`) in the main plot, or no points if ``tiles`` is None.
+        """
+        if not self.selected(ticid, product):
+            return
+        if tiles is not None and detrended != (self.flux.value == "detrended"):
+            # The user has chosen the other flux in the meantime
+            return
+        self.tiles = tiles
+        self.tile_resolution, self.tiles_shown = None, []
+        if tiles is None:
+            self.source.data = dict(x=[], y=[])
+        else:
+            self.update_tiles()
 
-        # panels[1] = Panel(child=self.checkbox_group, title="appearance",)
+    def update_tiles(self):
+        """
+        Show the tiles of the light curve in the visible time range, at the
+        finest resolution that keeps them under `MAX_TILE_POINTS` (see
+        `visible_tiles`). The new tiles are streamed to the plot; the tiles
+        out of view are dropped when the resolution changes, or when the
+        plot would hold more than `TILE_CAPACITY` points.
+        """
+        if self.tiles is None:
+            return
+        time = self.tiles["time_full"]
+        if not len(time):
+            self.source.data = dict(x=[], y=[])
+            return
+        start, end = self.plot.x_range.start, self.plot.x_range.end
+        first, last = time[0], time[-1]
+        if start is None or end is None or end < first or start > last:
+            # The time range is not known yet, or is that of another star
+            start, end = first, last
+
+        name, numbers = visible_tiles(self.tiles, start, end)
+        if name == self.tile_resolution:
+            shown = set(self.tiles_shown)
+            new = [number for number in numbers if number not in shown]
+            if not new:
+                return
+            points = tile_data(self.tiles, name, new)
+            if len(self.source.data["x"]) + len(points["x"]) <= TILE_CAPACITY:
+                # Bokeh checks every point of the plot after a stream, in
+                # Python: the new points are ours
+                with validate(False):
+                    self.source.stream(points)
+                self.tiles_shown += new
+                return
+
+        # The tiles of the time range only, the others dropped
+        self.source.data = tile_data(self.tiles, name, numbers)
+        self.tile_resolution, self.tiles_shown = name, list(numbers)
+
+    def show_periodogram(self, ticid, product, periodogram):
+        """
+        Show the ``periodogram`` of the star ``ticid`` (sampled at
+        `PERIODOGRAM_POINTS` frequencies at most, see `sample_periodogram`),
+        or clear the plot if it is None.
+        """
+        if not self.selected(ticid, product):
+            return
+        if periodogram is None:
+            periodogram = dict.fromkeys(PERIODOGRAM_KEYS, [])
+        periodogram = sample_periodogram(periodogram)
+
+        self.source_periodgrm.data = dict(
+            x_periodgrm=periodogram["freq"],
+            y_periodgrm=periodogram["power"],
+            y_periodgrm_smooth=periodogram["power_smooth"],
+        )
+
+    def show_transits(self, ticid, product, result):
+        """
+        Show the transit search ``result`` of the star ``ticid`` (its BLS
+        periodogram and its light curve folded at the best period), or clear
+        the plots if it is None.
+        """
+        if not self.selected(ticid, product):
+            return
+        if result is None:
+            result = dict.fromkeys(TRANSIT_KEYS, [])
+            self.plot_folded.title.text = ""
+        elif np.isfinite(result["period"]):
+            self.plot_folded.title.text = (
+                "P = {0:.5f} d, T0 = {1:.4f}, duration = {2:.1f} h, "
+                "depth = {3:.0f} ppm, SNR = {4:.1f}".format(
+                    result["period"],
+                    result["t0"],
+                    24 * result["duration"],
+                    1e6 * result["depth"],
+                    result["snr"],
+                )
+            )
+        else:
+            self.plot_folded.title.text = "No transit found"
 
-        tabs = Tabs(tabs=panels, css_classes=["deli-tabs"])
+        self.source_bls.data = dict(
+            x_bls=result["period_grid"], y_bls=result["power"]
+        )
+        self.source_folded.data = dict(
+            x_folded=24 * np.asarray(result["phase"]), y_folded=result["flux"]
+        )
+        self.source_folded_binned.data = dict(
+            x_folded_binned=24 * np.asarray(result["phase_binned"]),
+            y_folded_binned=result["flux_binned"],
+        )
 
-        return column(self.plot, tabs, sizing_mode="stretch_width")
+    def selected(self, ticid, product):
+        """Whether the star ``ticid`` is shown in ``product``."""
+        if ticid is None:
+            return self.ticid is None
+        return ticid == self.ticid and product == self.product.value
+
+    def release(self):
+        self.results.clear()
+        self.tiles = None
+
+    @property
+    def nbytes(self):
+        return self.results.nbytes
+
+    def layout(self):
+        return column(
+            row(self.product, self.flux),
+            self.plot,
+            self.tabs,
+            sizing_mode="stretch_width",
+        )
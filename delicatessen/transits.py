@@ -0,0 +1,312 @@
+"""
+Transit search in multi-sector light curves: a box least squares (BLS)
+periodogram, vectorized over periods and durations.
+
+For a batch of trial periods, the light curve is folded at all of them at
+once, and summed in phase bins of the same width (one `numpy.bincount` for
+the whole batch); the sums over boxes of every trial duration are then
+differences of the cumulative sums of these bins. The periods are searched
+coarse-to-fine: on a coarse grid first, with the light curve binned to
+`COARSE_BIN` and a number of periods capped to `MAX_COARSE_PERIODS`, then on
+finer and finer grids around the best coarse peaks, with the light curve
+given.
+
+"""
+
+# Third-party
+import numpy as np
+
+# The transit durations searched (days): 1 to 8 hours
+DURATIONS = np.array([1, 1.5, 2, 3, 4, 6, 8]) / 24
+
+# The shortest period searched (days)
+MIN_PERIOD = 0.5
+
+# The bin size of the light curve in the coarse search (days)
+COARSE_BIN = 30 / 1440
+
+# The largest number of periods of the coarse grid, and the number of coarse
+# peaks refined
+MAX_COARSE_PERIODS = 10000
+NREFINE = 5
+
+# The number of periods of each grid of the fine search, on either side of
+# the best period of the previous grid
+REFINE_STEPS = 20
+
+# The number of phase bins per (shortest) duration
+BINS_PER_DURATION = 3
+
+# The number of values folded at once (the size of a batch of periods)
+BATCH_SIZE = 2**21
+
+# The keys of the result of `search`
+RESULT_KEYS = [
+    "period_grid",
+    "power",
+    "period",
+    "t0",
+    "duration",
+    "depth",
+    "snr",
+    "phase",
+    "flux",
+    "phase_binned",
+    "flux_binned",
+]
+
+
+def bin_lightcurve(time, flux, width):
+    """The mean of the finite values of ``flux`` in bins of ``width``."""
+    good = np.isfinite(time) & np.isfinite(flux)
+    time, flux = time[good], flux[good]
+    if not len(time):
+        return time, flux
+    index = ((time - time.min()) / width).astype(np.int64)
+    counts = np.bincount(index)
+    full = counts > 0
+    return (
+        np.bincount(index, weights=time)[full] / counts[full],
+        np.bincount(index, weights=flux)[full] / counts[full],
+    )
+
+
+def frequency_grid(baseline, duration, oversample, min_period, max_period):
+    """
+    Trial frequencies (1/day), evenly spaced so that a transit of
+    ``duration`` drifts by at most ``duration / oversample`` across the
+    ``baseline``.
+    """
+    df = duration / (oversample * baseline**2)
+    return np.arange(1 / max_period, 1 / min_period, df)
+
+
+def bls(time, flux, periods, durations=DURATIONS):
+    """
+    The BLS periodogram of the light curve at the trial ``periods``.
+
+    Returns
+    -------
+    power  :  array
+        the improvement of the chi-square of a box-shaped dip over a
+        constant, at the best duration and phase of every period (in units
+        of the variance of the flux; only dips count)
+    duration, t0, depth  :  arrays
+        the duration, mid-transit time and depth of the best box of every
+        period
+
+    """
+    y = flux - flux.mean()
+    n = len(y)
+    variance = y.var() if n > 1 else 1.0
+    periods = np.asarray(periods, dtype=np.float64)
+    power = np.zeros(len(periods))
+    best_duration = np.zeros(len(periods))
+    t0 = np.zeros(len(periods))
+    depth = np.zeros(len(periods))
+    if n < 3 or not len(periods):
+        return power, best_duration, t0, depth
+
+    # The phases are folded from the first point, in single precision
+    # (enough for the phase bins of the shortest duration)
+    start_time = time.min()
+    time = (time - start_time).astype(np.float32)
+    y = y.astype(np.float32)
+    step = max(1, BATCH_SIZE // n)
+    for start in range(0, len(periods), step):
+        batch = periods[start : start + step]
+        m = len(batch)
+        rows = np.arange(m)
+
+        # Phase bins of the same width (days) at all the periods, so that a
+        # box of a given duration spans the same number of bins
+        width = max(
+            durations.min() / BINS_PER_DURATION,
+            batch.max() / max(2, BATCH_SIZE // m),
+        )
+        nbins_period = np.ceil(batch / width).astype(np.int64)
+        nbins = int(nbins_period.max())
+        boxes = np.maximum(np.round(durations / width).astype(np.int64), 1)
+
+        # Fold at all the periods of the batch at once: the sums of the
+        # flux and the numbers of points in the phase bins of every period
+        phase = np.multiply.outer((1 / batch).astype(np.float32), time)
+        phase -= np.floor(phase)
+        phase *= (batch / width).astype(np.float32)[:, None]
+        index = phase.astype(np.int64)
+        np.minimum(index, (nbins_period - 1)[:, None], out=index)
+        index += (nbins * rows)[:, None]
+        index = index.ravel()
+        sums = np.bincount(
+            index,
+            weights=np.broadcast_to(y, (m, n)).ravel(),
+            minlength=m * nbins,
+        ).reshape(m, nbins)
+        counts = np.bincount(index, minlength=m * nbins).reshape(m, nbins)
+
+        # Cumulative sums over the bins of every period, wrapped around (by
+        # the longest box) so that boxes can straddle phase 0
+        wrapped = np.arange(nbins + boxes.max()) % nbins_period[:, None]
+        zeros = np.zeros((m, 1))
+        sums = np.take_along_axis(sums, wrapped, 1).cumsum(axis=1)
+        counts = np.take_along_axis(counts, wrapped, 1).cumsum(axis=1)
+        sums = np.concatenate([zeros, sums], axis=1)
+        counts = np.concatenate([zeros, counts], axis=1)
+
+        for duration, box in zip(durations, boxes):
+            # The sums over the boxes starting at every bin
+            s = sums[:, box : box + nbins] - sums[:, :nbins]
+            r = counts[:, box : box + nbins] - counts[:, :nbins]
+            # Dips only: the flux in the box is below the mean
+            np.minimum(s, 0, out=s)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                chi2 = s * s / (r * (n - r))
+            chi2[~np.isfinite(chi2)] = 0
+            i = chi2.argmax(axis=1)
+            chi2 = chi2[rows, i] * n / variance
+            better = (chi2 > power[start : start + m]) & (box < nbins_period)
+            s, r = s[rows, i], r[rows, i]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                d = -s * n / (r * (n - r))
+            center = ((i + 0.5 * box) * width) % batch + start_time
+            power[start : start + m] = np.where(
+                better, chi2, power[start : start + m]
+            )
+            best_duration[start : start + m] = np.where(
+                better, duration, best_duration[start : start + m]
+            )
+            t0[start : start + m] = np.where(
+                better, center, t0[start : start + m]
+            )
+            depth[start : start + m] = np.where(
+                better, d, depth[start : start + m]
+            )
+    return power, best_duration, t0, depth
+
+
+def _peaks(power, count):
+    # The indices of the ``count`` highest local maxima of ``power``
+    peak = np.zeros(len(power), dtype=bool)
+    peak[1:-1] = (power[1:-1] > power[:-2]) & (power[1:-1] >= power[2:])
+    index = np.flatnonzero(peak)
+    return index[np.argsort(power[index])[::-1][:count]]
+
+
+def fold(time, flux, period, t0, nbins=200):
+    """
+    The light curve folded at ``period``: the time from the nearest transit
+    (days) and the flux, sorted, and their means in ``nbins`` phase bins.
+    """
+    phase = (time - t0 + 0.5 * period) % period - 0.5 * period
+    order = np.argsort(phase)
+    phase, flux = phase[order], flux[order]
+    index = np.minimum(
+        ((phase / period + 0.5) * nbins).astype(np.int64), nbins - 1
+    )
+    counts = np.bincount(index, minlength=nbins)
+    full = counts > 0
+    return (
+        phase,
+        flux,
+        np.bincount(index, weights=phase, minlength=nbins)[full]
+        / counts[full],
+        np.bincount(index, weights=flux, minlength=nbins)[full] / counts[full],
+    )
+
+
+def search(
+    time,
+    flux,
+    min_period=MIN_PERIOD,
+    max_period=None,
+    durations=DURATIONS,
+):
+    """
+    Search the light curve for periodic transits.
+
+    Parameters
+    ----------
+    time, flux  :  arrays
+        the light curve (e.g., binned to 10 minutes)
+    min_period, max_period  :  float
+        the range of periods searched (days; by default up to half the
+        baseline, so that two transits are seen)
+    durations  :  array
+        the transit durations searched (days)
+
+    Returns
+    -------
+    dict with the `RESULT_KEYS`: the coarse BLS periodogram (``period_grid``
+    and ``power``), the best period, mid-transit time, duration, depth and
+    its signal-to-noise ratio, and the light curve folded at the best period
+    (``phase`` in days from mid-transit, and ``flux``), also binned in phase
+
+    """
+    good = np.isfinite(time) & np.isfinite(flux)
+    time = np.asarray(time[good], dtype=np.float64)
+    flux = np.asarray(flux[good], dtype=np.float64)
+    empty = np.zeros(0)
+    result = dict.fromkeys(RESULT_KEYS[2:7], np.nan)
+    result.update(period_grid=empty, power=empty)
+    result.update(phase=empty, flux=empty, phase_binned=empty)
+    result.update(flux_binned=empty)
+    if len(time) < 10:
+        return result
+
+    baseline = time.max() - time.min()
+    if max_period is None:
+        max_period = 0.5 * baseline
+    if max_period <= min_period:
+        return result
+
+    # Coarse: the binned light curve, and at most MAX_COARSE_PERIODS
+    tc, fc = bin_lightcurve(time, flux, COARSE_BIN)
+    frequency = frequency_grid(
+        baseline, np.median(durations), 1, min_period, max_period
+    )
+    if len(frequency) > MAX_COARSE_PERIODS:
+        frequency = np.linspace(
+            frequency[0], frequency[-1], MAX_COARSE_PERIODS
+        )
+    coarse = 1 / frequency[::-1]
+    power = bls(tc, fc, coarse, durations)[0]
+
+    # Fine: around the best coarse peaks, with the full light curve, on
+    # grids narrowed down by REFINE_STEPS at a time until the resolution
+    # of the shortest duration
+    df = frequency[1] - frequency[0] if len(frequency) > 1 else 0
+    fine_df = durations.min() / (3 * baseline**2)
+    best = None
+    for i in _peaks(power, NREFINE):
+        f, window, peak = 1 / coarse[i], df, None
+        while window > 0:
+            step = max(window / REFINE_STEPS, fine_df)
+            fine = np.arange(f - window, f + window + step, step)
+            fine = fine[(fine > 1 / max_period) & (fine < 1 / min_period)]
+            if not len(fine):
+                break
+            values = bls(time, flux, 1 / fine, durations)
+            j = values[0].argmax()
+            f, peak = fine[j], [v[j] for v in values] + [1 / fine[j]]
+            window = step if step > fine_df else 0
+        if peak is not None and (best is None or peak[0] > best[0]):
+            best = peak
+    if best is None:
+        return result
+
+    chi2, duration, t0, depth, period = best
+    phase, folded, phase_binned, flux_binned = fold(time, flux, period, t0)
+    result.update(
+        period_grid=coarse,
+        power=power,
+        period=period,
+        t0=t0,
+        duration=duration,
+        depth=depth,
+        snr=np.sqrt(chi2),
+        phase=phase,
+        flux=folded,
+        phase_binned=phase_binned,
+        flux_binned=flux_binned,
+    )
+    return result
@@ -27,7 +27,7 @@ setup(
     ],
     extras_require={"develop": ["pre-commit"]},
     setup_requires=["setuptools_scm"],
-    scripts=["bin/deli"],
+    scripts=["bin/deli", "bin/deli-features", "bin/deli-snapshots"],
     include_package_data=True,
     zip_safe=False,
 )
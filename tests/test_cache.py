@@ -0,0 +1,99 @@
+"""Tests of the results shared by the sessions."""
+
+# Standard library
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party
+import numpy as np
+import pytest
+
+# delicatessen
+from delicatessen.cache import ResultCache
+
+
+class Computation:
+    # A computation that waits to be released, and counts its calls
+    def __init__(self, value=1.0):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(10)
+        return dict(values=np.full(4, self.value))
+
+
+def test_concurrent_requests_share_one_computation():
+    cache = ResultCache(max_workers=2)
+    compute = Computation()
+    first = cache.submit(("lightcurves", 1), compute)
+    assert compute.started.wait(10)
+    assert cache.submit(("lightcurves", 1), compute) is first
+
+    # A synchronous request waits for the same computation
+    with ThreadPoolExecutor(4) as pool:
+        gets = [
+            pool.submit(cache.get, ("lightcurves", 1), compute)
+            for _ in range(4)
+        ]
+        compute.release.set()
+        results = [future.result(10) for future in gets]
+    assert compute.calls == 1
+    assert all(result is first.result() for result in results)
+
+    # and once done, the result is cached
+    assert cache.submit(("lightcurves", 1), compute).result() is results[0]
+    assert cache.get(("lightcurves", 1), compute) is results[0]
+    assert compute.calls == 1
+
+
+def test_requests_in_the_calling_thread_share_one_computation():
+    cache = ResultCache()
+    compute = Computation()
+    with ThreadPoolExecutor(3) as pool:
+        gets = [
+            pool.submit(cache.get, ("periodogram", 1), compute)
+            for _ in range(3)
+        ]
+        assert compute.started.wait(10)
+        compute.release.set()
+        results = [future.result(10) for future in gets]
+    assert compute.calls == 1
+    assert results[0] is results[1] is results[2]
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache()
+
+    def fail():
+        raise RuntimeError("download failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get(("lightcurves", 2), fail)
+    with pytest.raises(RuntimeError):
+        cache.submit(("lightcurves", 2), fail).result(10)
+    compute = Computation()
+    compute.release.set()
+    assert cache.get(("lightcurves", 2), compute)["values"][0] == 1.0
+
+
+def test_budget_and_directory(tmp_path):
+    # Each result takes 40 bytes: the budget holds two
+    cache = ResultCache(budget=100, directory=str(tmp_path))
+    computations = [Computation(float(i)) for i in range(3)]
+    for i, compute in enumerate(computations):
+        compute.release.set()
+        cache.get(("result", i), compute)
+    assert cache.nbytes <= 100
+
+    # The evicted result is read back from the directory, as are the
+    # results of another process
+    again = ResultCache(directory=str(tmp_path))
+    for i, compute in enumerate(computations):
+        assert again.get(("result", i), compute)["values"][0] == float(i)
+        assert cache.get(("result", i), compute)["values"][0] == float(i)
+    assert all(compute.calls == 1 for compute in computations)
@@ -0,0 +1,71 @@
+"""Tests of the serving format of the catalogs."""
+
+# Third-party
+import numpy as np
+import pandas as pd
+
+# delicatessen
+from delicatessen import catalog
+
+
+def colliding_ticids(n, bits):
+    # ``n`` TIC IDs that all hash to the last slot of a table of 2**bits
+    # slots, so that they probe past its end
+    candidates = np.arange(1, 10**6, dtype=np.int64)
+    home = catalog._hash(candidates, bits)
+    return candidates[home == 2**bits - 1][:n]
+
+
+def write_catalog(path, ticids):
+    table = pd.DataFrame(
+        dict(
+            ticid=ticids,
+            tmag=np.linspace(5, 15, len(ticids)),
+            name=["star {0}".format(t) for t in ticids],
+        )
+    )
+    catalog.ingest(table, path)
+    return catalog.Catalog(path), table
+
+
+def test_hash_index_holds_every_row():
+    ticids = np.random.default_rng(1).choice(10**10, 1000, replace=False)
+    slots = catalog.hash_index(ticids)
+    assert len(slots) >= len(ticids) / catalog.HASH_LOAD
+    assert len(slots) & (len(slots) - 1) == 0
+    assert np.array_equal(np.sort(slots[slots >= 0]), np.arange(len(ticids)))
+
+
+def test_rows_of_colliding_ticids(tmp_path):
+    # 20 rows need 64 slots (see HASH_LOAD)
+    ticids = colliding_ticids(20, 6)
+    assert len(ticids) == 20
+    cat, _ = write_catalog(tmp_path / "collisions.deli", ticids)
+    assert len(cat._slots) == 64
+
+    # Every row is found, from the end of the table round to its start
+    shuffled = np.random.default_rng(2).permutation(len(ticids))
+    assert np.array_equal(cat.rows(ticids[shuffled]), shuffled)
+
+    # A TIC ID with the same home slot but not in the catalog probes all the
+    # rows that collided, and is not found
+    missing = colliding_ticids(21, 6)[-1]
+    assert np.array_equal(cat.rows([missing, 0, ticids[3]]), [-1, -1, 3])
+
+
+def test_catalog_round_trip(tmp_path):
+    ticids = np.random.default_rng(3).choice(10**9, 500, replace=False)
+    cat, table = write_catalog(tmp_path / "catalog.deli", ticids)
+    assert catalog.is_catalog(tmp_path / "catalog.deli")
+    assert len(cat) == len(table)
+    dataset = cat.to_pandas()
+    pd.testing.assert_frame_equal(dataset, table, check_dtype=False)
+    assert dataset["ticid"].dtype.itemsize <= 4
+    assert cat.stats["tmag"]["count"] == len(table)
+
+    # The rows within a range of values, sorted by value
+    rows = cat.range("tmag", 7.0, 9.0)
+    values = table["tmag"].to_numpy()
+    assert np.array_equal(
+        rows, np.flatnonzero((values >= 7.0) & (values <= 9.0))
+    )
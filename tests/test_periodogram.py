@@ -0,0 +1,72 @@
+"""Tests of the incremental periodograms."""
+
+# Third-party
+import numpy as np
+import pytest
+from astropy.timeseries import LombScargle
+
+# delicatessen
+from delicatessen import periodogram
+
+
+def sector(start, period=3.3, seed=0):
+    # A sector of a 2-minute light curve with a sinusoid, and its mid-sector
+    # gap
+    rng = np.random.default_rng(seed)
+    time = start + np.arange(0, 27, 2 / 1440)
+    time = time[(time < start + 13) | (time > start + 14)]
+    flux = 1 + 1e-3 * np.sin(2 * np.pi * time / period)
+    return time, flux + 1e-4 * rng.standard_normal(len(time))
+
+
+def lombscargle(time, flux):
+    # astropy's floating-mean periodogram, in the units of `Periodogram`
+    # (lightkurve's: per micro Hz of the frequency resolution)
+    baseline = (time.max() - time.min()) * periodogram.MICROHZ
+    scale = 2 * baseline / len(time)
+    ls = LombScargle(time, flux, normalization="psd")
+    return lambda frequency, **kwargs: scale * ls.power(
+        frequency * periodogram.MICROHZ, **kwargs
+    )
+
+
+def test_periodogram_of_one_sector():
+    time, flux = sector(1000.0)
+    pgram = periodogram.Periodogram()
+    pgram.add(1, periodogram.sector_sums(time, flux))
+    frequency, power = pgram.frequency, pgram.power()
+
+    # Up to the Nyquist frequency of the 2-minute cadence, on the fixed grid
+    assert frequency[-1] == pytest.approx(periodogram.MAX_FREQUENCY, rel=1e-3)
+    assert np.allclose(np.diff(frequency), periodogram.DF)
+
+    # The same as astropy's, with the same (fast) method
+    expected = lombscargle(time, flux)(
+        frequency, method="fast", assume_regular_frequency=True
+    )
+    assert np.allclose(power, expected, rtol=1e-8, atol=1e-8 * power.max())
+
+    # and close to its exact value at the peak, at the period of the light
+    # curve
+    peak = np.argmax(power)
+    assert 1 / (frequency[peak] * periodogram.MICROHZ) == pytest.approx(
+        3.3, rel=0.01
+    )
+    around = frequency[peak - 2 : peak + 3]
+    exact = lombscargle(time, flux)(around, method="cython")
+    assert np.allclose(power[peak - 2 : peak + 3], exact, rtol=1e-6)
+
+
+def test_sectors_add_up():
+    (t1, f1), (t2, f2) = sector(1000.0), sector(1027.5, seed=1)
+    pgram = periodogram.Periodogram()
+    pgram.add(1, periodogram.sector_sums(t1, f1))
+    pgram.add(2, periodogram.sector_sums(t2, f2))
+    with pytest.raises(ValueError):
+        pgram.add(2, periodogram.sector_sums(t2, f2))
+
+    # The same as the periodogram of both sectors at once
+    both = periodogram.Periodogram()
+    both.add(0, periodogram.sector_sums(np.append(t1, t2), np.append(f1, f2)))
+    assert np.allclose(both.frequency, pgram.frequency)
+    assert np.allclose(both.power(), pgram.power(), rtol=1e-8)
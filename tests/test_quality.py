@@ -0,0 +1,77 @@
+"""Tests of the quality masks and per-sector reductions."""
+
+# Third-party
+import numpy as np
+import pytest
+
+# delicatessen
+from delicatessen import quality
+
+
+def sectors(dtype=np.float64):
+    # Sectors of 5, 0, 4, 3 and 6 rows, with NaNs and infinities (the fourth
+    # sector has none finite), and the median of the finite values of each
+    rng = np.random.default_rng(0)
+    groups = quality.sector_groups([5, 0, 4, 3, 6])
+    values = rng.standard_normal(len(groups)).astype(dtype)
+    values[[1, 7, 9, 10, 11]] = [np.nan, np.nan, np.inf, np.nan, -np.inf]
+    expected = [
+        (
+            np.median(values[groups == i][np.isfinite(values[groups == i])])
+            if np.isfinite(values[groups == i]).any()
+            else np.nan
+        )
+        for i in range(5)
+    ]
+    return values, groups, np.array(expected)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_grouped_nanmedian_of_contiguous_sectors(dtype):
+    values, groups, expected = sectors(dtype)
+    medians = quality.grouped_nanmedian(values, groups, 5)
+    assert medians.dtype == dtype
+    assert np.allclose(medians, expected, equal_nan=True)
+    assert np.isnan(medians[[1, 3]]).all()
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.int16])
+def test_grouped_nanmedian_of_shuffled_rows(dtype):
+    values, groups, _ = sectors()
+    if dtype == np.int16:
+        values = np.round(10 * np.nan_to_num(values, posinf=0, neginf=0))
+    values = values.astype(dtype)
+    contiguous = quality.grouped_nanmedian(values, groups, 5)
+
+    # The same medians, by sorting the rows by group, of the same type
+    order = np.random.default_rng(1).permutation(len(values))
+    medians = quality.grouped_nanmedian(values[order], groups[order], 5)
+    assert medians.dtype == contiguous.dtype
+    assert np.allclose(medians, contiguous, equal_nan=True)
+
+    # Groups past the last row, and no finite value at all
+    assert np.isnan(quality.grouped_nanmedian(values, groups, 7)[5:]).all()
+    nans = np.full(4, np.nan)
+    groups = np.array([1, 0, 1, 0])
+    assert np.isnan(quality.grouped_nanmedian(nans, groups, 2)).all()
+
+
+def test_divide_grouped_median():
+    values, groups, expected = sectors()
+    errors = np.ones_like(values)
+    flux, flux_err = quality.divide_grouped_median(values, groups, 5, errors)
+    assert np.allclose(flux, values / expected[groups], equal_nan=True)
+    assert np.allclose(flux_err, 1 / expected[groups], equal_nan=True)
+    assert np.all(errors == 1)
+
+
+def test_quality_masks():
+    flags = np.array(
+        [0, quality.MOMENTUM_DUMP, quality.STRAYLIGHT, quality.DISCONTINUITY],
+        dtype=np.uint16,
+    )
+    assert np.array_equal(quality.good_mask(flags), [1, 0, 1, 1])
+    assert np.array_equal(quality.good_mask(flags, "hard"), [1, 0, 0, 1])
+    assert np.array_equal(quality.good_mask(flags, "none"), [1, 1, 1, 1])
+    assert np.array_equal(quality.flagged(flags, "hardest"), [1, 2, 3])
+    assert np.array_equal(quality.flagged(flags, quality.DISCONTINUITY), [3])
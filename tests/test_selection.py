@@ -0,0 +1,70 @@
+"""Tests of the selection of the stars passed on to the tools."""
+
+# Third-party
+from bokeh.models import ColumnDataSource
+
+# delicatessen
+from delicatessen.selection import SelectionManager
+
+
+class FakeDocument:
+    # A document of a session, whose timeouts are run by hand
+    session_context = object()
+
+    def __init__(self):
+        self.timeouts = []
+
+    def add_timeout_callback(self, callback, delay):
+        self.timeouts.append(callback)
+        return callback
+
+    def remove_timeout_callback(self, callback):
+        self.timeouts.remove(callback)
+
+    def run_timeouts(self):
+        timeouts, self.timeouts = self.timeouts, []
+        for callback in timeouts:
+            callback()
+
+
+def make_manager(delay=0):
+    doc = FakeDocument()
+    source = ColumnDataSource(data=dict(ticid=[11, 22, 33]))
+    selected = []
+    manager = SelectionManager(doc, source, selected.append, delay=delay)
+    return doc, source, manager, selected
+
+
+def test_selection_settles():
+    doc, source, manager, selected = make_manager()
+    manager.attach()
+    source.selected.indices = [0]
+    source.selected.indices = [0, 2]
+    assert selected == [()]
+    doc.run_timeouts()
+    assert selected == [(), (11, 33)]
+
+    # A selection that is back to the same stars once settled is not passed
+    # on
+    source.selected.indices = [1]
+    source.selected.indices = [0, 2]
+    doc.run_timeouts()
+    assert selected == [(), (11, 33)]
+
+
+def test_detach_cancels_pending_selection():
+    doc, source, manager, selected = make_manager()
+    manager.attach()
+    source.selected.indices = [1]
+    manager.detach()
+    assert not doc.timeouts
+    doc.run_timeouts()
+    assert selected == [()]
+
+    # Once attached again, the selection is followed from scratch
+    manager.attach()
+    assert selected == [(), (22,)]
+    source.selected.indices = [2]
+    assert len(doc.timeouts) == 1
+    doc.run_timeouts()
+    assert selected == [(), (22,), (33,)]
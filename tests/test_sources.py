@@ -0,0 +1,125 @@
+"""Tests of the live datasets and their incremental refresh."""
+
+# Third-party
+import numpy as np
+import pandas as pd
+
+# delicatessen
+from delicatessen import sources
+
+
+class TableSource(sources.DataSource):
+    # A dataset in memory, whose refreshes return the rows given to `update`
+    def __init__(self, table):
+        super().__init__()
+        self.table = table
+        self.rows = None
+
+    def load(self):
+        return self.table
+
+    def update(self, rows):
+        self.rows = rows
+
+    def refresh(self):
+        rows, self.rows = self.rows, None
+        return rows
+
+
+def make_feed(n=10):
+    table = pd.DataFrame(
+        dict(
+            ticid=np.arange(n) + 100,
+            tmag=np.linspace(5, 15, n),
+            name=["star {0}".format(i) for i in range(n)],
+        )
+    )
+    source = TableSource(table)
+    feed = sources.Feed(source)
+    feed.load()
+    return feed, source, table
+
+
+def test_refresh_appends_and_patches():
+    feed, source, table = make_feed()
+    assert not feed.refresh()
+    assert feed.version == 0
+
+    changed = table.iloc[[2, 5]].assign(tmag=[20.0, 1.0])
+    new = pd.DataFrame(dict(ticid=[500, 501], tmag=[7.0, 8.0]))
+    source.update(pd.concat([changed, new]))
+    assert feed.refresh()
+    dataset = feed.dataset
+    assert feed.version == 1
+    assert len(dataset) == 12
+    assert list(dataset["tmag"].iloc[[2, 5, 10, 11]]) == [20.0, 1.0, 7.0, 8.0]
+    # The columns missing from the new rows are NaN
+    assert dataset["name"].iloc[10:].isnull().all()
+    assert dataset["name"].iloc[2] == "star 2"
+
+    # The statistics follow
+    stats = dataset.attrs["stats"]["tmag"]
+    assert stats["count"] == 12
+    assert (stats["min"], stats["max"]) == (1.0, 20.0)
+
+    # The changes since the load: the rows appended, and those patched
+    version, _, start, patched = feed.changes(0)
+    assert (version, start) == (1, 10)
+    assert list(patched) == [2, 5]
+    version, _, start, patched = feed.changes(1)
+    assert (version, start, len(patched)) == (1, 12, 0)
+
+
+def test_published_datasets_never_change():
+    feed, source, table = make_feed()
+    before = feed.dataset
+    tmag = before["tmag"].to_numpy().copy()
+    for i in range(3):
+        source.update(table.iloc[[1]].assign(tmag=[30.0 + i]))
+        assert feed.refresh()
+        assert np.array_equal(before["tmag"].to_numpy(), tmag)
+        assert feed.dataset["tmag"].iloc[1] == 30.0 + i
+
+    # Appending rows leaves the published rows alone too
+    before = feed.dataset
+    source.update(pd.DataFrame(dict(ticid=[900], tmag=[1.0])))
+    assert feed.refresh()
+    assert len(before) == 10
+    assert before["tmag"].iloc[1] == 32.0
+
+
+def test_changes_after_the_log_is_trimmed(monkeypatch):
+    monkeypatch.setattr(sources, "LOG_SIZE", 3)
+    feed, source, table = make_feed()
+    for i in range(5):
+        source.update(table.iloc[[i]].assign(tmag=[50.0 + i]))
+        assert feed.refresh()
+    assert feed.version == 5
+
+    # Versions 3 and 4 are still in the log, version 1 is not
+    version, _, start, patched = feed.changes(3)
+    assert (version, start) == (5, 10)
+    assert list(patched) == [3, 4]
+    assert feed.changes(1)[2:] == (None, None)
+    assert feed.changes(None)[2:] == (None, None)
+
+
+def test_changes_of_a_version_of_another_feed(monkeypatch):
+    monkeypatch.setattr(sources, "_REGISTRY", dict(sources._REGISTRY))
+    monkeypatch.setattr(sources, "_FEEDS", {})
+    name = "Test feed"
+    _, source, table = make_feed()
+    sources.register_source(name, source)
+    first = sources.feed(name)
+    first.load()
+    source.update(table.iloc[[0]].assign(tmag=[0.0]))
+    assert first.refresh()
+    assert first.version == 1
+
+    # Registered again: the new feed starts over, and a session still at
+    # the version of the first one gets the whole dataset
+    sources.register_source(name, TableSource(table))
+    second = sources.feed(name)
+    assert second is not first
+    second.load()
+    assert second.changes(first.version)[2:] == (None, None)
@@ -0,0 +1,80 @@
+"""Tests of the compact light curve files."""
+
+# Third-party
+import numpy as np
+import pytest
+
+# delicatessen
+from delicatessen import store
+
+
+def make_columns():
+    # Three sectors of 5, 0 and 7 rows, of columns of various types (one
+    # big-endian, as FITS columns are, and one without a sector index)
+    rng = np.random.default_rng(0)
+    columns = dict(
+        time=np.linspace(1000, 1030, 12),
+        flux=rng.standard_normal(12).astype(np.float32),
+        quality=rng.integers(0, 2**16, 12).astype(np.uint16),
+        flux_err=rng.random(12).astype(">f4"),
+        empty=np.zeros(0, dtype=np.int64),
+    )
+    index = {
+        name: [(1, 0, 5), (2, 5, 5), (4, 5, 12)]
+        for name in ["time", "flux", "flux_err"]
+    }
+    return columns, index
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, compress):
+    columns, index = make_columns()
+    meta = dict(tessmag=9.5, in_sec=[1, 2, 4])
+    path = tmp_path / "star.lc"
+    store.write(path, columns, index=index, meta=meta, compress=compress)
+
+    read, read_index, read_meta = store.read(path)
+    assert read_meta == meta
+    assert list(read) == list(columns)
+    for name, values in columns.items():
+        assert np.array_equal(read[name], values)
+        assert read[name].dtype == values.dtype.newbyteorder("<")
+        # Read-only (views of the file, or of the decompressed column)
+        assert not read[name].flags.writeable
+    assert read_index["time"] == [[1, 0, 5], [2, 5, 5], [4, 5, 12]]
+
+    # Uncompressed, the columns are aligned views of the file
+    if not compress:
+        assert all(
+            values.ctypes.data % store.ALIGN == 0 for values in read.values()
+        )
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_read_sectors(tmp_path, compress):
+    columns, index = make_columns()
+    path = tmp_path / "star.lc"
+    store.write(path, columns, index=index, compress=compress)
+
+    # Contiguous sectors
+    read, read_index, _ = store.read(path, sectors=[2, 4])
+    assert np.array_equal(read["flux"], columns["flux"][5:])
+    assert read_index["flux"] == [(2, 0, 0), (4, 0, 7)]
+
+    # Sectors that are not contiguous in the file
+    index["flux"] = [(1, 0, 5), (4, 5, 12)]
+    index["time"] = [(4, 0, 7), (1, 7, 12)]
+    store.write(path, columns, index=index, compress=compress)
+    read, read_index, _ = store.read(path, sectors=[1])
+    assert np.array_equal(read["flux"], columns["flux"][:5])
+    assert np.array_equal(read["time"], columns["time"][7:])
+    assert read_index["time"] == [(1, 0, 5)]
+    # The columns without a sector index are whole
+    assert np.array_equal(read["quality"], columns["quality"])
+
+
+def test_not_a_light_curve_file(tmp_path):
+    path = tmp_path / "other.lc"
+    path.write_bytes(b"SIMPLE  =                    T" + b" " * 100)
+    with pytest.raises(ValueError):
+        store.read(path)
@@ -0,0 +1,49 @@
+"""Tests of the light curve tiles of DeliLATTE."""
+
+# Third-party
+import numpy as np
+
+# delicatessen
+from delicatessen.tools import delilatte
+
+# Benchmarks
+from benchmarks.synthetic import make_lightcurve_files
+
+TIC = 123456789
+
+
+def test_tiles_follow_sectors(tmp_path):
+    paths = make_lightcurve_files(TIC, [1, 2, 3], tmp_path)
+    data = dict(
+        zip(delilatte.DATA_KEYS, delilatte.read_lightcurves(paths, test="yes"))
+    )
+    tiles = delilatte.tiles_of(data)
+
+    # Every finite point of every cadence, in time order (the synthetic
+    # sectors overlap by a few cadences)
+    time = np.asarray(data["alltime"])
+    finite = np.isfinite(time) & np.isfinite(data["allflux"])
+    assert np.array_equal(tiles["time_full"], np.sort(time[finite]))
+
+    # Each sector spans the rows of `sec_rows`, at every resolution
+    rows = np.asarray(data["sec_rows"])[:, 0]
+    stops = np.cumsum(rows)
+    for name in delilatte.TILE_RESOLUTIONS:
+        t = tiles["time_" + name]
+        assert np.all(np.diff(t) >= 0)
+        for start, stop in zip(stops - rows, stops):
+            sector = time[start:stop][finite[start:stop]]
+            inside = (t >= sector[0]) & (t <= sector[-1])
+            assert inside.any()
+            if name == "full":
+                # The points of the sector, and those of its neighbours
+                # that overlap it
+                overlap = (time[finite] >= sector[0]) & (
+                    time[finite] <= sector[-1]
+                )
+                assert inside.sum() == overlap.sum() >= len(sector)
+
+        # The tiles cover all the points, once
+        bounds = tiles["bounds_" + name]
+        assert bounds[0] == 0 and bounds[-1] == len(t)
+        assert len(np.unique(tiles["tiles_" + name])) == len(bounds) - 1